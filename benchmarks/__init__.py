@@ -0,0 +1 @@
+# Бенчмарки горячих участков excel_splitter
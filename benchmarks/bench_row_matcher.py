@@ -0,0 +1,73 @@
+"""
+Микробенчмарк проверки строк: интерпретация фильтров в validate_row на каждой
+строке против фильтров, скомпилированных один раз в RowMatcher.
+
+Запуск: python -m benchmarks.bench_row_matcher [--rows N]
+"""
+import argparse
+import random
+import time
+from excel_utils.common import compile_filters
+
+HEADERS = ["ID", "Region", "City", "Department", "Amount", "Comment"]
+FILTERS = {"Region": "North", "Department": "Sales"}
+
+def legacy_validate_row(row, headers, header_row_idx, filters):
+    """Реализация validate_row до компиляции фильтров (без отладочного логирования)."""
+    if not filters:
+        return True
+    normalized_headers = [str(header).lower() if header is not None else "" for header in headers]
+    for col, value in filters.items():
+        normalized_col = str(col).lower()
+        try:
+            col_index = normalized_headers.index(normalized_col)
+            cell_value = row[col_index] if col_index < len(row) else None
+            str_value = str(cell_value).strip() if cell_value is not None else ""
+            str_filter = str(value).strip()
+            if str_value.lower() != str_filter.lower():
+                return False
+        except ValueError:
+            return False
+    return True
+
+def generate_rows(count, seed=42):
+    """Генерирует синтетические строки данных."""
+    rnd = random.Random(seed)
+    regions = ["North", "South", "East", "West", "north "]
+    departments = ["Sales", "Finance", "HR", "IT"]
+    return [
+        (i, rnd.choice(regions), f"City {rnd.randint(1, 50)}", rnd.choice(departments),
+         rnd.random() * 1000, "text")
+        for i in range(count)
+    ]
+
+def measure(func, rows):
+    """Возвращает (совпавшие строки, строк в секунду)."""
+    start = time.perf_counter()
+    matched = func(rows)
+    elapsed = time.perf_counter() - start
+    return matched, len(rows) / elapsed if elapsed > 0 else float('inf')
+
+def run(row_count):
+    rows = generate_rows(row_count)
+    legacy_matched, legacy_rate = measure(
+        lambda data: sum(1 for row in data if legacy_validate_row(row, HEADERS, 1, FILTERS)), rows
+    )
+    matcher = compile_filters(HEADERS, FILTERS)
+    single_matched, single_rate = measure(lambda data: sum(1 for row in data if matcher.matches(row)), rows)
+    batch_matched, batch_rate = measure(lambda data: sum(1 for _ in matcher.iter_matching(data)), rows)
+    assert legacy_matched == single_matched == batch_matched
+
+    print(f"Rows: {row_count}, matched: {legacy_matched}")
+    print(f"  validate_row (legacy):     {legacy_rate:>14,.0f} rows/sec")
+    print(f"  RowMatcher.matches:        {single_rate:>14,.0f} rows/sec  x{single_rate / legacy_rate:.1f}")
+    print(f"  RowMatcher.iter_matching:  {batch_rate:>14,.0f} rows/sec  x{batch_rate / legacy_rate:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Row predicate microbenchmark")
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.rows)
+
+if __name__ == "__main__":
+    main()
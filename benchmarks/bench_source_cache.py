@@ -0,0 +1,60 @@
+"""
+Бенчмарк кэша разобранных книг: заголовки и анализ колонки
+с разбором XML исходного файла против чтения из SourceCache.
+
+Запуск: python -m benchmarks.bench_source_cache [--rows N] [--cols N]
+"""
+import os
+import argparse
+import shutil
+import tempfile
+import time
+import openpyxl
+from excel_utils.source_cache import SourceCache
+from excel_utils.analysis import get_all_sheets_headers, analyze_column
+
+def build_source(path, rows, cols):
+    """Создает книгу с колонкой Region и числовыми колонками."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Data")
+    ws.append(["Region"] + [f"Col{idx}" for idx in range(1, cols)])
+    regions = ["North", "South", "East", "West"]
+    for row_idx in range(rows):
+        ws.append([regions[row_idx % len(regions)]] + [row_idx * idx for idx in range(1, cols)])
+    wb.save(path)
+
+def analyze(path, cache):
+    """Один цикл анализа: заголовки и значения колонки Region."""
+    start = time.perf_counter()
+    headers = get_all_sheets_headers(path, cache=cache)
+    valid_sheets = {k: v for k, v in headers.items() if v[0] is not None}
+    analyze_column(path, valid_sheets, "Region", cache=cache)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Source cache benchmark")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--cols", type=int, default=10)
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, "source.xlsx")
+        build_source(path, args.rows, args.cols)
+        cache = SourceCache(os.path.join(temp_dir, "cache"))
+        plain_time = analyze(path, None)
+        start = time.perf_counter()
+        cache.open(path).close()
+        build_time = time.perf_counter() - start
+        cached_time = analyze(path, cache)
+        print(f"Rows: {args.rows}, columns: {args.cols}")
+        print(f"  openpyxl read_only: {plain_time:8.3f} s")
+        print(f"  cache build:        {build_time:8.3f} s  "
+              f"({os.path.getsize(cache.cache_path(path)):,} bytes)")
+        print(f"  from cache:         {cached_time:8.3f} s")
+        print(f"  speedup x{plain_time / cached_time:.1f}")
+    finally:
+        shutil.rmtree(temp_dir)
+
+if __name__ == "__main__":
+    main()
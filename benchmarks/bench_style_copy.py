@@ -0,0 +1,69 @@
+"""
+Микробенчмарк копирования стилей: copy_cell_style с копированием объектов стилей
+для каждой ячейки против StyleCache с переводом стиля один раз на книгу.
+
+Запуск: python -m benchmarks.bench_style_copy [--rows N] [--cols N]
+"""
+import argparse
+import time
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from excel_utils.common import copy_cell_style, StyleCache
+
+def build_source(rows, cols):
+    """Создает лист с несколькими повторяющимися стилями."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    fonts = [Font(bold=True), Font(italic=True), Font(color="FF0000")]
+    fills = [PatternFill("solid", start_color="96C850"), PatternFill("solid", start_color="FF5050")]
+    border = Border(left=Side(style="thin"), right=Side(style="thin"))
+    for row_idx in range(1, rows + 1):
+        for col_idx in range(1, cols + 1):
+            cell = ws.cell(row=row_idx, column=col_idx, value=row_idx * col_idx)
+            cell.font = fonts[(row_idx + col_idx) % len(fonts)]
+            cell.fill = fills[row_idx % len(fills)]
+            cell.border = border
+            cell.alignment = Alignment(horizontal="center")
+            cell.number_format = "0.00"
+    return ws
+
+def copy_sheet(ws_source, style_cache):
+    """Копирует все ячейки листа в новую книгу."""
+    wb_new = openpyxl.Workbook()
+    ws_new = wb_new.active
+    for row in ws_source.iter_rows():
+        for source_cell in row:
+            target_cell = ws_new.cell(row=source_cell.row, column=source_cell.column, value=source_cell.value)
+            copy_cell_style(source_cell, target_cell, style_cache)
+    return ws_new
+
+def measure(ws_source, use_cache):
+    """Возвращает (секунды, число созданных копий объектов стилей)."""
+    cells = sum(1 for row in ws_source.iter_rows() for _ in row)
+    style_cache = StyleCache() if use_cache else None
+    start = time.perf_counter()
+    copy_sheet(ws_source, style_cache)
+    elapsed = time.perf_counter() - start
+    # Четыре объекта стилей (шрифт, граница, заливка, выравнивание) на каждую копию
+    style_copies = 4 * (style_cache.misses if use_cache else cells)
+    return elapsed, style_copies
+
+def main():
+    parser = argparse.ArgumentParser(description="Style copy microbenchmark")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--cols", type=int, default=20)
+    args = parser.parse_args()
+
+    ws_source = build_source(args.rows, args.cols)
+    cells = args.rows * args.cols
+    plain_time, plain_copies = measure(ws_source, use_cache=False)
+    cached_time, cached_copies = measure(ws_source, use_cache=True)
+    print(f"Cells: {cells}")
+    print(f"  copy per cell: {plain_time:8.3f} s  {cells / plain_time:>12,.0f} cells/sec  "
+          f"style objects {plain_copies:>10,}")
+    print(f"  StyleCache:    {cached_time:8.3f} s  {cells / cached_time:>12,.0f} cells/sec  "
+          f"style objects {cached_copies:>10,}")
+    print(f"  speedup x{plain_time / cached_time:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Генератор синтетических исходных книг для бенчмарков.
+
+Книга воспроизводима при одинаковых параметрах и seed: листы данных
+с техническими строками над заголовком, колонками категорий Level1..LevelN
+с заданным числом значений на уровень, числовыми и текстовыми колонками,
+долей ячеек со стилями, объединенными ячейками и условным форматированием,
+а также скрытые листы, которые разбиение должно пропускать.
+
+Запуск: python -m benchmarks.generator output.xlsx [--rows N] [--cardinality 4 10 ...]
+"""
+import argparse
+import random
+from datetime import date, timedelta
+import openpyxl
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
+
+DEFAULT_PARAMS = {
+    'rows': 5000,
+    'columns': 12,
+    'sheets': 2,
+    'hidden_sheets': 1,
+    'cardinality': [4, 10],
+    'technical_rows': 2,
+    'styled_ratio': 0.2,
+    'merged_cells': 10,
+    'conditional_formats': 2,
+    'seed': 42,
+}
+
+def workbook_params(**overrides):
+    """Параметры генератора: значения по умолчанию с подстановкой overrides."""
+    params = dict(DEFAULT_PARAMS)
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown workbook parameters: {', '.join(sorted(unknown))}")
+    if params['columns'] < len(params['cardinality']) + 1:
+        raise ValueError("columns must exceed the number of category levels")
+    return params
+
+def column_headers(params):
+    """Заголовки листа данных: уровни категорий, затем колонки значений."""
+    levels = [f"Level{level}" for level in range(1, len(params['cardinality']) + 1)]
+    values = [f"Value{idx}" for idx in range(1, params['columns'] - len(levels) + 1)]
+    return levels + values
+
+def _styles():
+    border = Side(style="thin")
+    return [
+        {'font': Font(bold=True), 'number_format': "0.00"},
+        {'fill': PatternFill("solid", start_color="96C850"), 'border': Border(left=border, right=border)},
+        {'font': Font(italic=True, color="FF0000"), 'alignment': Alignment(horizontal="center")},
+    ]
+
+def _fill_sheet(ws, params, rnd, styles):
+    headers = column_headers(params)
+    levels = len(params['cardinality'])
+    for row_idx in range(1, params['technical_rows'] + 1):
+        ws.cell(row=row_idx, column=1, value=f"Technical info {row_idx}")
+    header_row = params['technical_rows'] + 1
+    for col_idx, header in enumerate(headers, start=1):
+        ws.cell(row=header_row, column=col_idx, value=header).font = Font(bold=True)
+
+    start = date(2024, 1, 1)
+    for row_idx in range(header_row + 1, header_row + params['rows'] + 1):
+        row = [f"L{level + 1}_{rnd.randrange(count)}" for level, count in enumerate(params['cardinality'])]
+        for col_idx in range(levels, len(headers)):
+            kind = col_idx % 3
+            if kind == 0:
+                row.append(round(rnd.random() * 1000, 2))
+            elif kind == 1:
+                row.append(start + timedelta(days=rnd.randrange(365)))
+            else:
+                row.append(f"text {rnd.randrange(1000)}")
+        for col_idx, value in enumerate(row, start=1):
+            cell = ws.cell(row=row_idx, column=col_idx, value=value)
+            if rnd.random() < params['styled_ratio']:
+                for attr, style in rnd.choice(styles).items():
+                    setattr(cell, attr, style)
+
+    # Объединения по две ячейки в колонках значений, без пересечений
+    last_row = header_row + params['rows']
+    value_cols = len(headers) - levels
+    merged_rows = min(params['merged_cells'], params['rows']) if value_cols > 1 else 0
+    for row_idx in rnd.sample(range(header_row + 1, last_row + 1), merged_rows):
+        col_idx = levels + 1 + rnd.randrange(value_cols - 1)
+        ws.merge_cells(start_row=row_idx, start_column=col_idx, end_row=row_idx, end_column=col_idx + 1)
+
+    fill = PatternFill("solid", start_color="FF5050")
+    for rule_idx in range(params['conditional_formats']):
+        col_letter = get_column_letter(levels + 1 + rule_idx % value_cols)
+        ws.conditional_formatting.add(
+            f"{col_letter}{header_row + 1}:{col_letter}{last_row}",
+            CellIsRule(operator="greaterThan", formula=[str(500 + rule_idx)], fill=fill),
+        )
+
+def generate_workbook(path, **overrides):
+    """
+    Создает синтетическую книгу по параметрам (см. DEFAULT_PARAMS)
+    и возвращает итоговые параметры генерации.
+    """
+    params = workbook_params(**overrides)
+    rnd = random.Random(params['seed'])
+    styles = _styles()
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for sheet_idx in range(1, params['sheets'] + 1):
+        _fill_sheet(wb.create_sheet(f"Data{sheet_idx}"), params, rnd, styles)
+    for sheet_idx in range(1, params['hidden_sheets'] + 1):
+        ws = wb.create_sheet(f"Hidden{sheet_idx}")
+        ws.append(["Key", "Value"])
+        for row_idx in range(100):
+            ws.append([f"key {row_idx}", row_idx])
+        ws.sheet_state = 'hidden'
+    wb.save(path)
+    return params
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic workbook generator")
+    parser.add_argument("output")
+    for key, value in DEFAULT_PARAMS.items():
+        if isinstance(value, list):
+            parser.add_argument(f"--{key.replace('_', '-')}", type=int, nargs="+")
+        else:
+            parser.add_argument(f"--{key.replace('_', '-')}", type=type(value))
+    args = vars(parser.parse_args())
+    output = args.pop("output")
+    params = generate_workbook(output, **args)
+    print(f"Generated {output}: {params}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Замер пиковой памяти определения заголовков, анализа категорий и разбиения
+на синтетических книгах возрастающего размера.
+
+Каждый размер замеряется в отдельном процессе, чтобы память предыдущих замеров
+не влияла на RSS. Для каждого этапа и каждого выходного файла (create_filtered_file)
+фиксируется пик выделений Python по tracemalloc и пик RSS процесса по фоновым
+замерам. Пик tracemalloc в пересчете на 100 тыс. строк сравнивается с
+записанным бюджетом: превышение больше допуска считается регрессией.
+
+Запуск: python -m benchmarks.memory [--sizes 5000 20000 50000] [--engine openpyxl]
+        [--budget memory_budget.json] [--record-budget] [--tolerance 0.1] [--output results.json]
+"""
+import gc
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.generator import generate_workbook, workbook_params
+
+DEFAULT_SIZES = [5000, 20000, 50000]
+DEFAULT_TOLERANCE = 0.1
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_budget.json")
+ROWS_UNIT = 100000
+
+logger = logging.getLogger('excel_splitter')
+
+def current_rss():
+    """RSS текущего процесса в байтах (psutil или /proc), None если недоступно."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class MemorySampler:
+    """
+    Пик памяти блока кода: прирост выделений по tracemalloc относительно начала
+    блока и максимальный RSS по замерам в фоновом потоке.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.traced_peak = 0
+        self.rss_start = None
+        self.rss_peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss()
+            if rss is not None:
+                self.rss_peak = max(self.rss_peak or 0, rss)
+
+    def __enter__(self):
+        # Книги openpyxl содержат циклические ссылки: освобождаем память прошлых этапов
+        gc.collect()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._traced_start = tracemalloc.get_traced_memory()[0]
+        self.rss_start = current_rss()
+        self.rss_peak = self.rss_start
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.traced_peak = tracemalloc.get_traced_memory()[1] - self._traced_start
+        rss = current_rss()
+        if rss is not None:
+            self.rss_peak = max(self.rss_peak or 0, rss)
+
+    def result(self, rows):
+        return {
+            'traced_peak': self.traced_peak,
+            'rss_start': self.rss_start,
+            'rss_peak': self.rss_peak,
+            'per_100k_rows': round(self.traced_peak * ROWS_UNIT / rows) if rows else None,
+        }
+
+def measure_size(rows, params, engine='openpyxl'):
+    """Замеряет все этапы на книге с rows строками на лист (выполняется в отдельном процессе)."""
+    from excel_utils.analysis import get_all_sheets_headers
+    from excel_utils.filtering import get_all_combinations
+    from excel_utils.partitioning import create_filtered_files
+    from excel_utils.workbook import create_filtered_file
+
+    params = workbook_params(**dict(params, rows=rows))
+    total_rows = rows * params['sheets']
+    levels = [f"Level{level}" for level in range(1, len(params['cardinality']) + 1)]
+    workdir = tempfile.mkdtemp()
+    result = {'rows': total_rows, 'stages': {}, 'outputs': {}}
+    try:
+        source = os.path.join(workdir, "source.xlsx")
+        generate_workbook(source, **params)
+        tracemalloc.start()
+
+        with MemorySampler() as sampler:
+            headers = get_all_sheets_headers(source)
+        result['stages']['header_detection'] = sampler.result(total_rows)
+        valid_sheets = {sheet: data for sheet, data in headers.items() if data[0] is not None}
+
+        with MemorySampler() as sampler:
+            get_all_combinations(source, valid_sheets, levels)
+        result['stages']['category_analysis'] = sampler.result(total_rows)
+
+        combinations = get_all_combinations(source, valid_sheets, levels[:1])
+        unique = list({tuple(filters.items()): filters for filters in combinations}.values())
+        file_list = [
+            (filters, os.path.join(workdir, f"split_{idx}.xlsx")) for idx, filters in enumerate(unique)
+        ]
+        with MemorySampler() as sampler:
+            create_filtered_files(source, file_list, valid_sheets, engine=engine)
+        result['stages']['split'] = sampler.result(total_rows)
+
+        for filters, _ in file_list:
+            name = "_".join(str(value) for value in filters.values())
+            with MemorySampler() as sampler:
+                create_filtered_file(source, os.path.join(workdir, f"single_{name}.xlsx"), valid_sheets, filters)
+            result['outputs'][name] = sampler.result(total_rows)
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir)
+    return result
+
+def run_memory_suite(sizes=None, params=None, engine='openpyxl'):
+    """Замеряет все размеры, каждый в новом процессе. Возвращает словарь результатов."""
+    params = workbook_params(**(params or {}))
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for rows in sizes or DEFAULT_SIZES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            runs.append(executor.submit(measure_size, rows, params, engine).result())
+    # Число строк задается размерами, в параметрах книги оно не хранится
+    params = {key: value for key, value in params.items() if key != 'rows'}
+    return {'params': params, 'engine': engine, 'runs': runs}
+
+def _measured(run):
+    """Пары (этап, замер); все выходы учитываются как этап output."""
+    return list(run['stages'].items()) + [('output', values) for values in run['outputs'].values()]
+
+def record_budget(results):
+    """
+    Бюджет: пик на 100 тыс. строк по каждому этапу для каждого размера
+    (для output - наибольший среди выходов).
+    """
+    budget = {}
+    for run in results['runs']:
+        limits = budget.setdefault(str(run['rows']), {})
+        for stage, values in _measured(run):
+            limits[stage] = max(limits.get(stage, 0), values['per_100k_rows'])
+    return {'params': results['params'], 'engine': results['engine'], 'per_100k_rows': budget}
+
+def check_budget(results, budget, tolerance=DEFAULT_TOLERANCE):
+    """
+    Сравнивает пики на 100 тыс. строк с бюджетом.
+    Возвращает список превышений (строки, этап, значение, бюджет).
+    """
+    if budget.get('params') != results.get('params') or budget.get('engine') != results.get('engine'):
+        raise ValueError("Memory budget was recorded with other workbook parameters or engine")
+    violations = []
+    for run in results['runs']:
+        limits = budget['per_100k_rows'].get(str(run['rows']))
+        if limits is None:
+            logger.warning(f"No memory budget recorded for {run['rows']} rows")
+            continue
+        for stage, values in _measured(run):
+            limit = limits.get(stage)
+            if limit and values['per_100k_rows'] > limit * (1 + tolerance):
+                violations.append((run['rows'], stage, values['per_100k_rows'], limit))
+    return violations
+
+def _mb(value):
+    return f"{value / 1048576:9.1f}" if value is not None else f"{'-':>9}"
+
+def print_results(results):
+    for run in results['runs']:
+        print(f"Rows: {run['rows']:,}")
+        print(f"  {'stage':<24}{'traced MB':>10}{'RSS MB':>10}{'MB/100k rows':>14}")
+        measured = list(run['stages'].items()) + [(f"output {name}", v) for name, v in run['outputs'].items()]
+        for stage, values in measured:
+            print(f"  {stage:<24} {_mb(values['traced_peak'])} {_mb(values['rss_peak'])}    "
+                  f"{_mb(values['per_100k_rows'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory harness")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Строк на лист")
+    parser.add_argument("--sheets", type=int)
+    parser.add_argument("--cardinality", type=int, nargs="+")
+    parser.add_argument("--engine", choices=["openpyxl", "xml", "columnar"], default="openpyxl")
+    parser.add_argument("--output", help="Файл JSON для результатов")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="Файл бюджета памяти")
+    parser.add_argument("--record-budget", action="store_true", help="Записать текущие пики как бюджет")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Допустимое превышение бюджета (0.1 - на 10%%)")
+    args = parser.parse_args()
+
+    results = run_memory_suite(
+        args.sizes, {'sheets': args.sheets, 'cardinality': args.cardinality}, args.engine
+    )
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.record_budget:
+        with open(args.budget, "w", encoding="utf-8") as f:
+            json.dump(record_budget(results), f, indent=2)
+        print(f"Memory budget saved to {args.budget}")
+        return 0
+    if not os.path.exists(args.budget):
+        print("No memory budget to compare with (use --record-budget)")
+        return 0
+
+    with open(args.budget, encoding="utf-8") as f:
+        budget = json.load(f)
+    try:
+        violations = check_budget(results, budget, args.tolerance)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 2
+    for rows, stage, value, limit in violations:
+        print(f"OVER BUDGET {stage} at {rows:,} rows: {value / 1048576:.1f} MB/100k rows "
+              f"(budget {limit / 1048576:.1f})")
+    if not violations:
+        print(f"Peak memory within budget (+{args.tolerance:.0%})")
+    return 1 if violations else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
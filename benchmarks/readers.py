@@ -0,0 +1,97 @@
+"""
+Пропускная способность движков чтения значений на синтетической книге.
+
+Для каждого движка (openpyxl, lean) замеряются чтение всех строк видимых
+листов, поиск заголовков (get_all_sheets_headers) и анализ категорий
+(analyze_column). Для полного чтения выводится число строк в секунду
+и ускорение относительно openpyxl.
+
+Запуск: python -m benchmarks.readers [--rows N] [--repeat N] [--readers openpyxl lean]
+        [--output results.json]
+"""
+import sys
+import json
+import shutil
+import argparse
+import statistics
+import tempfile
+import os
+from benchmarks.generator import generate_workbook, workbook_params
+from benchmarks.suite import _timed
+from excel_utils.analysis import get_all_sheets_headers, analyze_column
+from excel_utils.readers import READERS, get_reader
+
+def read_all_rows(path, reader):
+    """Читает все строки видимых листов; возвращает число строк."""
+    wb = reader.open(path)
+    try:
+        rows = 0
+        for ws in wb.worksheets:
+            if ws.sheet_state == 'visible':
+                rows += sum(1 for _ in ws.iter_rows(values_only=True))
+        return rows
+    finally:
+        wb.close()
+
+def run_readers(workdir, params=None, repeat=3, readers=READERS):
+    """
+    Генерирует книгу в workdir и замеряет движки чтения.
+    Возвращает словарь результатов для сохранения в JSON.
+    """
+    params = workbook_params(**(params or {}))
+    source = os.path.join(workdir, "source.xlsx")
+    generate_workbook(source, **params)
+    results = {'params': params, 'repeat': repeat, 'readers': {}}
+    for name in readers:
+        reader = get_reader(name)
+        rows, read_runs = _timed(lambda: read_all_rows(source, reader), repeat)
+        headers, header_runs = _timed(lambda: get_all_sheets_headers(source, cache=reader), repeat)
+        valid_sheets = {sheet: data for sheet, data in headers.items() if data[0] is not None}
+        _, analyze_runs = _timed(lambda: analyze_column(source, valid_sheets, "Level1", cache=reader), repeat)
+        read_median = statistics.median(read_runs)
+        results['readers'][name] = {
+            'rows': rows,
+            'rows_per_second': rows / read_median if read_median > 0 else None,
+            'timings': {
+                'read_all_rows': statistics.median(read_runs),
+                'get_all_sheets_headers': statistics.median(header_runs),
+                'analyze_column': statistics.median(analyze_runs),
+            },
+        }
+    return results
+
+def print_results(results):
+    print(f"Workbook: {results['params']}")
+    base = results['readers'].get('openpyxl')
+    for name, result in results['readers'].items():
+        timings = result['timings']
+        line = (f"  {name:<10} {result['rows_per_second'] or 0:12,.0f} rows/s  "
+                f"read {timings['read_all_rows']:7.3f} s  headers {timings['get_all_sheets_headers']:7.3f} s  "
+                f"analyze {timings['analyze_column']:7.3f} s")
+        if base and name != 'openpyxl' and timings['read_all_rows'] > 0:
+            line += f"  x{base['timings']['read_all_rows'] / timings['read_all_rows']:.2f} vs openpyxl"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Reader backend throughput benchmark")
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--sheets", type=int)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--readers", nargs="+", choices=READERS, default=list(READERS))
+    parser.add_argument("--output", help="Файл JSON для результатов")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="excel_split_readers_")
+    try:
+        results = run_readers(workdir, {'rows': args.rows, 'sheets': args.sheets}, args.repeat, args.readers)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Набор бенчмарков горячих путей на синтетической книге.
+
+Замеряются get_all_sheets_headers, analyze_column, get_all_combinations,
+create_filtered_file и полное разбиение (заголовки, комбинации, создание файлов)
+с копированием стилей, в режиме values_only (только значения ячеек)
+и с записью в CSV. Ускорение values_only и CSV относительно полного
+разбиения выводится отдельно.
+Результаты сохраняются в JSON и сравниваются с сохраненным базовым прогоном:
+замер, медиана которого выросла больше порога, считается регрессией.
+
+Запуск: python -m benchmarks.suite [--rows N] [--repeat N] [--output results.json]
+        [--baseline baseline.json] [--save-baseline] [--threshold 0.2]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+import openpyxl
+from benchmarks.generator import DEFAULT_PARAMS, generate_workbook, workbook_params
+from excel_utils.analysis import get_all_sheets_headers, analyze_column
+from excel_utils.filtering import get_all_combinations
+from excel_utils.workbook import create_filtered_file
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.tabular_output import output_extension
+from core.api import build_file_list
+
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def _timed(func, repeat):
+    """Запускает func repeat раз и возвращает (результат последнего запуска, список секунд)."""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+    return result, runs
+
+def run_suite(workdir, params=None, repeat=3, engine='openpyxl'):
+    """
+    Генерирует книгу в workdir и замеряет все сценарии.
+    Возвращает словарь результатов для сохранения в JSON.
+    """
+    params = workbook_params(**(params or {}))
+    source = os.path.join(workdir, "source.xlsx")
+    generate_workbook(source, **params)
+    levels = [f"Level{level}" for level in range(1, len(params['cardinality']) + 1)]
+    timings = {}
+
+    headers, timings['get_all_sheets_headers'] = _timed(lambda: get_all_sheets_headers(source), repeat)
+    valid_sheets = {sheet: data for sheet, data in headers.items() if data[0] is not None}
+    _, timings['analyze_column'] = _timed(lambda: analyze_column(source, valid_sheets, levels[-1]), repeat)
+    combinations, timings['get_all_combinations'] = _timed(
+        lambda: get_all_combinations(source, valid_sheets, levels), repeat
+    )
+    single_target = os.path.join(workdir, "single.xlsx")
+    _, timings['create_filtered_file'] = _timed(
+        lambda: create_filtered_file(source, single_target, valid_sheets, combinations[0]), repeat
+    )
+
+    def end_to_end(values_only=False, output_format='xlsx'):
+        destination = tempfile.mkdtemp(dir=workdir)
+        split_headers = get_all_sheets_headers(source)
+        split_sheets = {sheet: data for sheet, data in split_headers.items() if data[0] is not None}
+        file_list = build_file_list(
+            source, destination, get_all_combinations(source, split_sheets, levels[:1]), False,
+            output_extension(output_format)
+        )
+        return create_filtered_files(
+            source, file_list, split_sheets, engine=engine, values_only=values_only, output_format=output_format
+        )
+
+    outputs, timings['end_to_end_split'] = _timed(end_to_end, repeat)
+    _, timings['values_only_split'] = _timed(lambda: end_to_end(values_only=True), repeat)
+    _, timings['csv_split'] = _timed(lambda: end_to_end(output_format='csv'), repeat)
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'params': params,
+        'engine': engine,
+        'repeat': repeat,
+        'environment': {
+            'python': platform.python_version(),
+            'openpyxl': openpyxl.__version__,
+            'platform': platform.platform(),
+        },
+        'outputs': len([path for path in outputs if path is not None]),
+        'timings': {
+            name: {'median': statistics.median(runs), 'min': min(runs), 'runs': runs}
+            for name, runs in timings.items()
+        },
+    }
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Сравнивает медианы замеров с базовым прогоном.
+    Возвращает список регрессий (имя, базовая медиана, текущая медиана, отношение).
+    """
+    if baseline.get('params') != results.get('params') or baseline.get('engine') != results.get('engine'):
+        raise ValueError("Baseline was recorded with other workbook parameters or engine")
+    regressions = []
+    for name, timing in results['timings'].items():
+        base = baseline['timings'].get(name)
+        if not base or base['median'] <= 0:
+            continue
+        ratio = timing['median'] / base['median']
+        if ratio > 1 + threshold:
+            regressions.append((name, base['median'], timing['median'], ratio))
+    return regressions
+
+def print_results(results, baseline=None):
+    print(f"Workbook: {results['params']}")
+    for name, timing in results['timings'].items():
+        line = f"  {name:<24} median {timing['median']:8.3f} s  min {timing['min']:8.3f} s"
+        if baseline and name in baseline['timings'] and baseline['timings'][name]['median'] > 0:
+            line += f"  x{timing['median'] / baseline['timings'][name]['median']:.2f} vs baseline"
+        print(line)
+    split = results['timings'].get('end_to_end_split')
+    for name, label in (('values_only_split', 'values_only'), ('csv_split', 'csv')):
+        timing = results['timings'].get(name)
+        if split and timing and timing['median'] > 0:
+            print(f"  {label} speedup: x{split['median'] / timing['median']:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel splitter benchmark suite")
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--columns", type=int)
+    parser.add_argument("--sheets", type=int)
+    parser.add_argument("--hidden-sheets", type=int)
+    parser.add_argument("--cardinality", type=int, nargs="+")
+    parser.add_argument("--technical-rows", type=int)
+    parser.add_argument("--styled-ratio", type=float)
+    parser.add_argument("--merged-cells", type=int)
+    parser.add_argument("--conditional-formats", type=int)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--engine", choices=["openpyxl", "xml", "columnar"], default="openpyxl")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Файл JSON для результатов прогона")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Файл базового прогона")
+    parser.add_argument("--save-baseline", action="store_true", help="Сохранить прогон как базовый")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Допустимый рост медианы (0.2 - на 20%%)")
+    args = parser.parse_args()
+    params = {key: getattr(args, key) for key in DEFAULT_PARAMS}
+
+    workdir = tempfile.mkdtemp()
+    try:
+        results = run_suite(workdir, params, max(1, args.repeat), args.engine)
+    finally:
+        shutil.rmtree(workdir)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if baseline is None:
+        print("No baseline to compare with (use --save-baseline)")
+        return 0
+
+    try:
+        regressions = compare_results(results, baseline, args.threshold)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 2
+    for name, base, current, ratio in regressions:
+        print(f"REGRESSION {name}: {base:.3f} s -> {current:.3f} s (x{ratio:.2f})")
+    if not regressions:
+        print(f"No regressions above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,22 @@
 from core.processing import process_file
+from config import (
+    DEFAULT_JOBS, WRITE_ONLY_OUTPUT, DEFAULT_ENGINE, SOURCE_CACHE_DIR, INCREMENTAL_SPLIT, REMOVE_STALE_OUTPUTS,
+    DELTA_SPLIT, VALUES_ONLY_OUTPUT, OUTPUT_FORMAT, DEFAULT_READER, MEMORY_BUDGET_MB, RUN_STATS_JSON, PROFILE_OUTPUT
+)
 
-def main():
+def main(jobs=DEFAULT_JOBS, write_only=WRITE_ONLY_OUTPUT, engine=DEFAULT_ENGINE, cache_dir=SOURCE_CACHE_DIR,
+         incremental=INCREMENTAL_SPLIT, remove_stale=REMOVE_STALE_OUTPUTS, delta=DELTA_SPLIT,
+         values_only=VALUES_ONLY_OUTPUT, output_format=OUTPUT_FORMAT, reader=DEFAULT_READER,
+         memory_budget=MEMORY_BUDGET_MB, stats_json=RUN_STATS_JSON, profile=PROFILE_OUTPUT):
     """Главный цикл программы: обработка файлов."""
     while True:
-        success = process_file()
+        success = process_file(
+            jobs=jobs, write_only=write_only, engine=engine, cache_dir=cache_dir,
+            incremental=incremental, remove_stale=remove_stale, delta=delta,
+            values_only=values_only, output_format=output_format, reader=reader, memory_budget=memory_budget,
+            stats_json=stats_json,
+            profile=profile
+        )
         # Спрашиваем, хочет ли пользователь продолжить
         if success:
             cont = input("\nDo you want to process another file? (y/n): ").strip().lower()
@@ -2,4 +2,41 @@
 # Будет расширена в будущих итерациях
 
 MAX_SCAN_ROWS = 10
-DEFAULT_FILE_EXTENSION = '.xlsx'
\ No newline at end of file
+DEFAULT_FILE_EXTENSION = '.xlsx'
+
+# Количество процессов для параллельного создания файлов (1 - без пула)
+DEFAULT_JOBS = 1
+
+# Потоковая запись выходных книг (openpyxl write_only) с постоянным расходом памяти
+WRITE_ONLY_OUTPUT = False
+
+# Запись только значений ячеек без стилей, размеров и условного форматирования
+VALUES_ONLY_OUTPUT = False
+
+# Формат выходных файлов: 'xlsx', 'csv' (построчная запись), 'parquet' или 'feather' (требуют pyarrow)
+OUTPUT_FORMAT = 'xlsx'
+
+# Бюджет памяти буферов строк в МБ: строки сверх бюджета выгружаются во временные файлы,
+# выходы строятся по одному (только со значениями ячеек или форматом кроме xlsx; None - без ограничения)
+MEMORY_BUDGET_MB = None
+
+# Движок разбиения: 'openpyxl' (объектная модель), 'xml' (потоковая обработка XML листов)
+# или 'columnar' (строки выбираются по колоночной таблице кодов категорий, быстрее с NumPy)
+DEFAULT_ENGINE = 'openpyxl'
+
+# Движок чтения значений источника: 'openpyxl' или 'lean' (разбор XML листов напрямую, читает и CSV)
+DEFAULT_READER = 'openpyxl'
+
+# Каталог постоянного кэша разобранных исходных книг (None - кэш отключен)
+SOURCE_CACHE_DIR = None
+
+# Инкрементальное разбиение: перезаписываются только выходы с измененным содержимым
+INCREMENTAL_SPLIT = False
+# Удалять файлы комбинаций, которые больше не создаются (иначе только сообщать о них)
+REMOVE_STALE_OUTPUTS = False
+# Delta-режим: новые строки источника дописываются в существующие выходы
+DELTA_SPLIT = False
+# Файл JSON для статистики этапов запуска (None - только вывод таблицы)
+RUN_STATS_JSON = None
+# Файл для статистики cProfile (None - профилирование выключено)
+PROFILE_OUTPUT = None
@@ -1,4 +1,6 @@
 # Импорты для пакета core
 from .processing import process_file
+from .batch import run_batch
+from .api import split_workbook, split_workbook_async, CancellationToken
 
-__all__ = ['process_file']
\ No newline at end of file
+__all__ = ['process_file', 'run_batch', 'split_workbook', 'split_workbook_async', 'CancellationToken']
\ No newline at end of file
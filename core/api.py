@@ -0,0 +1,372 @@
+"""
+Программный интерфейс разбиения без интерактивного ввода.
+
+split_workbook() выполняет весь цикл - анализ заголовков, выбор комбинаций,
+создание файлов - и возвращает генератор событий-словарей (ключ 'type'):
+
+  'analysis'        - заголовки найдены: sheets, columns (общие колонки), duration
+  'plan'            - комбинации выбраны: combinations, files (все пары фильтры/путь),
+                      write (пары, которые будут записаны), unchanged, duration
+  'pass_started'    - начат проход по строкам: rows (всего строк), files
+  'rows'            - обработано еще rows строк
+  'output_started'  - начата запись файла: index, files, filters, path
+  'output_finished' - файл записан: index, files, filters, path, created (путь
+                      или None, если данных нет), rows, duration, error
+  'done'            - разбиение завершено: results, created, skipped, unchanged,
+                      stale, delta, duration
+  'cancelled'       - разбиение остановлено по cancel: created
+
+Остановить разбиение можно через cancel (CancellationToken или threading.Event):
+проверка выполняется каждые PROGRESS_ROWS строк и между выходными файлами,
+уже сохраненные файлы остаются. Закрытие генератора тоже останавливает запись.
+Движок 'xml', параллельный и delta режимы не сообщают о ходе прохода: для них
+'output_finished' приходят после записи всех файлов, rows и duration равны None.
+"""
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from excel_utils.source import SourceWorkbook
+from excel_utils.source_cache import SourceCache
+from excel_utils.filtering import select_categories_from_spec
+from excel_utils.partitioning import create_filtered_files, SplitCancelled
+from excel_utils.parallel import create_filtered_files_parallel
+from excel_utils.incremental import plan_incremental
+from excel_utils.delta import split_delta
+from excel_utils.columnar import columnar_table
+from excel_utils.instrumentation import stage, record_output
+from excel_utils.formatting import sanitize_filename, generate_short_filename
+from excel_utils.tabular_output import output_extension
+from excel_utils.readers import source_reader, is_csv_source
+from config import WRITE_ONLY_OUTPUT, DEFAULT_ENGINE, OUTPUT_FORMAT, DEFAULT_READER
+
+logger = logging.getLogger('excel_splitter')
+
+class CancellationToken:
+    """
+    Запрос отмены разбиения. Отменен, если вызван cancel() или отменен
+    родительский токен (parent - CancellationToken или threading.Event).
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_set(self):
+        return self._event.is_set() or (self.parent is not None and self.parent.is_set())
+
+def build_file_list(source, destination, combinations, create_hierarchy, extension='.xlsx'):
+    """
+    Формирует пары (фильтры, путь к целевому файлу) для всех комбинаций.
+    При create_hierarchy файлы раскладываются по папкам уровней фильтра,
+    extension - расширение файлов формата вывода.
+    """
+    base_name = os.path.splitext(os.path.basename(source))[0]
+    file_list = []
+    for filters in combinations:
+        if create_hierarchy:
+            # Создаем путь с иерархией папок
+            current_path = destination
+            for col, value in filters.items():
+                # Используем полное имя категории для папки
+                folder_name = sanitize_filename(value)
+                current_path = os.path.join(current_path, folder_name)
+            # Генерируем имя файла без включения пути
+            short_filename = generate_short_filename(
+                os.path.join(current_path, base_name),
+                filters,
+                is_folder_hierarchy=True,
+                extension=extension
+            )
+            full_path = os.path.join(current_path, short_filename)
+        else:
+            # Сохраняем все файлы в одну папку
+            short_filename = generate_short_filename(
+                os.path.join(destination, base_name),
+                filters,
+                is_folder_hierarchy=False,
+                extension=extension
+            )
+            full_path = os.path.join(destination, short_filename)
+        file_list.append((filters, full_path))
+    return file_list
+
+def _elapsed(started):
+    return round(time.perf_counter() - started, 3)
+
+class _OutputEvents:
+    """Переводит события partition_workbook в события программного интерфейса."""
+
+    def __init__(self, write_list, emit):
+        self.write_list = write_list
+        self.emit = emit
+        self.saving_started = None
+
+    def __call__(self, event):
+        kind = event['type']
+        if kind == 'start':
+            self.emit({'type': 'pass_started', 'rows': event['rows'], 'files': event['files']})
+        elif kind == 'rows':
+            self.emit(event)
+        elif kind == 'saving':
+            self.saving_started = time.perf_counter()
+            self.emit(self._output('output_started', event['index'], path=event['path']))
+        elif kind == 'file':
+            duration = _elapsed(self.saving_started) if event['path'] is not None else 0.0
+            self.emit(self._output(
+                'output_finished', event['index'], created=event['path'], rows=event['rows'], duration=duration
+            ))
+
+    def _output(self, kind, index, **values):
+        filters, target = self.write_list[index - 1]
+        event = {'type': kind, 'index': index, 'files': len(self.write_list), 'filters': filters, 'path': target}
+        if kind == 'output_finished':
+            event['error'] = None
+        event.update(values)
+        return event
+
+    def started_all(self):
+        for index, (_, target) in enumerate(self.write_list, 1):
+            self.emit(self._output('output_started', index, path=target))
+
+    def finished_all(self, results, errors=None):
+        for index, created in enumerate(results, 1):
+            self.emit(self._output(
+                'output_finished', index, created=created, rows=None, duration=None,
+                error=errors[index - 1] if errors else None
+            ))
+
+def _write_outputs(session, write_list, valid_sheets, destination, options, emit, cancel):
+    """Создает файлы write_list; выполняется в рабочем потоке. Возвращает (results, delta_run)."""
+    events = _OutputEvents(write_list, emit)
+    with stage('writing'):
+        if options['delta']:
+            events.started_all()
+            delta_run = split_delta(
+                session, write_list, valid_sheets, destination, options['write_only'], options['engine']
+            )
+            events.finished_all(delta_run.results)
+            return delta_run.results, delta_run
+        if options['jobs'] > 1 and len(write_list) > 1:
+            events.started_all()
+            parallel_results = create_filtered_files_parallel(
+                session, write_list, valid_sheets, options['jobs'], options['write_only'], options['engine'],
+                options['values_only'], options['output_format'], options['memory_budget']
+            )
+            results = [created for _, created, _ in parallel_results]
+            # Статистика рабочих процессов не передается, размер файлов учитываем здесь
+            for created in results:
+                if created is not None:
+                    record_output(created, bytes_written=os.path.getsize(created))
+            events.finished_all(results, [error for _, _, error in parallel_results])
+            return results, None
+        streaming = options['values_only'] or options['output_format'] != 'xlsx' or options['engine'] != 'xml' \
+            or options['memory_budget']
+        if not streaming:
+            events.started_all()
+        results = create_filtered_files(
+            session, write_list, valid_sheets, options['write_only'], options['engine'],
+            progress=events, cancel=cancel, values_only=options['values_only'],
+            output_format=options['output_format'], memory_budget=options['memory_budget']
+        )
+        if not streaming:
+            events.finished_all(results)
+        return results, None
+
+def _stream(func, cancel):
+    """
+    Выполняет func(emit) в рабочем потоке и выдает переданные через emit события.
+    emit ждет, пока потребитель обработает событие, поэтому отмена, запрошенная
+    при обработке события, срабатывает в ближайшей точке проверки после него.
+    Возвращает результат func; исключение func пробрасывается.
+    Если генератор закрыт раньше времени, запрашивает отмену и ждет поток.
+    """
+    events = queue.Queue()
+    handled = threading.Event()
+    closed = threading.Event()
+
+    def emit(event):
+        if closed.is_set():
+            return
+        handled.clear()
+        events.put(('event', event))
+        while not handled.wait(0.1):
+            if closed.is_set():
+                return
+
+    def run():
+        try:
+            events.put(('result', func(emit)))
+        except BaseException as e:
+            events.put(('error', e))
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        while True:
+            kind, value = events.get()
+            if kind == 'event':
+                yield value
+                handled.set()
+            elif kind == 'error':
+                raise value
+            else:
+                return value
+    finally:
+        if worker.is_alive():
+            cancel.cancel()
+            closed.set()
+        worker.join()
+
+def split_workbook(source, destination, hierarchy_columns, selections=None, combinations=None,
+                   folder_hierarchy=False, write_only=WRITE_ONLY_OUTPUT, engine=DEFAULT_ENGINE, jobs=1,
+                   cache_dir=None, incremental=False, remove_stale=False, delta=False, values_only=False,
+                   output_format=OUTPUT_FORMAT, reader=DEFAULT_READER, memory_budget=None, cancel=None):
+    """
+    Разбивает книгу по категориям колонок hierarchy_columns и выдает события хода работы.
+
+    Параметры:
+    source (str | SourceWorkbook): Путь к исходному файлу или открытая сессия
+    destination (str): Целевая директория
+    hierarchy_columns (list): Колонки иерархии фильтров
+    selections (list): Выбор категорий по уровням, как в select_categories_from_spec
+    combinations (list): Готовые комбинации фильтров вместо selections
+    folder_hierarchy (bool): Раскладывать файлы по папкам уровней фильтра
+    write_only, engine, jobs, cache_dir, incremental, remove_stale, delta, values_only, output_format:
+        режимы записи, как в process_file
+    reader (str): Движок чтения значений источника ('openpyxl' или 'lean', см. readers);
+                  источник CSV читается движком 'lean' и требует values_only или
+                  формат вывода кроме xlsx
+    memory_budget (float): Бюджет памяти буферов строк в МБ (см. spill); требует
+                           values_only или формат вывода кроме xlsx
+    cancel (CancellationToken | threading.Event): Запрос отмены
+
+    Возвращает:
+    generator: События-словари (см. описание модуля)
+    """
+    started = time.perf_counter()
+    if delta and values_only:
+        raise ValueError("Delta mode does not support values_only outputs")
+    if (delta or incremental) and output_format != 'xlsx':
+        raise ValueError("Incremental and delta modes support only xlsx outputs")
+    if memory_budget and output_format == 'xlsx' and not values_only:
+        raise ValueError("Memory budget requires values_only or a csv/parquet/feather output format")
+    extension = output_extension(output_format)
+    if is_csv_source(source if isinstance(source, str) else source.path) and output_format == 'xlsx' \
+            and not values_only:
+        raise ValueError("CSV sources can only be split with values_only or a csv/parquet/feather output format")
+    own_session = not isinstance(source, SourceWorkbook)
+    if own_session:
+        if not os.path.isfile(source):
+            raise ValueError(f"Source file not found: {source}")
+        session = SourceWorkbook(source, SourceCache(cache_dir) if cache_dir else source_reader(reader, source))
+    else:
+        session = source
+    cancel = CancellationToken(cancel)
+    try:
+        stage_started = time.perf_counter()
+        valid_sheets = session.valid_sheets
+        if not valid_sheets:
+            raise ValueError("No headers found in any sheet")
+        common_headers = set.intersection(*[set(headers) for headers, _ in valid_sheets.values()])
+        missing = [col for col in hierarchy_columns if col not in common_headers]
+        if missing:
+            raise ValueError(f"Invalid columns: {', '.join(missing)}")
+        # Порядок колонок - как в первом листе
+        first_headers = next(iter(valid_sheets.values()))[0]
+        yield {
+            'type': 'analysis',
+            'sheets': list(valid_sheets),
+            'columns': [header for header in first_headers if header in common_headers],
+            'duration': _elapsed(stage_started),
+        }
+
+        stage_started = time.perf_counter()
+        if combinations is None:
+            # Движок columnar выбирает категории по той же таблице, что и строки для записи
+            index = columnar_table(session, valid_sheets, hierarchy_columns) if engine == 'columnar' else None
+            combinations = select_categories_from_spec(
+                session, valid_sheets, hierarchy_columns, selections, index=index
+            )
+        file_list = build_file_list(session.path, destination, combinations, folder_hierarchy, extension)
+        plan = None
+        write_list = file_list
+        if incremental and not delta:
+            plan = plan_incremental(session, file_list, valid_sheets, destination, {
+                'values_only': values_only, 'write_only': write_only, 'engine': engine,
+            })
+            write_list = plan.changed
+        yield {
+            'type': 'plan',
+            'combinations': len(combinations),
+            'files': file_list,
+            'write': write_list,
+            'unchanged': plan.unchanged if plan is not None else [],
+            'duration': _elapsed(stage_started),
+        }
+        if cancel.is_set():
+            yield {'type': 'cancelled', 'created': []}
+            return
+
+        for _, full_path in write_list:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        options = {
+            'write_only': write_only, 'engine': engine, 'jobs': jobs, 'delta': delta, 'values_only': values_only,
+            'output_format': output_format, 'memory_budget': memory_budget,
+        }
+        try:
+            results, delta_run = yield from _stream(
+                lambda emit: _write_outputs(session, write_list, valid_sheets, destination, options, emit, cancel),
+                cancel,
+            )
+        except SplitCancelled as e:
+            logger.info(f"Split of {session.path} cancelled, {len(e.created)} files created")
+            yield {'type': 'cancelled', 'created': e.created}
+            return
+
+        stale = []
+        if plan is not None:
+            removed = plan.finish(results, remove_stale)
+            stale = [{'path': path, 'removed': path in removed} for path in plan.stale]
+        yield {
+            'type': 'done',
+            'results': results,
+            'created': [created for created in results if created is not None],
+            'skipped': [
+                {'filters': filters, 'target': target}
+                for (filters, target), created in zip(write_list, results) if created is None
+            ],
+            'unchanged': plan.unchanged if plan is not None else [],
+            'stale': stale,
+            'delta': {
+                'mode': delta_run.mode,
+                'reason': delta_run.reason,
+                'appended': delta_run.appended,
+                'rebuilt': delta_run.rebuilt,
+            } if delta_run is not None else None,
+            'duration': _elapsed(started),
+        }
+    finally:
+        if own_session:
+            session.close()
+
+async def split_workbook_async(*args, **kwargs):
+    """
+    Асинхронный вариант split_workbook: те же параметры и события,
+    генератор выполняется в пуле потоков цикла событий.
+    """
+    loop = asyncio.get_running_loop()
+    events = split_workbook(*args, **kwargs)
+    try:
+        while True:
+            event = await loop.run_in_executor(None, next, events, None)
+            if event is None:
+                return
+            yield event
+    finally:
+        await loop.run_in_executor(None, events.close)
@@ -0,0 +1,198 @@
+"""
+Пакетный режим без интерактивного ввода: задания на разбиение читаются из файла
+спецификации (JSON или YAML) и выполняются параллельно в пуле процессов.
+
+Пример спецификации:
+{
+    "parallel": 2,
+    "summary": "summary.json",
+    "defaults": {"engine": "openpyxl", "write_only": false, "folder_hierarchy": false},
+    "jobs": [
+        {
+            "source": "sales.xlsx",
+            "destination": "out/sales",
+            "hierarchy_columns": ["Region", "City"],
+            "categories": [["North", "South"], "all"],
+            "folder_hierarchy": true
+        }
+    ]
+}
+
+categories - выбор по уровням иерархии: "all" (этот и следующие уровни),
+"each" (все категории только этого уровня) или список значений.
+incremental и remove_stale включают инкрементальный режим, delta - дозапись
+новых строк, values_only - запись только значений, output_format - формат файлов
+(xlsx, csv, parquet, feather), reader - движок чтения источника (openpyxl, lean),
+memory_budget - бюджет памяти буферов строк в МБ, как в командной строке.
+Относительные пути считаются от каталога файла спецификации.
+"""
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from excel_utils.instrumentation import start_run, finish_run
+from core.api import split_workbook
+from config import (
+    WRITE_ONLY_OUTPUT, DEFAULT_ENGINE, SOURCE_CACHE_DIR, INCREMENTAL_SPLIT, REMOVE_STALE_OUTPUTS, DELTA_SPLIT,
+    VALUES_ONLY_OUTPUT, OUTPUT_FORMAT, DEFAULT_READER, MEMORY_BUDGET_MB
+)
+
+logger = logging.getLogger('excel_splitter')
+
+JOB_OPTIONS = (
+    'engine', 'write_only', 'folder_hierarchy', 'cache_dir', 'incremental', 'remove_stale', 'delta', 'values_only',
+    'output_format', 'reader', 'memory_budget'
+)
+
+def load_job_spec(spec_path):
+    """Читает спецификацию заданий из JSON или YAML (YAML требует PyYAML)."""
+    with open(spec_path, encoding="utf-8") as f:
+        if spec_path.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML job specs require PyYAML (pip install pyyaml)")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    if not isinstance(spec, dict) or not isinstance(spec.get('jobs'), list):
+        raise ValueError("Job spec must be an object with a 'jobs' list")
+    return spec
+
+def resolve_jobs(spec, spec_path, defaults=None):
+    """
+    Готовит задания к выполнению: подставляет значения по умолчанию
+    и переводит относительные пути в абсолютные от каталога спецификации.
+    """
+    base_dir = os.path.dirname(os.path.abspath(spec_path))
+    options = {
+        'engine': DEFAULT_ENGINE,
+        'write_only': WRITE_ONLY_OUTPUT,
+        'folder_hierarchy': False,
+        'cache_dir': SOURCE_CACHE_DIR,
+        'incremental': INCREMENTAL_SPLIT,
+        'remove_stale': REMOVE_STALE_OUTPUTS,
+        'delta': DELTA_SPLIT,
+        'values_only': VALUES_ONLY_OUTPUT,
+        'output_format': OUTPUT_FORMAT,
+        'reader': DEFAULT_READER,
+        'memory_budget': MEMORY_BUDGET_MB,
+    }
+    options.update(defaults or {})
+    if options['cache_dir']:
+        # Каталог кэша из командной строки задается относительно текущего каталога
+        options['cache_dir'] = os.path.abspath(options['cache_dir'])
+    options.update({key: value for key, value in spec.get('defaults', {}).items() if key in JOB_OPTIONS})
+
+    jobs = []
+    for job_idx, job in enumerate(spec['jobs']):
+        for key in ('source', 'destination', 'hierarchy_columns'):
+            if key not in job:
+                raise ValueError(f"Job {job_idx}: missing required field '{key}'")
+        resolved = dict(options)
+        resolved.update(job)
+        resolved['name'] = job.get('name', os.path.splitext(os.path.basename(job['source']))[0])
+        for key in ('source', 'destination', 'cache_dir'):
+            if resolved.get(key):
+                resolved[key] = os.path.join(base_dir, resolved[key])
+        jobs.append(resolved)
+    return jobs
+
+def run_job(job):
+    """
+    Выполняет одно задание. Ошибки не пробрасываются, а попадают в сводку.
+    Возвращает словарь сводки: состояние, время этапов и созданные файлы.
+    """
+    summary = {
+        'name': job['name'],
+        'source': job['source'],
+        'destination': job['destination'],
+        'status': 'ok',
+        'error': None,
+        'timings': {},
+        'combinations': 0,
+        'outputs': [],
+        'skipped': [],
+        'unchanged': [],
+        'stale': [],
+        'delta': None,
+        'stats': None,
+    }
+    start_run()
+    started = time.perf_counter()
+    try:
+        events = split_workbook(
+            job['source'], job['destination'], job['hierarchy_columns'], job.get('categories'),
+            folder_hierarchy=job['folder_hierarchy'], write_only=job['write_only'], engine=job['engine'],
+            cache_dir=job.get('cache_dir'), incremental=job['incremental'], remove_stale=job['remove_stale'],
+            delta=job['delta'], values_only=job['values_only'], output_format=job['output_format'],
+            reader=job['reader'], memory_budget=job['memory_budget']
+        )
+        for event in events:
+            if event['type'] == 'analysis':
+                summary['timings']['analysis'] = event['duration']
+            elif event['type'] == 'plan':
+                summary['timings']['selection'] = event['duration']
+                summary['combinations'] = event['combinations']
+                summary['unchanged'] = event['unchanged']
+                writing_started = time.perf_counter()
+            elif event['type'] == 'output_finished':
+                if event['created'] is not None:
+                    summary['outputs'].append({'filters': event['filters'], 'path': event['created']})
+                else:
+                    summary['skipped'].append({'filters': event['filters'], 'target': event['path']})
+            elif event['type'] == 'done':
+                summary['timings']['writing'] = round(time.perf_counter() - writing_started, 3)
+                summary['stale'] = event['stale']
+                if event['delta'] is not None:
+                    summary['delta'] = {key: event['delta'][key] for key in ('mode', 'reason', 'appended')}
+    except Exception as e:
+        logger.exception(f"Batch job {job['name']} failed")
+        summary['status'] = 'error'
+        summary['error'] = str(e)
+    summary['timings']['total'] = round(time.perf_counter() - started, 3)
+    summary['stats'] = finish_run().to_dict()
+    logger.info(f"Batch job {job['name']} finished with status {summary['status']}")
+    return summary
+
+def run_batch(spec_path, parallel=None, summary_path=None, defaults=None):
+    """
+    Выполняет все задания спецификации, не более parallel одновременно,
+    и записывает сводку в JSON. Возвращает словарь сводки.
+    """
+    spec = load_job_spec(spec_path)
+    jobs = resolve_jobs(spec, spec_path, defaults)
+    parallel = max(1, parallel or spec.get('parallel', 1))
+    if summary_path:
+        summary_path = os.path.abspath(summary_path)
+    elif spec.get('summary'):
+        summary_path = os.path.join(os.path.dirname(os.path.abspath(spec_path)), spec['summary'])
+    else:
+        summary_path = os.path.splitext(os.path.abspath(spec_path))[0] + ".summary.json"
+
+    logger.info(f"Running {len(jobs)} batch jobs from {spec_path} with parallelism {parallel}")
+    started_at = datetime.now().isoformat(timespec='seconds')
+    started = time.perf_counter()
+    if parallel > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(parallel, len(jobs))) as executor:
+            job_summaries = list(executor.map(run_job, jobs))
+    else:
+        job_summaries = [run_job(job) for job in jobs]
+
+    summary = {
+        'spec': os.path.abspath(spec_path),
+        'started_at': started_at,
+        'elapsed': round(time.perf_counter() - started, 3),
+        'parallel': parallel,
+        'jobs_total': len(job_summaries),
+        'jobs_failed': sum(1 for job in job_summaries if job['status'] != 'ok'),
+        'files_created': sum(len(job['outputs']) for job in job_summaries),
+        'jobs': job_summaries,
+    }
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2, default=str)
+    summary['summary_path'] = summary_path
+    logger.info(f"Batch summary written to {summary_path}")
+    return summary
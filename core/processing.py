@@ -1,16 +1,46 @@
 import os
 import logging
-from excel_utils.analysis import get_all_sheets_headers, analyze_column
 from excel_utils.filtering import select_categories_sequentially
-from excel_utils.formatting import sanitize_filename, generate_short_filename
-from excel_utils.workbook import create_filtered_file
+from excel_utils.source import SourceWorkbook
+from excel_utils.source_cache import SourceCache
+from excel_utils.columnar import columnar_table
+from excel_utils.readers import source_reader, is_csv_source
+from excel_utils.instrumentation import start_run, finish_run
+from core.api import split_workbook
+from config import (
+    DEFAULT_JOBS, WRITE_ONLY_OUTPUT, DEFAULT_ENGINE, SOURCE_CACHE_DIR, INCREMENTAL_SPLIT, REMOVE_STALE_OUTPUTS,
+    DELTA_SPLIT, VALUES_ONLY_OUTPUT, OUTPUT_FORMAT, DEFAULT_READER, MEMORY_BUDGET_MB, RUN_STATS_JSON, PROFILE_OUTPUT
+)
 logger = logging.getLogger('excel_splitter')
 
-def process_file():
-    """Обрабатывает один файл: выбор файла, директории, колонок, категорий, создание файлов."""
+def process_file(jobs=DEFAULT_JOBS, write_only=WRITE_ONLY_OUTPUT, engine=DEFAULT_ENGINE, cache_dir=SOURCE_CACHE_DIR,
+                 incremental=INCREMENTAL_SPLIT, remove_stale=REMOVE_STALE_OUTPUTS, delta=DELTA_SPLIT,
+                 values_only=VALUES_ONLY_OUTPUT, output_format=OUTPUT_FORMAT, reader=DEFAULT_READER,
+                 memory_budget=MEMORY_BUDGET_MB, stats_json=RUN_STATS_JSON, profile=PROFILE_OUTPUT):
+    """
+    Обрабатывает один файл: выбор файла, директории, колонок, категорий, создание файлов.
+    При jobs > 1 файлы создаются параллельно в пуле из jobs процессов,
+    при write_only выходные книги пишутся потоково, engine выбирает движок разбиения.
+    При заданном cache_dir заголовки и категории читаются из кэша разобранной книги.
+    Исходная книга открывается один раз в сессии SourceWorkbook на всю обработку.
+    При incremental перезаписываются только файлы, содержимое которых изменилось
+    с прошлого запуска (по манифесту в целевой директории).
+    При delta в существующие файлы дописываются только строки, добавленные
+    в конец листов источника; при изменении прежних строк файлы создаются заново.
+    При values_only в файлы пишутся только значения ячеек, без стилей и форматирования.
+    output_format - формат выходных файлов: 'xlsx', 'csv', 'parquet' или 'feather'.
+    reader - движок чтения значений источника ('openpyxl' или 'lean'); файлы CSV
+    читаются движком 'lean' и разбиваются с values_only или в формат кроме xlsx.
+    memory_budget - бюджет памяти буферов строк в МБ: строки сверх него выгружаются
+    во временные файлы (только с values_only или форматом кроме xlsx).
+    По завершении выводится таблица времени этапов и счетчиков; stats_json - файл
+    для этой статистики в JSON, profile - файл для статистики cProfile.
+    """
     logger.info("Starting file processing")
     print("\n=== Copy Excel File ===")
     print("To cancel the operation, press Ctrl+C at any time")
+    session = None
+    start_run(profile=profile is not None)
     try:
         # Шаг 0: Выбор исходного файла
         while True:
@@ -20,8 +50,13 @@ def process_file():
                 return False
             if os.path.exists(source) and os.path.isfile(source):
                 # Проверка формата файла
+                if is_csv_source(source):
+                    if output_format == 'xlsx' and not values_only:
+                        print("Error: CSV files require values-only mode or a csv/parquet/feather output format")
+                        continue
+                    break
                 if not (source.lower().endswith('.xlsx') or source.lower().endswith('.xlsm')):
-                    print("Error: File must have .xlsx or .xlsm extension")
+                    print("Error: File must have .xlsx, .xlsm or .csv extension")
                     continue
                 break
             print(f"Error: Source file not found or is not a file: {source}")
@@ -37,7 +72,9 @@ def process_file():
             print(f"Error: Target directory does not exist: {destination}")
         
         # Анализ Excel: заголовки во всех листах
-        sheet_headers = get_all_sheets_headers(source)
+        cache = SourceCache(cache_dir) if cache_dir else source_reader(reader, source)
+        session = SourceWorkbook(source, cache)
+        sheet_headers = session.sheet_headers()
         valid_sheets = {sheet: data for sheet, data in sheet_headers.items() if data[0] is not None}
         if not valid_sheets:
             logger.error("No headers found in any sheet")
@@ -92,7 +129,8 @@ def process_file():
         
         # Шаг 3: Последовательный выбор категорий
         print("\nStarting sequential category selection...")
-        all_combinations = select_categories_sequentially(source, valid_sheets, hierarchy_columns)
+        index = columnar_table(session, valid_sheets, hierarchy_columns) if engine == 'columnar' else None
+        all_combinations = select_categories_sequentially(session, valid_sheets, hierarchy_columns, index)
         if not all_combinations:
             print("No combinations selected")
             return False
@@ -100,36 +138,18 @@ def process_file():
         # Шаг 4: Опция выбора: создать иерархию папок или сохранить все файлы в одну папку
         create_hierarchy = input("\nDo you want to create folder hierarchy based on filter levels? (y/n): ").strip().lower() == 'y'
         
-        # Шаг 5: Формирование путей к файлам
-        base_name = os.path.splitext(os.path.basename(source))[0]
-        file_list = []
-        
-        # Формируем пути для всех комбинаций
-        for filters in all_combinations:
-            if create_hierarchy:
-                # Создаем путь с иерархией папок
-                current_path = destination
-                for col, value in filters.items():
-                    # Используем полное имя категории для папки
-                    folder_name = sanitize_filename(value)
-                    current_path = os.path.join(current_path, folder_name)
-                # Генерируем имя файла без включения пути
-                short_filename = generate_short_filename(
-                    os.path.join(current_path, base_name),
-                    filters,
-                    is_folder_hierarchy=True
-                )
-                full_path = os.path.join(current_path, short_filename)
-                file_list.append((filters, full_path))
-            else:
-                # Сохраняем все файлы в одну папку
-                short_filename = generate_short_filename(
-                    os.path.join(destination, base_name),
-                    filters,
-                    is_folder_hierarchy=False
-                )
-                full_path = os.path.join(destination, short_filename)
-                file_list.append((filters, full_path))
+        # Шаг 5: Формирование путей к файлам (план разбиения от split_workbook)
+        events = split_workbook(
+            session, destination, hierarchy_columns, combinations=all_combinations,
+            folder_hierarchy=create_hierarchy, write_only=write_only, engine=engine, jobs=jobs,
+            incremental=incremental, remove_stale=remove_stale, delta=delta, values_only=values_only,
+            output_format=output_format, memory_budget=memory_budget
+        )
+        plan = next((event for event in events if event['type'] == 'plan'), None)
+        if plan is None:
+            print("Error: Split plan was not produced")
+            return False
+        file_list = plan['files']
         
         # Шаг 6: Отображаем информацию и запрашиваем подтверждение
         print(f"\nWill create {len(file_list)} files:")
@@ -137,26 +157,46 @@ def process_file():
             print(f"  {i}. {file_path}")
         
         if input("\nProceed with processing? (y/n): ").strip().lower() != 'y':
+            events.close()
             print("Processing cancelled by user")
             return False
+        if incremental and not delta:
+            print(f"\nIncremental mode: {len(plan['write'])} files changed, {len(plan['unchanged'])} unchanged")
         
-        # Создаем все необходимые папки
-        for _, full_path in file_list:
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        
-        # Шаг 7: Создание файлов
-        created_files = []
-        for filters, full_path in file_list:
-            # Создаем файл
-            created_file = create_filtered_file(source, full_path, valid_sheets, filters)
-            if created_file is not None:
-                created_files.append(created_file)
+        # Шаг 7: Создание файлов за один проход по исходной книге
+        done = None
+        for event in events:
+            if event['type'] == 'output_finished' and event['error']:
+                print(f"Error creating {event['path']}: {event['error']}")
+            elif event['type'] == 'done':
+                done = event
+            elif event['type'] == 'cancelled':
+                print(f"\nProcessing cancelled, {len(event['created'])} files created")
+                return False
+        if done is None:
+            print("Error: Processing finished without a result")
+            return False
+        delta_run = done['delta']
+        created_files = done['created']
+        if delta_run is not None:
+            if delta_run['mode'] == 'rebuild':
+                print(f"\nDelta mode: full rebuild ({delta_run['reason']})")
+            else:
+                print(f"\nDelta mode: new rows appended to {len(delta_run['appended'])} files")
+                for path, rows in delta_run['appended'].items():
+                    print(f"  + {rows} rows: {path}")
+            created_files = delta_run['rebuilt']
+        for stale in done['stale']:
+            status = "removed" if stale['removed'] else "no longer produced"
+            print(f"Stale output {status}: {stale['path']}")
         
         # Вывод результатов
         if created_files:
             print(f"\nCreated {len(created_files)} files:")
             for file in created_files:
                 print(f"  - {file}")
+        elif done['unchanged'] or (delta_run is not None and delta_run['mode'] == 'delta'):
+            print("All files are up to date")
         else:
             print("Warning: No files created (no data matched the filters)")
         return True
@@ -167,4 +207,25 @@ def process_file():
     except Exception as e:
         logger.exception("Unexpected error during file processing")
         print(f"Error: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+    finally:
+        if session is not None:
+            session.close()
+        report_run_stats(finish_run(), stats_json, profile)
+
+def report_run_stats(stats, stats_json=None, profile=None):
+    """Выводит таблицу статистики запуска и сохраняет ее и профиль в файлы."""
+    if stats is None or not stats.stages:
+        return
+    print("\nRun statistics:")
+    print(stats.format_table())
+    try:
+        if stats_json:
+            stats.write_json(stats_json)
+            print(f"Statistics written to {stats_json}")
+        if profile:
+            print(stats.dump_profile(profile))
+            print(f"Profile written to {profile}")
+    except OSError as e:
+        logger.error(f"Error writing run statistics: {str(e)}")
+        print(f"Error writing run statistics: {str(e)}")
\ No newline at end of file
@@ -1,20 +1,37 @@
 # Импорты для пакета excel_utils
 try:
     from .analysis import get_all_sheets_headers, analyze_column
-    from .filtering import get_all_combinations, select_categories_sequentially
+    from .filtering import get_all_combinations, select_categories_sequentially, select_categories_from_spec
+    from .category_index import build_category_index
+    from .columnar import ColumnarTable, build_columnar_table
     from .formatting import sanitize_filename, generate_short_filename
     from .workbook import create_filtered_file
+    from .partitioning import create_filtered_files, SplitCancelled
     from .common import validate_row
+    from .source_cache import SourceCache
+    from .source import SourceWorkbook
+    from .incremental import plan_incremental
+    from .delta import split_delta
     
     __all__ = [
         'get_all_sheets_headers',
         'analyze_column',
         'get_all_combinations',
         'select_categories_sequentially',
+        'select_categories_from_spec',
+        'build_category_index',
+        'ColumnarTable',
+        'build_columnar_table',
         'sanitize_filename',
         'generate_short_filename',
         'create_filtered_file',
-        'validate_row'
+        'create_filtered_files',
+        'SplitCancelled',
+        'validate_row',
+        'SourceCache',
+        'SourceWorkbook',
+        'plan_incremental',
+        'split_delta'
     ]
     
     # Убираем логгирование из __init__.py
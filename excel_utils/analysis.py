@@ -1,29 +1,21 @@
-from contextlib import contextmanager
-import openpyxl
-from .common import validate_row
+from .common import compile_filters
+from .source import values_workbook, source_path
+from .source_cache import iter_sheet_values
+from .instrumentation import timed_stage
 import logging
 
 logger = logging.getLogger('excel_splitter')
 
-@contextmanager
-def safe_workbook(file_path, read_only=False):
-    """Контекстный менеджер для безопасной работы с файлами Excel."""
-    wb = None
+@timed_stage('header_detection')
+def get_all_sheets_headers(file_path, max_scan_rows=10, cache=None):
+    """
+    Анализирует все ВИДИМЫЕ листы в Excel-файле, возвращает заголовки для каждого.
+    file_path может быть путем или сессией SourceWorkbook.
+    При заданном cache (SourceCache) значения читаются из кэша разобранной книги.
+    """
+    logger.info(f"Analyzing headers in {source_path(file_path)}")
     try:
-        wb = openpyxl.load_workbook(file_path, read_only=read_only)
-        yield wb
-    finally:
-        if wb:
-            try:
-                wb.close()
-            except Exception as e:
-                logger.error(f"Error closing workbook: {str(e)}")
-
-def get_all_sheets_headers(file_path, max_scan_rows=10):
-    """Анализирует все ВИДИМЫЕ листы в Excel-файле, возвращает заголовки для каждого."""
-    logger.info(f"Analyzing headers in {file_path}")
-    try:
-        with safe_workbook(file_path, read_only=True) as wb:
+        with values_workbook(file_path, cache) as wb:
             sheet_results = {}
             for ws in wb.worksheets:
                 # Игнорируем скрытые листы
@@ -32,14 +24,14 @@ def get_all_sheets_headers(file_path, max_scan_rows=10):
                 max_non_empty = 0
                 header_row = None
                 header_row_idx = 0
-                for row_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=max_scan_rows), start=1):
-                    non_empty_count = sum(1 for cell in row if cell.value is not None)
+                for row_idx, row in enumerate(iter_sheet_values(ws, min_row=1, max_row=max_scan_rows), start=1):
+                    non_empty_count = sum(1 for value in row if value is not None)
                     if non_empty_count > max_non_empty:
                         max_non_empty = non_empty_count
                         header_row = row
                         header_row_idx = row_idx
                 if max_non_empty > 0:
-                    headers = [cell.value for cell in header_row if cell.value is not None]
+                    headers = [value for value in header_row if value is not None]
                     sheet_results[ws.title] = (headers, header_row_idx)
                     logger.debug(f"Found headers in sheet {ws.title}: {headers}")
                 else:
@@ -49,13 +41,14 @@ def get_all_sheets_headers(file_path, max_scan_rows=10):
         logger.error(f"Error analyzing Excel: {str(e)}")
         raise ValueError(f"Error analyzing Excel: {str(e)}")
 
-def analyze_column(file_path, valid_sheets, selected_column, filters=None):
+@timed_stage('category_analysis')
+def analyze_column(file_path, valid_sheets, selected_column, filters=None, cache=None):
     """Собирает уникальные значения из указанной колонки с учетом фильтров."""
     if filters is None:
         filters = {}
     logger.info(f"Analyzing column {selected_column} with filters {filters}")
     try:
-        with safe_workbook(file_path, read_only=True) as wb:
+        with values_workbook(file_path, cache) as wb:
             categories = set()
             for sheet_name, (headers, row_idx) in valid_sheets.items():
                 ws = wb[sheet_name]
@@ -63,9 +56,10 @@ def analyze_column(file_path, valid_sheets, selected_column, filters=None):
                     col_index = headers.index(selected_column)
                 except ValueError:
                     continue
-                for row in ws.iter_rows(min_row=row_idx + 1, values_only=True):
-                    if not validate_row(row, headers, row_idx, filters):
-                        continue
+                matcher = compile_filters(headers, filters)
+                columns = {col_index} | {idx for idx, _ in matcher.conditions}
+                rows = iter_sheet_values(ws, min_row=row_idx + 1, columns=columns)
+                for row in matcher.iter_matching(rows):
                     cell_value = row[col_index] if col_index < len(row) else None
                     if cell_value is not None and str(cell_value).strip() != "":
                         categories.add(str(cell_value).strip())
@@ -0,0 +1,102 @@
+import logging
+from .source import values_workbook
+from .source_cache import iter_sheet_values
+from .common import normalize_value
+from .instrumentation import timed_stage
+
+logger = logging.getLogger('excel_splitter')
+
+class CategoryNode:
+    """Узел дерева категорий: варианты написания значения, число строк и дочерние узлы."""
+    __slots__ = ('labels', 'count', 'children')
+
+    def __init__(self):
+        self.labels = set()
+        self.count = 0
+        self.children = {}
+
+class CategoryIndex:
+    """
+    Вложенное дерево значений колонок иерархии, построенное за один проход.
+
+    Дочерние узлы хранятся по нормализованному значению (без учета регистра),
+    как сравнивает validate_row, а в labels сохраняются исходные написания,
+    как их возвращает analyze_column.
+    """
+
+    def __init__(self, hierarchy_columns):
+        self.hierarchy_columns = list(hierarchy_columns)
+        self.root = CategoryNode()
+
+    def add_row(self, values):
+        """Добавляет в дерево значения одной строки по уровням иерархии."""
+        node = self.root
+        node.count += 1
+        for value in values:
+            if value is None:
+                break
+            label = str(value).strip()
+            if label == "":
+                break
+            child = node.children.get(label.lower())
+            if child is None:
+                child = CategoryNode()
+                node.children[label.lower()] = child
+            child.labels.add(label)
+            child.count += 1
+            node = child
+
+    def find_node(self, filters, level):
+        """Возвращает узел, соответствующий фильтрам первых level уровней."""
+        node = self.root
+        for column in self.hierarchy_columns[:level]:
+            if column not in filters:
+                return None
+            node = node.children.get(normalize_value(filters[column]))
+            if node is None:
+                return None
+        return node
+
+    def categories(self, level, filters=None):
+        """Возвращает отсортированные категории уровня level с учетом фильтров."""
+        node = self.find_node(filters or {}, level)
+        if node is None:
+            return []
+        labels = set()
+        for child in node.children.values():
+            labels.update(child.labels)
+        return sorted(labels)
+
+    def row_count(self, filters=None):
+        """Возвращает число строк, соответствующих фильтрам."""
+        filters = filters or {}
+        node = self.find_node(filters, len(filters))
+        return node.count if node is not None else 0
+
+@timed_stage('category_analysis')
+def build_category_index(file_path, valid_sheets, hierarchy_columns, cache=None):
+    """
+    Строит индекс категорий для колонок иерархии за один проход по книге.
+    При заданном cache (SourceCache) читаются только колонки иерархии из кэша.
+    """
+    logger.info(f"Building category index for columns {hierarchy_columns}")
+    index = CategoryIndex(hierarchy_columns)
+    try:
+        with values_workbook(file_path, cache) as wb:
+            for sheet_name, (headers, row_idx) in valid_sheets.items():
+                # Как и analyze_column, уровень без колонки в листе обрывает ветку
+                col_indexes = []
+                for column in hierarchy_columns:
+                    if column not in headers:
+                        break
+                    col_indexes.append(headers.index(column))
+                if not col_indexes:
+                    continue
+                ws = wb[sheet_name]
+                for row in iter_sheet_values(ws, min_row=row_idx + 1, columns=col_indexes):
+                    row_length = len(row)
+                    index.add_row([row[idx] if idx < row_length else None for idx in col_indexes])
+        return index
+    except Exception as e:
+        logger.error(f"Error building category index: {str(e)}")
+        raise ValueError(f"Error building category index: {str(e)}")
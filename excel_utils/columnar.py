@@ -0,0 +1,284 @@
+"""
+Колоночное хранилище колонок иерархии с кодированием значений словарем.
+
+Для каждого листа с заголовками значения колонок иерархии один раз
+переводятся в целочисленные коды (одинаковые без учета регистра значения
+получают один код), и строки группируются сортировкой по кодам уровней.
+После этого строки любой комбинации фильтров - непрерывный диапазон
+отсортированного порядка, который находится двоичным поиском, а список
+категорий уровня - уникальные коды этого диапазона. Индексы строк
+используются и для выбора категорий, и для записи выходных файлов.
+
+Если установлен NumPy, коды хранятся в массивах NumPy и группировка
+выполняется векторно (lexsort/searchsorted/unique), иначе используются
+массивы array и сортировка Python с тем же результатом.
+"""
+import logging
+from array import array
+from bisect import bisect_left
+from .source import SourceWorkbook, values_workbook
+from .source_cache import iter_sheet_values
+from .common import find_header_index, normalize_value
+from .instrumentation import stage, count
+
+logger = logging.getLogger('excel_splitter')
+
+# Код пустого значения и код отсутствующей в листе колонки
+EMPTY_CODE = 0
+MISSING_CODE = -1
+
+def _numpy():
+    """Модуль numpy или None, если он не установлен."""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+class ColumnDictionary:
+    """Словарь колонки: нормализованное значение -> код, код -> исходные написания."""
+    __slots__ = ('codes', 'labels', 'raw')
+
+    def __init__(self):
+        self.codes = {"": EMPTY_CODE}
+        self.labels = [set()]
+        # Коды уже встречавшихся исходных значений, чтобы не нормализовать их повторно.
+        # Ключ включает тип: True == 1 == 1.0, но их написания "True", "1" и "1.0" различны
+        self.raw = {(type(None), None): EMPTY_CODE}
+
+    def encode(self, value):
+        raw_key = (type(value), value)
+        code = self.raw.get(raw_key)
+        if code is not None:
+            return code
+        label = str(value).strip()
+        key = label.lower()
+        code = self.codes.get(key)
+        if code is None:
+            code = len(self.labels)
+            self.codes[key] = code
+            self.labels.append(set())
+        if label:
+            self.labels[code].add(label)
+        self.raw[raw_key] = code
+        return code
+
+    def lookup(self, value):
+        """Код значения фильтра или None, если такого значения нет."""
+        return self.codes.get(normalize_value(value))
+
+class SheetMeta:
+    """
+    Закодированный лист: codes - коды строк данных по уровням иерархии,
+    order - номера строк, отсортированные по кодам, keys - коды в этом порядке.
+    """
+    __slots__ = ('name', 'header_row', 'row_count', 'codes', 'order', 'keys')
+
+    def __init__(self, name, header_row, row_count, codes):
+        self.name = name
+        self.header_row = header_row
+        self.row_count = row_count
+        self.codes = codes
+        self.order = None
+        self.keys = None
+
+class ColumnarTable:
+    """
+    Закодированные колонки иерархии всех листов с заголовками.
+
+    Индексы строк отсчитываются от первой строки данных листа (строка после
+    заголовков). Методы categories и row_count совпадают с CategoryIndex,
+    поэтому таблицу можно передавать как index в функции выбора категорий.
+    """
+
+    def __init__(self, hierarchy_columns):
+        if not hierarchy_columns:
+            raise ValueError("Columnar table requires at least one hierarchy column")
+        self.hierarchy_columns = list(hierarchy_columns)
+        self.dictionaries = [ColumnDictionary() for _ in self.hierarchy_columns]
+        self.sheets = {}
+        self.np = _numpy()
+
+    def add_sheet(self, name, headers, header_row, rows):
+        """Кодирует строки данных листа (кортежи значений) и группирует их."""
+        col_indexes = [find_header_index(headers, column) for column in self.hierarchy_columns]
+        codes = [array('i') for _ in self.hierarchy_columns]
+        levels = list(zip(col_indexes, codes, self.dictionaries))
+        row_count = 0
+        for row in rows:
+            row_length = len(row)
+            for col_index, level_codes, dictionary in levels:
+                if col_index is None:
+                    level_codes.append(MISSING_CODE)
+                else:
+                    level_codes.append(dictionary.encode(row[col_index] if col_index < row_length else None))
+            row_count += 1
+        meta = SheetMeta(name, header_row, row_count, codes)
+        self._group(meta)
+        self.sheets[name] = meta
+        return meta
+
+    def _group(self, meta):
+        """Сортирует строки листа по кодам уровней (первый уровень - старший)."""
+        np = self.np
+        if np is not None:
+            meta.codes = np.vstack([np.asarray(level_codes, dtype=np.int32) for level_codes in meta.codes])
+            meta.order = np.lexsort(meta.codes[::-1])
+            meta.keys = meta.codes[:, meta.order]
+        else:
+            keys = list(zip(*meta.codes))
+            meta.order = sorted(range(meta.row_count), key=keys.__getitem__)
+            meta.keys = [keys[idx] for idx in meta.order]
+
+    def _conditions(self, filters):
+        """Пары (уровень, код) для фильтров или None, если значения нет ни в одной строке."""
+        levels = {str(column).lower(): level for level, column in enumerate(self.hierarchy_columns)}
+        conditions = []
+        for column, value in (filters or {}).items():
+            level = levels.get(str(column).lower())
+            if level is None:
+                raise ValueError(f"Column '{column}' is not in the columnar table")
+            code = self.dictionaries[level].lookup(value)
+            if code is None:
+                return None
+            conditions.append((level, code))
+        return sorted(conditions)
+
+    def sheet_rows(self, sheet_name, filters):
+        """Индексы строк данных листа, подходящих под фильтры, по возрастанию."""
+        meta = self.sheets.get(sheet_name)
+        if meta is None:
+            return []
+        conditions = self._conditions(filters)
+        if conditions is None:
+            return []
+        return self._rows(meta, conditions)
+
+    def rows(self, filters):
+        """Индексы подходящих строк по листам: имя листа -> индексы."""
+        conditions = self._conditions(filters)
+        if conditions is None:
+            return {}
+        return {name: self._rows(meta, conditions) for name, meta in self.sheets.items()}
+
+    def partition(self, filters_list):
+        """Индексы строк каждой комбинации фильтров: список словарей лист -> индексы."""
+        return [self.rows(filters) for filters in filters_list]
+
+    def _rows(self, meta, conditions):
+        np = self.np
+        if [level for level, _ in conditions] != list(range(len(conditions))):
+            # Фильтры не по первым уровням иерархии: сравнение кодов по всем строкам
+            if np is not None:
+                mask = np.ones(meta.row_count, dtype=bool)
+                for level, code in conditions:
+                    mask &= meta.codes[level] == code
+                return np.flatnonzero(mask)
+            return [
+                idx for idx in range(meta.row_count)
+                if all(meta.codes[level][idx] == code for level, code in conditions)
+            ]
+        low, high = self._range(meta, [code for _, code in conditions])
+        if np is not None:
+            return np.sort(meta.order[low:high])
+        return sorted(meta.order[low:high])
+
+    def _range(self, meta, prefix):
+        """Диапазон отсортированного порядка строк с кодами первых уровней prefix."""
+        if not prefix:
+            return 0, meta.row_count
+        if self.np is not None:
+            low, high = 0, meta.row_count
+            for level, code in enumerate(prefix):
+                level_keys = meta.keys[level, low:high]
+                low, high = (
+                    low + int(level_keys.searchsorted(code, 'left')),
+                    low + int(level_keys.searchsorted(code, 'right')),
+                )
+            return low, high
+        prefix = tuple(prefix)
+        upper = prefix[:-1] + (prefix[-1] + 1,)
+        return bisect_left(meta.keys, prefix), bisect_left(meta.keys, upper)
+
+    def categories(self, level, filters=None):
+        """Возвращает отсортированные категории уровня level с учетом фильтров."""
+        prefix = self._prefix(filters, level)
+        if prefix is None or level >= len(self.hierarchy_columns):
+            return []
+        codes = set()
+        for meta in self.sheets.values():
+            low, high = self._range(meta, prefix)
+            if self.np is not None:
+                codes.update(int(code) for code in self.np.unique(meta.keys[level, low:high]))
+            else:
+                codes.update(key[level] for key in meta.keys[low:high])
+        labels = set()
+        for code in codes:
+            if code > EMPTY_CODE:
+                labels.update(self.dictionaries[level].labels[code])
+        return sorted(labels)
+
+    def row_count(self, filters=None):
+        """Возвращает число строк, соответствующих фильтрам."""
+        filters = filters or {}
+        prefix = self._prefix(filters, len(filters))
+        if prefix is None:
+            return 0
+        total = 0
+        for meta in self.sheets.values():
+            low, high = self._range(meta, prefix)
+            total += high - low
+        return total
+
+    def _prefix(self, filters, level):
+        """
+        Коды фильтров первых level уровней или None, если их нет. Как и в
+        CategoryIndex, пустое значение обрывает ветку иерархии.
+        """
+        prefix = []
+        for column_level, column in enumerate(self.hierarchy_columns[:level]):
+            if column not in (filters or {}):
+                return None
+            code = self.dictionaries[column_level].lookup(filters[column])
+            if code is None or code <= EMPTY_CODE:
+                return None
+            prefix.append(code)
+        return prefix
+
+def build_columnar_table(source, valid_sheets, hierarchy_columns, cache=None):
+    """
+    Строит колоночную таблицу колонок иерархии за один проход по книге.
+    При заданном cache (SourceCache) читаются только колонки иерархии из кэша.
+    """
+    logger.info(f"Building columnar table for columns {hierarchy_columns}")
+    table = ColumnarTable(hierarchy_columns)
+    try:
+        with stage('column_encoding'):
+            with values_workbook(source, cache) as wb:
+                for sheet_name, (headers, row_idx) in valid_sheets.items():
+                    col_indexes = [
+                        idx for idx in (find_header_index(headers, column) for column in hierarchy_columns)
+                        if idx is not None
+                    ]
+                    rows = iter_sheet_values(wb[sheet_name], min_row=row_idx + 1, columns=col_indexes)
+                    meta = table.add_sheet(sheet_name, headers, row_idx, rows)
+                    count('rows_encoded', meta.row_count)
+        return table
+    except Exception as e:
+        logger.error(f"Error building columnar table: {str(e)}")
+        raise ValueError(f"Error building columnar table: {str(e)}")
+
+def columnar_table(source, valid_sheets, hierarchy_columns, cache=None):
+    """Колоночная таблица для сессии (строится один раз) или для файла по пути."""
+    if isinstance(source, SourceWorkbook):
+        return source.columnar_table(valid_sheets, hierarchy_columns)
+    return build_columnar_table(source, valid_sheets, hierarchy_columns, cache)
+
+def filter_columns(filters_list):
+    """Колонки фильтров в порядке первого появления (колонки иерархии комбинаций)."""
+    columns = []
+    for filters in filters_list:
+        for column in filters:
+            if column not in columns:
+                columns.append(column)
+    return columns
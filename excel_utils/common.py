@@ -1,43 +1,144 @@
 import logging
 from copy import copy
+from itertools import islice
+from openpyxl.cell.read_only import ReadOnlyCell
 
 logger = logging.getLogger('excel_splitter')
 
+def normalize_value(value):
+    """Приводит значение ячейки к виду для сравнения без учета регистра."""
+    return str(value).strip().lower() if value is not None else ""
+
+def find_header_index(headers, column):
+    """Возвращает индекс колонки в заголовках без учета регистра или None."""
+    normalized_col = str(column).lower()
+    for idx, header in enumerate(headers):
+        if (str(header).lower() if header is not None else "") == normalized_col:
+            return idx
+    return None
+
+class RowMatcher:
+    """
+    Фильтры, скомпилированные для конкретного листа.
+
+    Индексы колонок определяются и значения фильтров нормализуются один раз
+    при компиляции, поэтому проверка строки сводится к сравнению строк.
+    """
+
+    def __init__(self, headers, filters):
+        self.conditions = []
+        # Колонка фильтра отсутствует в заголовках - ни одна строка не подходит
+        self.never = False
+        for col, value in (filters or {}).items():
+            col_index = find_header_index(headers, col)
+            if col_index is None:
+                logger.warning(f"Column '{col}' not found in headers")
+                self.never = True
+                continue
+            self.conditions.append((col_index, str(value).strip().lower()))
+        self.always = not self.conditions and not self.never
+
+    def matches(self, row):
+        """Проверяет соответствие одной строки фильтрам."""
+        if self.always:
+            return True
+        if self.never:
+            return False
+        row_length = len(row)
+        for col_index, expected in self.conditions:
+            cell_value = row[col_index] if col_index < row_length else None
+            if cell_value is None:
+                if expected != "":
+                    return False
+            elif str(cell_value).strip().lower() != expected:
+                return False
+        return True
+
+    def filter_rows(self, rows):
+        """Возвращает подходящие строки из пачки строк."""
+        if self.always:
+            return list(rows)
+        if self.never:
+            return []
+        # Условия применяются по очереди ко всей пачке, сужая ее
+        selected = rows if isinstance(rows, list) else list(rows)
+        for col_index, expected in self.conditions:
+            selected = [
+                row for row in selected
+                if (
+                    str(row[col_index]).strip().lower()
+                    if col_index < len(row) and row[col_index] is not None else ""
+                ) == expected
+            ]
+            if not selected:
+                break
+        return selected
+
+    def iter_matching(self, rows, chunk_size=1000):
+        """Отдает подходящие строки из потока, проверяя их пачками по chunk_size."""
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield from self.filter_rows(chunk)
+
+def compile_filters(headers, filters):
+    """Компилирует фильтры для листа с заданными заголовками."""
+    return RowMatcher(headers, filters)
+
 def validate_row(row, headers, header_row_idx, filters):
     """Проверяет соответствие строки условиям фильтров."""
-    logger.debug(f"Validating row: {row}, headers: {headers}, filters: {filters}")
     if not filters:
-        logger.debug("No filters provided, row is valid")
         return True
-    # Нормализуем заголовки к нижнему регистру
-    normalized_headers = [str(header).lower() if header is not None else "" for header in headers]
-    for col, value in filters.items():
-        # Нормализуем имя колонки к нижнему регистру
-        normalized_col = str(col).lower()
-        try:
-            col_index = normalized_headers.index(normalized_col)
-            cell_value = row[col_index] if col_index < len(row) else None
-            str_value = str(cell_value).strip() if cell_value is not None else ""
-            str_filter = str(value).strip()
-            logger.debug(f"Checking column '{col}': cell value='{str_value}', filter='{str_filter}'")
-            # Сравниваем без учета регистра
-            if str_value.lower() != str_filter.lower():
-                logger.debug(f"Row does not match filter for column '{col}'")
-                return False
-        except ValueError:
-            logger.warning(f"Column '{col}' not found in headers")
-            return False
-    logger.debug("Row matches all filters")
-    return True
+    return compile_filters(headers, filters).matches(row)
+
+class StyleCache:
+    """
+    Кэш перевода стилей исходной книги в стили одной целевой книги.
+
+    Стиль каждой уникальной комбинации (шрифт, граница, заливка, выравнивание,
+    формат числа) копируется один раз, после чего целевым ячейкам присваивается
+    готовый набор индексов стилей целевой книги без создания новых объектов.
+    """
+
+    def __init__(self):
+        self.styles = {}
+        self.hits = 0
+        self.misses = 0
+
+    def apply(self, source_cell, target_cell):
+        """Присваивает целевой ячейке стиль исходной ячейки."""
+        # У ячеек книги read_only индексы стилей доступны только через style_array
+        style = source_cell.style_array if isinstance(source_cell, ReadOnlyCell) else source_cell._style
+        key = tuple(style)
+        cached = self.styles.get(key)
+        if cached is not None:
+            self.hits += 1
+            target_cell._style = copy(cached)
+            return
+        self.misses += 1
+        _copy_style_objects(source_cell, target_cell)
+        self.styles[key] = copy(target_cell._style)
+
+def _copy_style_objects(source_cell, target_cell):
+    """Копирует объекты стилей исходной ячейки в целевую."""
+    target_cell.font = copy(source_cell.font)
+    target_cell.border = copy(source_cell.border)
+    target_cell.fill = copy(source_cell.fill)
+    target_cell.alignment = copy(source_cell.alignment)
+    target_cell.number_format = source_cell.number_format
 
-def copy_cell_style(source_cell, target_cell):
-    """Копирует стили из исходной ячейки в целевую."""
+def copy_cell_style(source_cell, target_cell, style_cache=None):
+    """
+    Копирует стили из исходной ячейки в целевую.
+    Если передан style_cache, повторяющиеся стили берутся из кэша целевой книги.
+    """
     if source_cell.has_style:
         try:
-            target_cell.font = copy(source_cell.font)
-            target_cell.border = copy(source_cell.border)
-            target_cell.fill = copy(source_cell.fill)
-            target_cell.alignment = copy(source_cell.alignment)
-            target_cell.number_format = source_cell.number_format
+            if style_cache is not None:
+                style_cache.apply(source_cell, target_cell)
+            else:
+                _copy_style_objects(source_cell, target_cell)
         except Exception as e:
-            logger.debug(f"Error copying cell style: {str(e)}")
\ No newline at end of file
+            logger.debug(f"Error copying cell style: {str(e)}")
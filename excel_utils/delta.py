@@ -0,0 +1,275 @@
+"""
+Дозапись новых строк для исходных книг, которые только растут снизу (журналы).
+
+В каталоге назначения хранится состояние: для каждого видимого листа - номер
+последней обработанной строки и контрольная сумма всех строк до нее включительно.
+При следующем запуске строки до этой границы только хэшируются при потоковом
+чтении, а новые строки распределяются по выходам и дописываются в конец
+существующих файлов с расширением диапазона таблицы Excel.
+
+В контрольную сумму входят значения и индексы стилей ячеек. Если она не совпала
+(строки изменены или удалены), изменились набор листов, строка заголовков
+или список выходов, все файлы создаются заново. Выход, в котором впервые появился лист или данные,
+пересоздается отдельно.
+
+Стоимость запуска: источник каждый раз читается целиком (строки до границы
+хэшируются), а каждый выход, получивший новые строки, загружается openpyxl
+и сохраняется заново полностью - время пропорционально размеру источника
+плюс размеру затронутых выходов. Экономия по сравнению с полным разбиением:
+выходы без новых строк не перезаписываются, а старые строки не распределяются
+по фильтрам и их стили не копируются.
+"""
+import os
+import json
+import hashlib
+import logging
+import openpyxl
+from openpyxl.utils import get_column_letter, range_boundaries
+from excel_utils.common import StyleCache, copy_cell_style
+from excel_utils.partitioning import RowRouter, create_filtered_files, _prepare_target_path
+from excel_utils.source import safe_workbook, source_path
+from excel_utils.workbook import apply_table_formatting, clean_table_name
+from excel_utils.instrumentation import stage, record_output
+
+logger = logging.getLogger('excel_splitter')
+
+STATE_NAME = ".excel_split_delta.json"
+STATE_VERSION = 1
+
+def _row_bytes(cells):
+    """Значения и индексы стилей строки для хэша; пустые ячейки в конце не учитываются."""
+    items = [(cell.value, getattr(cell, '_style_id', 0)) for cell in cells]
+    while items and items[-1] == (None, 0):
+        items.pop()
+    return repr(tuple(items)).encode("utf-8")
+
+def scan_sheets(path, valid_sheets, filters_list=None, previous=None):
+    """
+    Один потоковый проход по видимым листам источника.
+
+    Возвращает (sheets, new_rows, reason): sheets - новое состояние листов,
+    new_rows - {лист: {индекс выхода: [ячейки строк]}} для строк после границы
+    из previous, reason - причина несовпадения с previous или None.
+    Без previous только вычисляется состояние листов.
+    """
+    sheets = {}
+    new_rows = {}
+    with safe_workbook(path, read_only=True) as wb:
+        for ws in wb.worksheets:
+            if ws.sheet_state != 'visible':
+                continue
+            entry = {}
+            if ws.title in valid_sheets:
+                headers, header_row_idx = valid_sheets[ws.title]
+                entry['header_row'] = header_row_idx
+            prev = None
+            router = None
+            if previous is not None:
+                prev = previous.get(ws.title)
+                if prev is None:
+                    return sheets, new_rows, f"sheet {ws.title} was added"
+                if prev.get('header_row') != entry.get('header_row'):
+                    return sheets, new_rows, f"header row of sheet {ws.title} changed"
+                if ws.title in valid_sheets:
+                    router = RowRouter(headers, filters_list)
+
+            digest = hashlib.sha1()
+            row_count = 0
+            for row in ws.iter_rows():
+                row_count += 1
+                digest.update(_row_bytes(row))
+                if prev is None:
+                    continue
+                if row_count == prev['last_row']:
+                    if digest.hexdigest() != prev['checksum']:
+                        return sheets, new_rows, f"rows of sheet {ws.title} changed"
+                elif row_count > prev['last_row']:
+                    if router is None:
+                        return sheets, new_rows, f"unfiltered sheet {ws.title} changed"
+                    for output_idx in router.route([cell.value for cell in row]):
+                        new_rows.setdefault(ws.title, {}).setdefault(output_idx, []).append(row)
+            if prev is not None and row_count < prev['last_row']:
+                return sheets, new_rows, f"rows of sheet {ws.title} were removed"
+            entry.update({'last_row': row_count, 'checksum': digest.hexdigest()})
+            sheets[ws.title] = entry
+    if previous is not None:
+        removed = [title for title in previous if title not in sheets]
+        if removed:
+            return sheets, new_rows, f"sheet {removed[0]} was removed"
+    return sheets, new_rows, None
+
+def state_path(destination):
+    return os.path.join(destination, STATE_NAME)
+
+def load_state(destination):
+    """Читает состояние delta-режима; при отсутствии или повреждении - None."""
+    path = state_path(destination)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            logger.info("Delta state has another version, all outputs will be rebuilt")
+            return None
+        return state
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring damaged delta state {path}: {str(e)}")
+        return None
+
+def save_state(destination, state):
+    """Записывает состояние атомарно через временный файл."""
+    path = state_path(destination)
+    temp_path = path + ".part"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(temp_path, path)
+
+def _output_key(destination, target):
+    relative = os.path.relpath(_prepare_target_path(target), destination)
+    return relative.replace(os.sep, "/")
+
+def _check_state(state, path, destination, file_list):
+    """Возвращает причину, по которой дозапись невозможна, или None."""
+    if state is None:
+        return "no previous delta state"
+    if state.get('source') != os.path.abspath(path):
+        return "source file changed"
+    outputs = state.get('outputs', {})
+    keys = [_output_key(destination, target) for _, target in file_list]
+    if sorted(keys) != sorted(outputs):
+        return "list of outputs changed"
+    for (filters, target), key in zip(file_list, keys):
+        entry = outputs[key]
+        if entry.get('filters') != filters:
+            return f"filters of {key} changed"
+        if entry.get('created') and not os.path.exists(_prepare_target_path(target)):
+            return f"output {key} is missing"
+    return None
+
+def _append_rows(target, sheet_rows, valid_sheets):
+    """
+    Дописывает строки в листы существующего выхода и расширяет их таблицы.
+    Выход загружается и сохраняется целиком, поэтому время зависит от его
+    размера, а не только от числа новых строк.
+    sheet_rows: лист -> список строк ячеек источника.
+    Возвращает False, если в выходе нет нужного листа и его надо пересоздать.
+    """
+    wb = openpyxl.load_workbook(target)
+    if any(sheet_name not in wb.sheetnames for sheet_name in sheet_rows):
+        return False
+    style_cache = StyleCache()
+    for sheet_name, rows in sheet_rows.items():
+        ws = wb[sheet_name]
+        header_row_idx = valid_sheets[sheet_name][1]
+        table_name = clean_table_name(sheet_name)
+        if table_name in ws.tables:
+            _, _, last_col, last_row = range_boundaries(ws.tables[table_name].ref)
+            del ws.tables[table_name]
+        else:
+            last_col, last_row = ws.max_column, ws.max_row
+        next_row = last_row + 1
+        for cells in rows:
+            for col_idx, source_cell in enumerate(cells, start=1):
+                try:
+                    if source_cell.value is not None or source_cell.has_style:
+                        target_cell = ws.cell(row=next_row, column=col_idx, value=source_cell.value)
+                        copy_cell_style(source_cell, target_cell, style_cache)
+                    if source_cell.value is not None and col_idx > last_col:
+                        last_col = col_idx
+                except Exception as e:
+                    logger.debug(f"Error appending cell at row {next_row}, col {col_idx}: {str(e)}")
+            next_row += 1
+        apply_table_formatting(ws, header_row_idx, get_column_letter(last_col), header_row_idx + 1, next_row - 1)
+    temp_path = target + ".part"
+    with stage('save'):
+        wb.save(temp_path)
+    os.replace(temp_path, target)
+    record_output(target, bytes_written=os.path.getsize(target))
+    return True
+
+class DeltaRun:
+    """
+    Результат запуска delta-режима.
+
+    mode - 'delta' (дозапись) или 'rebuild' (полное пересоздание);
+    reason - причина пересоздания; results - пути выходов в порядке file_list
+    (None, если данных нет); appended - путь -> число дописанных строк;
+    rebuilt - пути выходов, созданных заново.
+    """
+
+    def __init__(self, mode, reason=None):
+        self.mode = mode
+        self.reason = reason
+        self.results = []
+        self.appended = {}
+        self.rebuilt = []
+
+def split_delta(source, file_list, valid_sheets, destination, write_only=False, engine='openpyxl'):
+    """
+    Дописывает в существующие выходы строки, добавленные в источник
+    с прошлого запуска, или создает все файлы заново, если дозапись невозможна.
+    source - путь или сессия SourceWorkbook. Возвращает DeltaRun.
+    """
+    path = source_path(source)
+    filters_list = [filters for filters, _ in file_list]
+    targets = [_prepare_target_path(target) for _, target in file_list]
+    try:
+        state = load_state(destination)
+        reason = _check_state(state, path, destination, file_list)
+        if reason is None:
+            sheets, new_rows, reason = scan_sheets(path, valid_sheets, filters_list, state['sheets'])
+
+        if reason is not None:
+            logger.info(f"Delta split falls back to full rebuild: {reason}")
+            run = DeltaRun('rebuild', reason)
+            sheets, _, _ = scan_sheets(path, valid_sheets)
+            run.results = create_filtered_files(source, file_list, valid_sheets, write_only, engine)
+            run.rebuilt = [created for created in run.results if created is not None]
+        else:
+            run = DeltaRun('delta')
+            outputs = state['outputs']
+            run.results = [
+                target if outputs[_output_key(destination, target)].get('created') else None
+                for target in targets
+            ]
+            rebuild_idx = []
+            for output_idx, target in enumerate(targets):
+                sheet_rows = {
+                    sheet_name: rows[output_idx]
+                    for sheet_name, rows in new_rows.items()
+                    if output_idx in rows
+                }
+                if not sheet_rows:
+                    continue
+                if run.results[output_idx] is None or not _append_rows(target, sheet_rows, valid_sheets):
+                    rebuild_idx.append(output_idx)
+                    continue
+                run.appended[target] = sum(len(rows) for rows in sheet_rows.values())
+                logger.info(f"Appended {run.appended[target]} rows to {target}")
+            if rebuild_idx:
+                # В выходе впервые появился лист или данные: создаем его заново целиком
+                created = create_filtered_files(
+                    source, [file_list[idx] for idx in rebuild_idx], valid_sheets, write_only, engine
+                )
+                for output_idx, created_file in zip(rebuild_idx, created):
+                    run.results[output_idx] = created_file
+                    if created_file is not None:
+                        run.rebuilt.append(created_file)
+    except Exception as e:
+        logger.error(f"Error during delta split: {str(e)}")
+        raise ValueError(f"Error during delta split: {str(e)}")
+
+    save_state(destination, {
+        'version': STATE_VERSION,
+        'source': os.path.abspath(path),
+        'sheets': sheets,
+        'outputs': {
+            _output_key(destination, target): {'filters': filters, 'created': created is not None}
+            for (filters, target), created in zip(file_list, run.results)
+        },
+    })
+    logger.info(
+        f"Delta split ({run.mode}): {len(run.appended)} outputs appended, {len(run.rebuilt)} rebuilt"
+    )
+    return run
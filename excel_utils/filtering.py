@@ -1,18 +1,23 @@
-from .analysis import analyze_column
+from .category_index import build_category_index
 import logging
 logger = logging.getLogger('excel_splitter')
 
-def get_all_combinations(source, valid_sheets, hierarchy_columns, filters=None, level=0):
-    """Возвращает все возможные комбинации фильтров, включая частичные уровни."""
+def get_all_combinations(source, valid_sheets, hierarchy_columns, filters=None, level=0, index=None, cache=None):
+    """
+    Возвращает все возможные комбинации фильтров, включая частичные уровни.
+    Категории берутся из индекса категорий; если он не передан, строится один раз.
+    """
     if filters is None:
         filters = {}
+    if index is None:
+        index = build_category_index(source, valid_sheets, hierarchy_columns, cache)
     
     # Если достигли конца иерархии, возвращаем текущие фильтры
     if level >= len(hierarchy_columns):
         return [filters.copy()]
     
     column = hierarchy_columns[level]
-    categories = analyze_column(source, valid_sheets, column, filters)
+    categories = index.categories(level, filters)
     
     # Если нет категорий, возвращаем пустой список
     if not categories:
@@ -30,14 +35,17 @@ def get_all_combinations(source, valid_sheets, hierarchy_columns, filters=None,
     for category in categories:
         new_filters = filters.copy()
         new_filters[column] = category
-        combinations.extend(get_all_combinations(source, valid_sheets, hierarchy_columns, new_filters, level + 1))
+        combinations.extend(get_all_combinations(source, valid_sheets, hierarchy_columns, new_filters, level + 1, index))
     
     return combinations
 
-def select_categories_sequentially(source, valid_sheets, hierarchy_columns):
+def select_categories_sequentially(source, valid_sheets, hierarchy_columns, index=None, cache=None):
     """Последовательно запрашивает выбор категорий у пользователя с отображением вариантов для каждой комбинации."""
     logger.info("Starting sequential category selection")
     all_combinations = []
+    # Все списки категорий берутся из индекса, построенного за один проход
+    if index is None:
+        index = build_category_index(source, valid_sheets, hierarchy_columns, cache)
     
     def generate_combinations(level, current_filters, include_all=False):
         """Рекурсивная функция генерации комбинаций"""
@@ -46,7 +54,7 @@ def select_categories_sequentially(source, valid_sheets, hierarchy_columns):
             return
         
         column = hierarchy_columns[level]
-        categories = analyze_column(source, valid_sheets, column, current_filters)
+        categories = index.categories(level, current_filters)
         
         if not categories:
             logger.warning(f"No categories found for column '{column}' at level {level}")
@@ -95,7 +103,7 @@ def select_categories_sequentially(source, valid_sheets, hierarchy_columns):
                 else:
                     # Для промежуточных уровней генерируем все возможные комбинации
                     all_combinations_recursive = get_all_combinations(
-                        source, valid_sheets, hierarchy_columns, current_filters, level
+                        source, valid_sheets, hierarchy_columns, current_filters, level, index
                     )
                     for combo in all_combinations_recursive:
                         all_combinations.append(combo)
@@ -165,4 +173,65 @@ def select_categories_sequentially(source, valid_sheets, hierarchy_columns):
             seen.add(filter_tuple)
             unique_combinations.append(filters)
     
-    return unique_combinations
\ No newline at end of file
+    return unique_combinations
+def select_categories_from_spec(source, valid_sheets, hierarchy_columns, selections=None, index=None, cache=None):
+    """
+    Неинтерактивный выбор категорий для пакетного режима.
+
+    selections - список выбора по уровням иерархии, как в select_categories_sequentially:
+      "all"  - все категории этого и всех следующих уровней (включая частичные уровни);
+      "each" - все категории только этого уровня, далее выбор следующего уровня;
+      список значений - только указанные категории этого уровня (без учета регистра).
+    Уровни без выбора обрабатываются как "all".
+    """
+    logger.info(f"Selecting categories from job spec: {selections}")
+    selections = list(selections or [])
+    all_combinations = []
+    if index is None:
+        index = build_category_index(source, valid_sheets, hierarchy_columns, cache)
+
+    def generate_combinations(level, current_filters):
+        if level >= len(hierarchy_columns):
+            all_combinations.append(current_filters.copy())
+            return
+        column = hierarchy_columns[level]
+        categories = index.categories(level, current_filters)
+        if not categories:
+            logger.warning(f"No categories found for column '{column}' at level {level}")
+            return
+        selection = selections[level] if level < len(selections) else "all"
+
+        if isinstance(selection, str) and selection.lower() == "all":
+            all_combinations.extend(
+                get_all_combinations(source, valid_sheets, hierarchy_columns, current_filters, level, index)
+            )
+            return
+        if isinstance(selection, str) and selection.lower() == "each":
+            selected = categories
+        else:
+            if isinstance(selection, str):
+                selection = [selection]
+            by_name = {str(category).lower(): category for category in categories}
+            selected = []
+            for name in selection:
+                category = by_name.get(str(name).strip().lower())
+                if category is None:
+                    logger.warning(f"Category '{name}' not found in column '{column}' for filters {current_filters}")
+                    continue
+                selected.append(category)
+        for category in selected:
+            new_filters = current_filters.copy()
+            new_filters[column] = category
+            generate_combinations(level + 1, new_filters)
+
+    generate_combinations(0, {})
+
+    # Возвращаем уникальные комбинации
+    unique_combinations = []
+    seen = set()
+    for filters in all_combinations:
+        filter_tuple = tuple(sorted(filters.items()))
+        if filter_tuple not in seen:
+            seen.add(filter_tuple)
+            unique_combinations.append(filters)
+    return unique_combinations
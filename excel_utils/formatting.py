@@ -39,7 +39,7 @@ def shorten_category_name(name):
     
     return short_name
 
-def generate_short_filename(base_name, filters, max_length=150, is_folder_hierarchy=False):
+def generate_short_filename(base_name, filters, max_length=150, is_folder_hierarchy=False, extension='.xlsx'):
     """
     Генерирует короткое имя файла с учетом максимальной длины.
     Если длина превышает max_length, использует хэш для уникальности.
@@ -49,6 +49,7 @@ def generate_short_filename(base_name, filters, max_length=150, is_folder_hierar
     filters (dict): Фильтры для генерации названия
     max_length (int): Максимальная длина пути к файлу
     is_folder_hierarchy (bool): Признак использования иерархии папок
+    extension (str): Расширение файла формата вывода
     
     Возвращает:
     str: Сгенерированное короткое имя файла
@@ -65,13 +66,13 @@ def generate_short_filename(base_name, filters, max_length=150, is_folder_hierar
     suffix = "_".join(safe_parts) if safe_parts else "All"
     
     # Проверяем длину полного пути
-    full_path = os.path.join(os.path.dirname(base_name), f"{os.path.basename(base_name)}_{suffix}.xlsx")
+    full_path = os.path.join(os.path.dirname(base_name), f"{os.path.basename(base_name)}_{suffix}{extension}")
     
     # Если длина слишком большая, сокращаем
     if len(full_path) > max_length:
         logger.warning(f"Filename is too long ({len(full_path)} characters), shortening...")
         # Оставляем только последние N символов из суффикса
-        max_suffix_length = max_length - len(base_name) - 5  # Учитываем '.xlsx' и '_'
+        max_suffix_length = max_length - len(base_name) - len(extension)  # Учитываем расширение и '_'
         
         if max_suffix_length <= 0:
             # Если даже базовое имя слишком длинное, используем хэш
@@ -82,4 +83,4 @@ def generate_short_filename(base_name, filters, max_length=150, is_folder_hierar
             # Сокращаем суффикс до допустимой длины
             suffix = suffix[:max_suffix_length]
     
-    return f"{os.path.basename(base_name)}_{suffix}.xlsx"
\ No newline at end of file
+    return f"{os.path.basename(base_name)}_{suffix}{extension}"
\ No newline at end of file
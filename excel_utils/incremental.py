@@ -0,0 +1,233 @@
+"""
+Инкрементальное разбиение: в каталоге назначения хранится манифест с отпечатком
+содержимого каждого выходного файла. При повторном запуске перезаписываются
+только файлы, отпечаток которых изменился.
+
+Отпечаток выхода - хэш строк, попавших в его комбинацию фильтров, вместе
+со структурой листов: имена листов, строки до заголовка включительно, содержимое
+нефильтруемых листов, ширина колонок, высота строк, объединения, условное
+форматирование и таблица стилей книги. Для ячеек учитываются значения и индексы
+стилей. В отпечаток входят и параметры записи (values_only, write_only, engine):
+файл, созданный в другом режиме, перезаписывается.
+"""
+import os
+import json
+import zipfile
+import hashlib
+import logging
+from openpyxl.xml.functions import tostring
+from excel_utils.partitioning import RowRouter, _prepare_target_path
+from excel_utils.source import full_workbook, source_path
+from excel_utils.workbook import worksheet_structure, conditional_formatting_rules
+from excel_utils.instrumentation import timed_stage
+
+logger = logging.getLogger('excel_splitter')
+
+MANIFEST_NAME = ".excel_split_manifest.json"
+FINGERPRINT_VERSION = 2
+
+def _row_bytes(cells):
+    """Значения и стили ячеек строки (StyleArray - индексы шрифта, заливки, формата и т. д.)."""
+    return repr(tuple((cell.value, tuple(cell._style or ())) for cell in cells)).encode("utf-8")
+
+def _rule_text(rule):
+    try:
+        return tostring(rule.to_tree()).decode("utf-8")
+    except Exception:
+        return repr(rule)
+
+def _layout_bytes(ws):
+    """Структура листа, которая копируется во все выходы: размеры, объединения, условное форматирование."""
+    column_widths, row_heights, merged_ranges = worksheet_structure(ws)
+    rules = [(str(range_value), _rule_text(rule)) for range_value, rule in conditional_formatting_rules(ws)]
+    return repr((column_widths, row_heights, merged_ranges, rules)).encode("utf-8")
+
+def _options_bytes(options):
+    return json.dumps(options or {}, sort_keys=True, default=str).encode("utf-8")
+
+def _styles_digest(path):
+    """Хэш таблицы стилей: изменения оформления затрагивают все выходы."""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            return hashlib.sha1(zf.read("xl/styles.xml")).hexdigest()
+    except (KeyError, zipfile.BadZipFile, OSError):
+        return ""
+
+@timed_stage('fingerprints')
+def compute_fingerprints(source, file_list, valid_sheets, options=None):
+    """
+    Вычисляет отпечатки всех выходов за один проход по ячейкам книги.
+    source - путь или сессия SourceWorkbook; options - параметры записи
+    (values_only, write_only, engine), от которых зависит содержимое файлов.
+    Возвращает список отпечатков в порядке file_list (None, если у выхода нет данных).
+    """
+    filters_list = [filters for filters, _ in file_list]
+    hashes = [hashlib.sha1(f"v{FINGERPRINT_VERSION}".encode("utf-8")) for _ in file_list]
+    has_data = [False] * len(file_list)
+    styles = _styles_digest(source_path(source)).encode("utf-8")
+    mode = _options_bytes(options)
+    for digest in hashes:
+        digest.update(styles)
+        digest.update(mode)
+
+    with full_workbook(source) as wb:
+        for ws in wb.worksheets:
+            if ws.sheet_state != 'visible':
+                continue
+            name = f"\x00sheet:{ws.title}".encode("utf-8")
+            if ws.title not in valid_sheets:
+                # Нефильтруемый лист копируется во все выходы целиком
+                sheet_digest = hashlib.sha1(name)
+                sheet_digest.update(_layout_bytes(ws))
+                for row in ws.iter_rows():
+                    sheet_digest.update(_row_bytes(row))
+                for digest in hashes:
+                    digest.update(sheet_digest.digest())
+                continue
+
+            headers, header_row_idx = valid_sheets[ws.title]
+            header_digest = hashlib.sha1(name)
+            header_digest.update(_layout_bytes(ws))
+            for row in ws.iter_rows(min_row=1, max_row=header_row_idx):
+                header_digest.update(_row_bytes(row))
+            sheet_hashes = [hashlib.sha1(header_digest.digest()) for _ in file_list]
+            sheet_rows = [0] * len(file_list)
+            router = RowRouter(headers, filters_list)
+            for row in ws.iter_rows(min_row=header_row_idx + 1):
+                targets = router.route([cell.value for cell in row])
+                if not targets:
+                    continue
+                data = _row_bytes(row)
+                for output_idx in targets:
+                    sheet_hashes[output_idx].update(data)
+                    sheet_rows[output_idx] += 1
+            for output_idx, digest in enumerate(hashes):
+                # Лист без строк удаляется из выхода, как при создании файла
+                if sheet_rows[output_idx]:
+                    has_data[output_idx] = True
+                    digest.update(sheet_hashes[output_idx].digest())
+    return [digest.hexdigest() if has_data[idx] else None for idx, digest in enumerate(hashes)]
+
+def manifest_path(destination):
+    return os.path.join(destination, MANIFEST_NAME)
+
+def load_manifest(destination):
+    """Читает манифест каталога назначения; при отсутствии или повреждении - пустой."""
+    path = manifest_path(destination)
+    if not os.path.exists(path):
+        return {'version': FINGERPRINT_VERSION, 'outputs': {}}
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get('version') != FINGERPRINT_VERSION:
+            logger.info("Manifest has another version, all outputs will be rewritten")
+            return {'version': FINGERPRINT_VERSION, 'outputs': {}}
+        return manifest
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring damaged manifest {path}: {str(e)}")
+        return {'version': FINGERPRINT_VERSION, 'outputs': {}}
+
+def save_manifest(destination, manifest):
+    """Записывает манифест атомарно через временный файл."""
+    path = manifest_path(destination)
+    temp_path = path + ".part"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(temp_path, path)
+
+class IncrementalPlan:
+    """
+    План инкрементального запуска.
+
+    changed - пары (фильтры, путь), которые нужно создать заново;
+    unchanged - пути файлов, содержимое которых не изменилось;
+    empty - пути комбинаций, для которых больше нет данных;
+    stale - пути файлов из манифеста, которые больше не создаются.
+    """
+
+    def __init__(self, source, destination, file_list, fingerprints, manifest):
+        self.source = source
+        self.destination = destination
+        self.manifest = manifest
+        self.fingerprints = {}
+        self.changed = []
+        self.unchanged = []
+        self.empty = []
+        old_outputs = manifest.get('outputs', {})
+        produced = set()
+        for (filters, target), fingerprint in zip(file_list, fingerprints):
+            key = self.key(target)
+            if fingerprint is None:
+                self.empty.append(_prepare_target_path(target))
+                continue
+            produced.add(key)
+            self.fingerprints[key] = fingerprint
+            entry = old_outputs.get(key)
+            if (entry and entry.get('fingerprint') == fingerprint
+                    and os.path.exists(_prepare_target_path(target))):
+                self.unchanged.append(_prepare_target_path(target))
+            else:
+                self.changed.append((filters, target))
+        self.stale = [
+            os.path.join(destination, key.replace("/", os.sep))
+            for key in old_outputs
+            if key not in produced
+        ]
+
+    def key(self, target):
+        """Ключ файла в манифесте: путь относительно каталога назначения."""
+        relative = os.path.relpath(_prepare_target_path(target), self.destination)
+        return relative.replace(os.sep, "/")
+
+    def finish(self, results, remove_stale=False):
+        """
+        Обновляет манифест по результатам создания файлов из changed
+        (results - созданные пути или None в порядке changed).
+        При remove_stale удаляет устаревшие файлы. Возвращает список удаленных путей.
+        """
+        old_outputs = self.manifest.get('outputs', {})
+        outputs = {}
+        for path in self.unchanged:
+            key = self.key(path)
+            outputs[key] = {name: value for name, value in old_outputs[key].items() if name != 'stale'}
+        for (filters, target), created in zip(self.changed, results):
+            if created is None:
+                continue
+            outputs[self.key(target)] = {
+                'filters': filters,
+                'fingerprint': self.fingerprints[self.key(target)],
+            }
+        removed = []
+        for path in self.stale:
+            if remove_stale and os.path.exists(path):
+                os.remove(path)
+                removed.append(path)
+                logger.info(f"Removed stale output: {path}")
+            elif os.path.exists(path):
+                # Файл оставлен по запросу, но продолжает отслеживаться как устаревший
+                outputs[self.key(path)] = dict(old_outputs[self.key(path)], stale=True)
+        save_manifest(self.destination, {
+            'version': FINGERPRINT_VERSION,
+            'source': os.path.abspath(source_path(self.source)),
+            'outputs': outputs,
+        })
+        return removed
+
+def plan_incremental(source, file_list, valid_sheets, destination, options=None):
+    """
+    Сравнивает отпечатки выходов с манифестом каталога назначения
+    и возвращает IncrementalPlan с файлами, которые нужно перезаписать.
+    options - параметры записи, см. compute_fingerprints.
+    """
+    logger.info(f"Planning incremental split of {source_path(source)} into {destination}")
+    try:
+        fingerprints = compute_fingerprints(source, file_list, valid_sheets, options)
+    except Exception as e:
+        logger.error(f"Error computing output fingerprints: {str(e)}")
+        raise ValueError(f"Error computing output fingerprints: {str(e)}")
+    plan = IncrementalPlan(source, destination, file_list, fingerprints, load_manifest(destination))
+    logger.info(
+        f"Incremental plan: {len(plan.changed)} changed, {len(plan.unchanged)} unchanged, "
+        f"{len(plan.empty)} without data, {len(plan.stale)} stale"
+    )
+    return plan
@@ -0,0 +1,181 @@
+"""
+Инструментирование запуска разбиения.
+
+Для каждого этапа (определение заголовков, анализ категорий, загрузка книги,
+распределение строк, копирование ячеек, границы таблиц, сохранение) собирается
+настенное и процессорное время, а также счетчики: просканированные и совпавшие
+строки, скопированные ячейки и стили, размер каждого выходного файла.
+
+Сбор включается на время запуска через start_run(). Пока он не включен,
+stage(), count() и record_output() ничего не делают, поэтому функции
+excel_utils можно вызывать как обычно.
+"""
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import logging
+from functools import wraps
+from contextlib import contextmanager
+
+logger = logging.getLogger('excel_splitter')
+
+_current = None
+
+class RunStats:
+    """
+    Статистика одного запуска.
+
+    stages - этап -> {'wall', 'cpu', 'calls', 'depth'}; этапы могут быть вложенными,
+    повторный вход в уже активный этап не учитывается второй раз.
+    counters - имя счетчика -> значение; outputs - путь выхода -> словарь значений.
+    При profile этапы верхнего уровня выполняются под cProfile.
+    """
+
+    def __init__(self, profile=False):
+        self.stages = {}
+        self.counters = {}
+        self.outputs = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self._active = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        if name in self._active:
+            yield
+            return
+        depth = len(self._active)
+        # Этап регистрируется при входе, чтобы в таблице он шел перед вложенными
+        self._entry(name, depth, cpu=True)
+        self._active.append(name)
+        if self.profiler is not None and depth == 0:
+            self.profiler.enable()
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield
+        finally:
+            if self.profiler is not None and depth == 0:
+                self.profiler.disable()
+            self._active.pop()
+            self.add_time(name, time.perf_counter() - wall_started, time.process_time() - cpu_started, depth)
+
+    def _entry(self, name, depth, cpu):
+        return self.stages.setdefault(name, {
+            'wall': 0.0, 'cpu': 0.0 if cpu else None, 'calls': 0, 'depth': depth,
+        })
+
+    def add_time(self, name, wall, cpu=None, depth=None):
+        """Добавляет время этапа, измеренное вызывающим кодом (cpu=None - не измерялось)."""
+        entry = self._entry(name, len(self._active) if depth is None else depth, cpu is not None)
+        entry['wall'] += wall
+        if cpu is not None and entry['cpu'] is not None:
+            entry['cpu'] += cpu
+        entry['calls'] += 1
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_output(self, path, **values):
+        entry = self.outputs.setdefault(path, {})
+        for name, value in values.items():
+            entry[name] = entry.get(name, 0) + value
+
+    def to_dict(self):
+        return {
+            'elapsed': round(time.perf_counter() - self.started, 3),
+            'stages': {
+                name: {
+                    'wall': round(entry['wall'], 4),
+                    'cpu': round(entry['cpu'], 4) if entry['cpu'] is not None else None,
+                    'calls': entry['calls'],
+                    'depth': entry['depth'],
+                }
+                for name, entry in self.stages.items()
+            },
+            'counters': dict(self.counters),
+            'outputs': dict(self.outputs),
+        }
+
+    def format_table(self):
+        """Сводная таблица этапов, счетчиков и выходов для вывода в консоль."""
+        lines = [f"{'Stage':<28}{'wall, s':>10}{'cpu, s':>10}{'calls':>8}"]
+        for name, entry in self.stages.items():
+            cpu = f"{entry['cpu']:10.3f}" if entry['cpu'] is not None else f"{'-':>10}"
+            lines.append(f"{'  ' * entry['depth'] + name:<28}{entry['wall']:10.3f}{cpu}{entry['calls']:8d}")
+        if self.counters:
+            lines.append("")
+            for name, value in self.counters.items():
+                lines.append(f"{name:<28}{value:>18,}")
+        if self.outputs:
+            lines.append("")
+            lines.append(f"{'Output':<40}{'rows':>10}{'cells':>12}{'bytes':>14}")
+            for path, values in self.outputs.items():
+                name = os.path.basename(path)
+                lines.append(
+                    f"{name[:39]:<40}{values.get('rows', 0):>10,}{values.get('cells', 0):>12,}"
+                    f"{values.get('bytes_written', 0):>14,}"
+                )
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        logger.info(f"Run statistics written to {path}")
+
+    def dump_profile(self, path, limit=20):
+        """Сохраняет статистику cProfile в path и возвращает текст самых затратных функций."""
+        if self.profiler is None:
+            return ""
+        self.profiler.dump_stats(path)
+        logger.info(f"Profile written to {path}")
+        text = io.StringIO()
+        pstats.Stats(self.profiler, stream=text).sort_stats("cumulative").print_stats(limit)
+        return text.getvalue()
+
+def start_run(profile=False):
+    """Включает сбор статистики для текущего запуска и возвращает RunStats."""
+    global _current
+    _current = RunStats(profile)
+    return _current
+
+def finish_run():
+    """Выключает сбор статистики и возвращает собранный RunStats (или None)."""
+    global _current
+    stats, _current = _current, None
+    return stats
+
+def current_run():
+    return _current
+
+@contextmanager
+def stage(name):
+    """Учитывает время блока как этап name, если сбор статистики включен."""
+    if _current is None:
+        yield
+        return
+    with _current.stage(name):
+        yield
+
+def timed_stage(name):
+    """Декоратор: вызов функции учитывается как этап name."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current is None:
+                return func(*args, **kwargs)
+            with _current.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, value=1):
+    if _current is not None:
+        _current.count(name, value)
+
+def record_output(path, **values):
+    if _current is not None:
+        _current.record_output(path, **values)
@@ -0,0 +1,209 @@
+import logging
+import warnings
+from openpyxl.cell import WriteOnlyCell
+from excel_utils.common import copy_cell_style, StyleCache
+from excel_utils.workbook import (
+    get_column_letter,
+    copy_worksheet_structure,
+    copy_conditional_formatting,
+    copy_technical_rows,
+    copy_headers,
+    determine_table_boundaries,
+    apply_table_formatting,
+)
+
+logger = logging.getLogger('excel_splitter')
+
+class InMemorySheet:
+    """
+    Лист обычной выходной книги: ячейки создаются в памяти до сохранения книги.
+    При заданном template (SheetTemplate) структура листа, технические строки
+    и заголовки берутся из заранее вычисленного шаблона.
+    """
+
+    def __init__(self, wb_new, ws_source, sheet_name, style_cache=None, template=None):
+        self.ws = wb_new.create_sheet(title=sheet_name)
+        self.ws_source = ws_source
+        self.template = template
+        self.style_cache = style_cache if style_cache is not None else StyleCache()
+        if template is not None:
+            template.apply_structure(self.ws)
+        else:
+            copy_worksheet_structure(ws_source, self.ws)
+            copy_conditional_formatting(ws_source, self.ws)
+        self.next_row = 1
+        self.cells_copied = 0
+
+    def append_cells(self, source_cells):
+        """Копирует ячейки строки источника в следующую строку листа."""
+        for col_idx, source_cell in enumerate(source_cells, start=1):
+            try:
+                if source_cell.value is not None or source_cell.has_style:
+                    target_cell = self.ws.cell(row=self.next_row, column=col_idx, value=source_cell.value)
+                    copy_cell_style(source_cell, target_cell, self.style_cache)
+                    self.cells_copied += 1
+            except Exception as e:
+                logger.debug(f"Error copying data cell at row {self.next_row}, col {col_idx}: {str(e)}")
+        self.next_row += 1
+
+    def copy_rows(self, first_row, last_row):
+        """Копирует строки источника first_row..last_row без фильтрации."""
+        for row_idx in range(first_row, last_row + 1):
+            for col_idx in range(1, self.ws_source.max_column + 1):
+                try:
+                    source_cell = self.ws_source.cell(row=row_idx, column=col_idx)
+                    if source_cell.value is not None or source_cell.has_style:
+                        target_cell = self.ws.cell(row=row_idx, column=col_idx, value=source_cell.value)
+                        copy_cell_style(source_cell, target_cell, self.style_cache)
+                        self.cells_copied += 1
+                except Exception as e:
+                    logger.debug(f"Error copying cell at row {row_idx}, col {col_idx}: {str(e)}")
+        self.next_row = max(self.next_row, last_row + 1)
+
+    def write_header(self, header_row_idx):
+        """Копирует технические строки и строку заголовков."""
+        if self.template is not None and self.template.header_row_idx == header_row_idx:
+            self.template.write_leading_rows(self.ws, self.style_cache)
+        else:
+            copy_technical_rows(self.ws_source, self.ws, header_row_idx, self.style_cache)
+            copy_headers(self.ws_source, self.ws, header_row_idx, self.style_cache)
+        self.next_row = header_row_idx + 1
+
+    def add_table(self, header_row_idx):
+        """Создает таблицу Excel по строкам, записанным после заголовка."""
+        last_col_letter, data_start_row, data_end_row = determine_table_boundaries(
+            self.ws_source, self.ws, header_row_idx, self.next_row
+        )
+        apply_table_formatting(self.ws, header_row_idx, last_col_letter, data_start_row, data_end_row)
+
+    def discard(self):
+        """Удаляет лист из книги."""
+        self.ws.parent.remove(self.ws)
+
+class WriteOnlySheet:
+    """
+    Лист выходной книги в режиме write_only.
+
+    Строки добавляются по порядку и сразу сбрасываются во временный файл openpyxl,
+    поэтому в памяти не накапливаются объекты ячеек. Ширина столбцов, высота строк,
+    объединенные ячейки и условное форматирование задаются до первой строки
+    (из шаблона template, если он задан), границы таблицы вычисляются по мере
+    добавления строк.
+    """
+
+    def __init__(self, wb_new, ws_source, sheet_name, style_cache=None, template=None):
+        self.ws = wb_new.create_sheet(title=sheet_name)
+        self.ws_source = ws_source
+        self.template = template
+        self.style_cache = style_cache if style_cache is not None else StyleCache()
+        if template is not None:
+            template.apply_structure(self.ws)
+        else:
+            copy_worksheet_structure(ws_source, self.ws)
+            copy_conditional_formatting(ws_source, self.ws)
+        self.next_row = 1
+        self.last_col = 0
+        self.header_values = []
+        self.cells_copied = 0
+
+    def append_cells(self, source_cells, track_columns=True):
+        """Добавляет строку из ячеек источника со стилями."""
+        row = []
+        for col_idx, source_cell in enumerate(source_cells, start=1):
+            value = source_cell.value
+            try:
+                if source_cell.has_style:
+                    target_cell = WriteOnlyCell(self.ws, value=value)
+                    copy_cell_style(source_cell, target_cell, self.style_cache)
+                    row.append(target_cell)
+                else:
+                    row.append(value)
+            except Exception as e:
+                logger.debug(f"Error copying cell at row {self.next_row}, col {col_idx}: {str(e)}")
+                row.append(None)
+            if track_columns and value is not None and col_idx > self.last_col:
+                self.last_col = col_idx
+        self.ws.append(row)
+        self.cells_copied += len(row)
+        self.next_row += 1
+
+    def copy_rows(self, first_row, last_row, track_columns=False):
+        """Копирует строки источника first_row..last_row без фильтрации."""
+        if last_row < first_row:
+            return
+        for source_row in self.ws_source.iter_rows(min_row=first_row, max_row=last_row):
+            self.append_cells(source_row, track_columns)
+
+    def write_header(self, header_row_idx):
+        """Записывает технические строки и строку заголовков."""
+        if self.template is not None and self.template.header_row_idx == header_row_idx:
+            for source_row in self.template.leading_rows[:-1]:
+                self.append_cells(source_row, track_columns=False)
+            header_cells = self.template.header_cells
+        else:
+            self.copy_rows(1, header_row_idx - 1)
+            header_cells = next(self.ws_source.iter_rows(min_row=header_row_idx, max_row=header_row_idx), ())
+        self.header_values = [cell.value for cell in header_cells]
+        self.append_cells(header_cells)
+
+    def add_table(self, header_row_idx):
+        """Создает таблицу Excel по строкам, записанным после заголовка."""
+        last_col = self.last_col or self.ws_source.max_column
+        data_end_row = self.next_row - 1
+        column_names = [
+            str(self.header_values[idx]) if idx < len(self.header_values) else f"Column{idx + 1}"
+            for idx in range(last_col)
+        ]
+        with warnings.catch_warnings():
+            # В write_only колонки таблицы задаются вручную через column_names
+            warnings.simplefilter("ignore")
+            apply_table_formatting(
+                self.ws, header_row_idx, get_column_letter(last_col),
+                header_row_idx + 1, data_end_row, column_names=column_names
+            )
+
+    def discard(self):
+        """Удаляет лист из книги и закрывает его поток записи."""
+        wb = self.ws.parent
+        try:
+            self.ws.close()
+        except Exception as e:
+            logger.debug(f"Error closing discarded sheet: {str(e)}")
+        wb.remove(self.ws)
+
+class ValuesSheet(WriteOnlySheet):
+    """
+    Лист выходной книги в режиме values_only: в поток write_only пишутся только
+    значения ячеек, без стилей, размеров строк и столбцов, объединенных ячеек
+    и условного форматирования. Таблица Excel создается так же, как в WriteOnlySheet.
+    """
+
+    def __init__(self, wb_new, ws_source, sheet_name):
+        self.ws = wb_new.create_sheet(title=sheet_name)
+        self.ws_source = ws_source
+        self.next_row = 1
+        self.last_col = 0
+        self.header_values = []
+        self.cells_copied = 0
+
+    def append_values(self, values, track_columns=True):
+        """Добавляет строку значений."""
+        self.ws.append(values)
+        if track_columns:
+            for col_idx in range(len(values), self.last_col, -1):
+                if values[col_idx - 1] is not None:
+                    self.last_col = col_idx
+                    break
+        self.cells_copied += len(values)
+        self.next_row += 1
+
+    def copy_value_rows(self, rows, track_columns=False):
+        """Копирует строки значений без фильтрации."""
+        for values in rows:
+            self.append_values(values, track_columns)
+
+    def write_value_header(self, technical_rows, header_values):
+        """Записывает технические строки и строку заголовков."""
+        self.copy_value_rows(technical_rows)
+        self.header_values = list(header_values)
+        self.append_values(self.header_values)
@@ -0,0 +1,140 @@
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
+from excel_utils.partitioning import partition_workbook, partition_values
+from excel_utils.passthrough import passthrough_sheets
+from excel_utils.source import SourceWorkbook, source_path
+from excel_utils.xml_engine import create_filtered_files_xml
+from excel_utils.tabular_output import partition_tabular
+from excel_utils.spill import partition_spilled
+
+logger = logging.getLogger('excel_splitter')
+
+# Исходная книга, разобранная один раз и доступная процессам-исполнителям
+_shared_source = {}
+
+def _load_shared_source(source):
+    """Загружает исходную книгу в память процесса, если она еще не загружена."""
+    if isinstance(source, SourceWorkbook):
+        # Книга сессии уже разобрана в родительском процессе
+        _shared_source['workbook'] = source.workbook()
+        _shared_source['path'] = source.path
+        return _shared_source['workbook']
+    if _shared_source.get('path') != source:
+        _shared_source['workbook'] = openpyxl.load_workbook(source, read_only=False)
+        _shared_source['path'] = source
+    return _shared_source['workbook']
+
+def _init_worker(source, engine='openpyxl', values_only=False, output_format='xlsx'):
+    """Инициализатор процесса: при fork книга уже унаследована от родителя."""
+    # Движку XML, записи только значений и табличным форматам объектная модель книги не нужна
+    if engine != 'xml' and not values_only and output_format == 'xlsx':
+        _load_shared_source(source)
+
+def _run_chunk(source, chunk, valid_sheets, write_only=False, engine='openpyxl', values_only=False,
+               output_format='xlsx', memory_budget=None):
+    """
+    Создаёт файлы одной порции комбинаций.
+    Возвращает список (индекс в file_list, созданный путь, ошибка).
+    """
+    indexes = [idx for idx, _ in chunk]
+    try:
+        items = [item for _, item in chunk]
+        if memory_budget:
+            results = partition_spilled(source, items, valid_sheets, memory_budget, output_format)
+        elif output_format != 'xlsx':
+            results = partition_tabular(source, items, valid_sheets, output_format)
+        elif values_only:
+            results = partition_values(source, items, valid_sheets)
+        elif engine == 'xml':
+            results = create_filtered_files_xml(source, items, valid_sheets)
+        else:
+            wb_source = _load_shared_source(source)
+            with passthrough_sheets(source, wb_source, valid_sheets) as passthrough:
+                results = partition_workbook(wb_source, items, valid_sheets, write_only, passthrough=passthrough)
+        return [(idx, created, None) for idx, created in zip(indexes, results)]
+    except Exception as e:
+        logger.exception(f"Error in worker while creating {len(chunk)} files")
+        return [(idx, None, str(e)) for idx in indexes]
+
+def pool_context():
+    """
+    Контекст запуска процессов пула. fork используется только из главного
+    потока: fork процесса с другими потоками (поток _stream в core.api,
+    фоновый поток GUI) может унаследовать захваченные ими блокировки.
+    Иначе - forkserver или spawn, и процессы загружают книгу по пути.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if threading.current_thread() is not threading.main_thread():
+        return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    if 'fork' in methods:
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+def split_chunks(file_list, jobs):
+    """Распределяет комбинации по jobs порциям по кругу с сохранением индексов."""
+    chunks = [[] for _ in range(min(jobs, len(file_list)))]
+    for idx, item in enumerate(file_list):
+        chunks[idx % len(chunks)].append((idx, item))
+    return chunks
+
+def create_filtered_files_parallel(source, file_list, valid_sheets, jobs, write_only=False, engine='openpyxl',
+                                   values_only=False, output_format='xlsx', memory_budget=None):
+    """
+    Создаёт файлы из file_list параллельно в пуле процессов.
+
+    Исходная книга разбирается один раз: при запуске через fork (только из
+    главного потока, см. pool_context) она загружается до создания пула
+    и наследуется процессами, иначе загружается по пути один раз на процесс
+    в инициализаторе, а не на каждую задачу. Каждый процесс делает
+    один проход по книге для своей порции комбинаций.
+
+    source может быть путем или сессией SourceWorkbook: при fork процессы
+    наследуют уже разобранную книгу сессии. При values_only процессы читают
+    только значения книги и пишут файлы без стилей, при output_format кроме
+    'xlsx' - файлы CSV, Parquet или Feather. memory_budget (МБ) ограничивает
+    буферы строк каждого процесса (см. spill).
+
+    Возвращает:
+    list: Кортежи (целевой путь, созданный путь или None, ошибка или None)
+          в порядке file_list
+    """
+    logger.info(f"Creating {len(file_list)} files with {jobs} worker processes")
+    if not file_list:
+        return []
+    session = source
+    source = source_path(session)
+    results = [None] * len(file_list)
+    chunks = split_chunks(file_list, jobs)
+
+    context = pool_context()
+    if context.get_start_method() == 'fork' and engine != 'xml' and not values_only and output_format == 'xlsx':
+        _load_shared_source(session)
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=len(chunks),
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(source, engine, values_only, output_format),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_chunk, source, chunk, valid_sheets, write_only, engine, values_only, output_format,
+                    memory_budget
+                )
+                for chunk in chunks
+            ]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    chunk_results = future.result()
+                except Exception as e:
+                    logger.error(f"Worker process failed: {str(e)}")
+                    chunk_results = [(idx, None, str(e)) for idx, _ in chunk]
+                for idx, created, error in chunk_results:
+                    results[idx] = (file_list[idx][1], created, error)
+    finally:
+        _shared_source.clear()
+    return results
@@ -0,0 +1,501 @@
+import os
+import time
+import logging
+from itertools import islice
+import openpyxl
+from excel_utils.common import normalize_value, find_header_index, StyleCache
+from excel_utils.source import full_workbook, values_workbook, source_path
+from excel_utils.source_cache import iter_sheet_values
+from excel_utils.output_sheets import InMemorySheet, WriteOnlySheet, ValuesSheet
+from excel_utils.passthrough import passthrough_sheets, save_workbook
+from excel_utils.skeleton import WorkbookSkeleton, workbook_skeleton
+from excel_utils.instrumentation import current_run, stage, count, record_output
+
+logger = logging.getLogger('excel_splitter')
+
+# Частота событий о ходе распределения строк и проверки отмены
+PROGRESS_ROWS = 1000
+
+class SplitCancelled(Exception):
+    """Разбиение остановлено по запросу отмены; created - уже сохраненные файлы."""
+
+    def __init__(self, created=None):
+        super().__init__("Split cancelled")
+        self.created = created or []
+
+class RowRouter:
+    """
+    Распределяет строки листа по выходным файлам за один проход.
+
+    Выходы группируются по набору колонок фильтра, поэтому для каждой строки
+    выполняется один поиск в словаре на группу, а не проверка каждого выхода.
+    """
+
+    def __init__(self, headers, filters_list):
+        self.always = []
+        self.groups = []
+        groups = {}
+        for output_idx, filters in enumerate(filters_list):
+            # Пустой фильтр пропускает все строки
+            if not filters:
+                self.always.append(output_idx)
+                continue
+            col_indexes = []
+            for col in filters:
+                col_index = find_header_index(headers, col)
+                if col_index is None:
+                    logger.warning(f"Column '{col}' not found in headers")
+                    col_indexes = None
+                    break
+                col_indexes.append(col_index)
+            if col_indexes is None:
+                continue
+            key = tuple(str(value).strip().lower() for value in filters.values())
+            groups.setdefault(tuple(col_indexes), {}).setdefault(key, []).append(output_idx)
+        self.groups = list(groups.items())
+
+    def route(self, values):
+        """Возвращает индексы выходов, которым соответствует строка."""
+        targets = list(self.always)
+        row_length = len(values)
+        for col_indexes, buckets in self.groups:
+            key = tuple(
+                normalize_value(values[idx]) if idx < row_length else ""
+                for idx in col_indexes
+            )
+            matched = buckets.get(key)
+            if matched:
+                targets.extend(matched)
+        return targets
+
+def _tracked_rows(rows, progress=None, cancel=None):
+    """
+    Пропускает строки листа, каждые PROGRESS_ROWS строк сообщая о ходе работы
+    через progress и проверяя cancel (threading.Event).
+    """
+    pending = 0
+    for row in rows:
+        yield row
+        pending += 1
+        if pending == PROGRESS_ROWS:
+            if cancel is not None and cancel.is_set():
+                raise SplitCancelled()
+            if progress is not None:
+                progress({'type': 'rows', 'rows': pending})
+            pending = 0
+    if pending and progress is not None:
+        progress({'type': 'rows', 'rows': pending})
+
+def _prepare_target_path(target):
+    """Всегда сохраняем как .xlsx"""
+    if target.lower().endswith('.xlsm'):
+        logger.debug("Converting .xlsm to .xlsx format")
+        target = target[:-5] + '.xlsx'
+    return target
+
+def _partition_sheet(ws_source, headers, header_row_idx, filters_list, target_sheets, progress=None, cancel=None):
+    """
+    Один проход по строкам данных листа с копированием каждой строки во все
+    подходящие выходы. target_sheets: индекс выхода -> выходной лист.
+    Возвращает количество просканированных строк.
+    """
+    router = RowRouter(headers, filters_list)
+    rows = ws_source.iter_rows(min_row=header_row_idx + 1, max_row=ws_source.max_row)
+    if progress is not None or cancel is not None:
+        rows = _tracked_rows(rows, progress, cancel)
+    stats = current_run()
+    if stats is not None:
+        return _partition_sheet_timed(rows, header_row_idx, router, target_sheets, stats)
+    scanned = 0
+    for source_row in rows:
+        scanned += 1
+        try:
+            targets = router.route([cell.value for cell in source_row])
+        except Exception as e:
+            logger.debug(f"Error processing row {header_row_idx + scanned}: {str(e)}")
+            continue
+        for output_idx in targets:
+            target_sheets[output_idx].append_cells(source_row)
+    return scanned
+
+def _partition_sheet_timed(rows, header_row_idx, router, target_sheets, stats):
+    """
+    Тот же проход, что и в _partition_sheet, с раздельным учетом времени
+    распределения строк и копирования ячеек для статистики запуска.
+    """
+    scanned = 0
+    matched = 0
+    route_time = 0.0
+    copy_time = 0.0
+    for source_row in rows:
+        scanned += 1
+        started = time.perf_counter()
+        try:
+            targets = router.route([cell.value for cell in source_row])
+        except Exception as e:
+            logger.debug(f"Error processing row {header_row_idx + scanned}: {str(e)}")
+            continue
+        routed = time.perf_counter()
+        route_time += routed - started
+        if targets:
+            matched += 1
+            for output_idx in targets:
+                target_sheets[output_idx].append_cells(source_row)
+            copy_time += time.perf_counter() - routed
+    stats.add_time('row_routing', route_time)
+    stats.add_time('cell_copy', copy_time)
+    stats.count('rows_scanned', scanned)
+    stats.count('rows_matched', matched)
+    return scanned
+
+def _partition_sheet_indexed(ws_source, sheet_name, header_row_idx, filters_list, target_sheets, table,
+                             progress=None, cancel=None):
+    """
+    Копирует в выходы строки листа по индексам строк комбинаций из колоночной
+    таблицы (ColumnarTable) вместо проверки каждой строки.
+    Возвращает количество строк данных листа.
+    """
+    rows = list(ws_source.iter_rows(min_row=header_row_idx + 1, max_row=ws_source.max_row))
+    with stage('row_routing'):
+        selections = {
+            output_idx: table.sheet_rows(sheet_name, filters_list[output_idx]) for output_idx in target_sheets
+        }
+    with stage('cell_copy'):
+        for output_idx, sheet in target_sheets.items():
+            if cancel is not None and cancel.is_set():
+                raise SplitCancelled()
+            for row_idx in selections[output_idx]:
+                # Строки за пределами листа полной книги в ней пустые
+                if row_idx < len(rows):
+                    sheet.append_cells(rows[row_idx])
+    if table.np is not None:
+        matched = len(table.np.unique(table.np.concatenate(list(selections.values())))) if selections else 0
+    else:
+        matched = len(set().union(*selections.values()))
+    count('rows_scanned', len(rows))
+    count('rows_matched', matched)
+    if progress is not None and rows:
+        progress({'type': 'rows', 'rows': len(rows)})
+    return len(rows)
+
+def partition_workbook(wb_source, file_list, valid_sheets, write_only=False, progress=None, cancel=None, table=None,
+                       passthrough=None, skeleton=None):
+    """
+    Строит и сохраняет выходные файлы из уже открытой исходной книги.
+    При write_only строки сразу сбрасываются на диск, и пиковая память
+    не зависит от размера выходных файлов.
+    progress получает события хода работы: 'start' (всего строк и файлов),
+    'rows' (обработано строк), 'saving' (начато сохранение файла N из M)
+    и 'file' (файл N из M сохранен, rows - число его строк данных).
+    При установленном cancel (threading.Event) разбиение прерывается
+    исключением SplitCancelled; отмена во время сохранения срабатывает
+    между файлами, уже сохраненные файлы остаются.
+    При заданной table (ColumnarTable) строки выбираются по индексам строк
+    комбинаций из таблицы, а не проверкой каждой строки.
+    Листы без заголовков, перечисленные в passthrough (SheetPassthrough),
+    не копируются по ячейкам, а записываются в выходы исходными частями XML.
+    skeleton (WorkbookSkeleton) - заготовка выходных книг; если не задана,
+    строится по wb_source, так что структура листов, технические строки и
+    заголовки вычисляются один раз для всех выходов.
+    Возвращает пути созданных файлов в порядке file_list (None, если данных нет).
+    """
+    filters_list = [filters for filters, _ in file_list]
+    targets = [_prepare_target_path(target) for _, target in file_list]
+    sheet_class = WriteOnlySheet if write_only else InMemorySheet
+    outputs = []
+    style_caches = []
+    for _ in file_list:
+        wb_new = openpyxl.Workbook(write_only=write_only)
+        if not write_only:
+            wb_new.remove(wb_new.active)
+        if passthrough is not None:
+            passthrough.prepare(wb_new)
+        outputs.append(wb_new)
+        # Индексы стилей относятся к конкретной целевой книге, поэтому кэш у каждой свой
+        style_caches.append(StyleCache())
+    has_data = [False] * len(file_list)
+    output_rows = [0] * len(file_list)
+    created_sheets = []
+    if progress is not None:
+        total_rows = sum(
+            max(wb_source[name].max_row - valid_sheets[name][1], 0)
+            for name in wb_source.sheetnames
+            if name in valid_sheets and wb_source[name].sheet_state == 'visible'
+        )
+        progress({'type': 'start', 'rows': total_rows, 'files': len(file_list)})
+
+    if skeleton is None:
+        skeleton = WorkbookSkeleton(wb_source, valid_sheets)
+    # Скрытые листы в заготовку не входят
+    for template in skeleton:
+        sheet_name = template.title
+        ws_source = template.ws_source
+        if passthrough is not None and sheet_name in passthrough:
+            for wb_new in outputs:
+                passthrough.add_sheet(wb_new, sheet_name)
+            continue
+
+        target_sheets = {}
+        for output_idx, wb_new in enumerate(outputs):
+            sheet = sheet_class(wb_new, ws_source, sheet_name, style_caches[output_idx], template)
+            created_sheets.append((output_idx, sheet))
+            if sheet_name in valid_sheets:
+                sheet.write_header(valid_sheets[sheet_name][1])
+                target_sheets[output_idx] = sheet
+            else:
+                logger.debug(f"Copying entire sheet {sheet_name} without filtering")
+                sheet.copy_rows(1, ws_source.max_row)
+
+        if sheet_name not in valid_sheets:
+            continue
+
+        headers, header_row_idx = valid_sheets[sheet_name]
+        if table is not None:
+            scanned = _partition_sheet_indexed(
+                ws_source, sheet_name, header_row_idx, filters_list, target_sheets, table, progress, cancel
+            )
+        else:
+            scanned = _partition_sheet(
+                ws_source, headers, header_row_idx, filters_list, target_sheets, progress, cancel
+            )
+        logger.debug(f"Routed {scanned} rows of sheet {sheet_name} to {len(outputs)} outputs")
+
+        for output_idx, sheet in target_sheets.items():
+            if sheet.next_row > header_row_idx + 1:
+                has_data[output_idx] = True
+                output_rows[output_idx] += sheet.next_row - header_row_idx - 1
+                record_output(targets[output_idx], rows=sheet.next_row - header_row_idx - 1)
+                with stage('table_boundaries'):
+                    sheet.add_table(header_row_idx)
+            else:
+                # Удаляем лист без данных
+                sheet.discard()
+                logger.debug(f"Removed sheet {sheet_name} from {targets[output_idx]} due to no matching data")
+
+    for output_idx, sheet in created_sheets:
+        count('cells_copied', sheet.cells_copied)
+        if has_data[output_idx]:
+            record_output(targets[output_idx], cells=sheet.cells_copied)
+    for style_cache in style_caches:
+        count('styles_copied', style_cache.misses)
+        count('styles_reused', style_cache.hits)
+
+    return _save_outputs(outputs, targets, filters_list, has_data, output_rows, progress, cancel, passthrough)
+
+def _save_outputs(outputs, targets, filters_list, has_data, output_rows, progress=None, cancel=None,
+                  passthrough=None):
+    """
+    Сохраняет выходные книги с данными по порядку; отмена проверяется между файлами.
+    Возвращает пути созданных файлов (None для выходов без данных).
+    """
+    results = []
+    for output_idx, wb_new in enumerate(outputs):
+        target = targets[output_idx]
+        if cancel is not None and cancel.is_set():
+            logger.info(f"Split cancelled after {output_idx} of {len(outputs)} files")
+            raise SplitCancelled([created for created in results if created is not None])
+        if not has_data[output_idx]:
+            logger.warning(f"No data matched the filters {filters_list[output_idx]}, file not created")
+            results.append(None)
+            if progress is not None:
+                progress({'type': 'file', 'index': output_idx + 1, 'files': len(outputs), 'path': None, 'rows': 0})
+            continue
+        if progress is not None:
+            progress({'type': 'saving', 'index': output_idx + 1, 'files': len(outputs), 'path': target})
+        _save_output(wb_new, target, passthrough)
+        results.append(target)
+        if progress is not None:
+            progress({
+                'type': 'file', 'index': output_idx + 1, 'files': len(outputs), 'path': target,
+                'rows': output_rows[output_idx],
+            })
+    return results
+
+def _save_output(wb_new, target, passthrough=None):
+    """
+    Сохраняет выходную книгу в target, заменяя существующий файл;
+    листы из passthrough записываются исходными частями XML.
+    """
+    # Удаляем целевой файл, если он существует
+    if os.path.exists(target):
+        logger.info(f"Removing existing target file: {target}")
+        os.remove(target)
+    logger.info(f"Saving filtered file: {target}")
+    with stage('save'):
+        save_workbook(wb_new, target, passthrough)
+    record_output(target, bytes_written=os.path.getsize(target))
+
+def partition_values(source, file_list, valid_sheets, progress=None, cancel=None):
+    """
+    Создает выходные файлы в режиме values_only за один проход по значениям
+    исходной книги. Книга читается без стилей (в режиме read_only или из кэша
+    сессии), а в выходные книги write_only пишутся только значения: стили,
+    размеры строк и столбцов и условное форматирование не копируются.
+    Строки заголовков, таблицы Excel и имена файлов - как в обычном режиме.
+    Возвращает пути созданных файлов в порядке file_list (None, если данных нет).
+    """
+    filters_list = [filters for filters, _ in file_list]
+    targets = [_prepare_target_path(target) for _, target in file_list]
+    outputs = [openpyxl.Workbook(write_only=True) for _ in file_list]
+    has_data = [False] * len(file_list)
+    output_rows = [0] * len(file_list)
+    created_sheets = []
+    with values_workbook(source) as wb_source:
+        if progress is not None:
+            total_rows = sum(
+                max((wb_source[name].max_row or 0) - valid_sheets[name][1], 0)
+                for name in wb_source.sheetnames
+                if name in valid_sheets and wb_source[name].sheet_state == 'visible'
+            )
+            progress({'type': 'start', 'rows': total_rows, 'files': len(file_list)})
+
+        for sheet_name in wb_source.sheetnames:
+            ws_source = wb_source[sheet_name]
+            # Игнорируем скрытые листы
+            if ws_source.sheet_state != 'visible':
+                logger.debug(f"Skipping hidden sheet: {sheet_name}")
+                continue
+            rows = iter_sheet_values(ws_source)
+            if sheet_name not in valid_sheets:
+                logger.debug(f"Copying entire sheet {sheet_name} without filtering")
+                rows = list(rows)
+                for wb_new in outputs:
+                    sheet = ValuesSheet(wb_new, ws_source, sheet_name)
+                    sheet.copy_value_rows(rows)
+                    created_sheets.append(sheet)
+                continue
+
+            headers, header_row_idx = valid_sheets[sheet_name]
+            leading = list(islice(rows, header_row_idx))
+            technical_rows, header_values = leading[:-1], leading[-1] if leading else ()
+            target_sheets = {}
+            for output_idx, wb_new in enumerate(outputs):
+                sheet = ValuesSheet(wb_new, ws_source, sheet_name)
+                sheet.write_value_header(technical_rows, header_values)
+                target_sheets[output_idx] = sheet
+                created_sheets.append(sheet)
+
+            if progress is not None or cancel is not None:
+                rows = _tracked_rows(rows, progress, cancel)
+            router = RowRouter(headers, filters_list)
+            scanned = 0
+            matched = 0
+            with stage('row_routing'):
+                for values in rows:
+                    scanned += 1
+                    routed = router.route(values)
+                    if routed:
+                        matched += 1
+                        for output_idx in routed:
+                            target_sheets[output_idx].append_values(values)
+            count('rows_scanned', scanned)
+            count('rows_matched', matched)
+
+            for output_idx, sheet in target_sheets.items():
+                if sheet.next_row > header_row_idx + 1:
+                    has_data[output_idx] = True
+                    output_rows[output_idx] += sheet.next_row - header_row_idx - 1
+                    record_output(targets[output_idx], rows=sheet.next_row - header_row_idx - 1)
+                    with stage('table_boundaries'):
+                        sheet.add_table(header_row_idx)
+                else:
+                    sheet.discard()
+
+    for sheet in created_sheets:
+        count('cells_copied', sheet.cells_copied)
+    return _save_outputs(outputs, targets, filters_list, has_data, output_rows, progress, cancel)
+
+def create_filtered_files(source, file_list, valid_sheets, write_only=False, engine='openpyxl',
+                          progress=None, cancel=None, values_only=False, output_format='xlsx',
+                          memory_budget=None):
+    """
+    Создаёт все файлы из file_list за один проход по исходной книге.
+
+    Параметры:
+    source (str | SourceWorkbook): Путь к исходному файлу или открытая сессия
+    file_list (list): Пары (фильтры, путь к целевому файлу)
+    valid_sheets (dict): Заголовки и индекс строки заголовков для каждого листа
+    write_only (bool): Потоковая запись выходных книг с постоянным расходом памяти
+    engine (str): 'openpyxl' - объектная модель openpyxl, 'xml' - потоковая
+                  обработка XML листов без создания объектов ячеек, 'columnar' -
+                  выбор строк по индексам из колоночной таблицы кодов категорий
+    progress (callable): Получатель событий хода работы (см. partition_workbook)
+    cancel (threading.Event): Запрос отмены; прерывает разбиение исключением SplitCancelled
+    values_only (bool): Записывать только значения ячеек (без стилей, размеров и
+                        условного форматирования) самым быстрым способом; engine не учитывается
+    output_format (str): Формат файлов: 'xlsx', 'csv', 'parquet' или 'feather'; для
+                         форматов кроме xlsx пишутся только заголовки и строки данных
+                         листов (см. tabular_output), write_only и engine не учитываются
+    memory_budget (float): Бюджет памяти буферов строк в МБ; при достижении бюджета строки
+                           выгружаются во временные файлы, а выходы строятся по одному
+                           (см. spill). Только вместе с values_only или форматом кроме xlsx
+
+    Возвращает:
+    list: Пути созданных файлов в порядке file_list (None, если данных нет)
+    """
+    if memory_budget:
+        if output_format == 'xlsx' and not values_only:
+            raise ValueError("Memory budget requires values_only or a csv/parquet/feather output format")
+        from excel_utils.spill import partition_spilled
+        logger.info(
+            f"Partitioning {source_path(source)} into {len(file_list)} {output_format} files "
+            f"with a {memory_budget} MB memory budget"
+        )
+        if not file_list:
+            return []
+        try:
+            return partition_spilled(source, file_list, valid_sheets, memory_budget, output_format, progress, cancel)
+        except SplitCancelled:
+            raise
+        except Exception as e:
+            logger.exception(f"Error during partitioning: {str(e)}")
+            raise ValueError(f"Error during partitioning: {str(e)}")
+    if output_format != 'xlsx':
+        from excel_utils.tabular_output import partition_tabular
+        logger.info(f"Partitioning {source_path(source)} into {len(file_list)} {output_format} files")
+        if not file_list:
+            return []
+        try:
+            return partition_tabular(source, file_list, valid_sheets, output_format, progress, cancel)
+        except SplitCancelled:
+            raise
+        except Exception as e:
+            logger.exception(f"Error during partitioning: {str(e)}")
+            raise ValueError(f"Error during partitioning: {str(e)}")
+    if values_only:
+        logger.info(f"Partitioning {source_path(source)} into {len(file_list)} values-only files")
+        if not file_list:
+            return []
+        try:
+            return partition_values(source, file_list, valid_sheets, progress, cancel)
+        except SplitCancelled:
+            raise
+        except Exception as e:
+            logger.exception(f"Error during partitioning: {str(e)}")
+            raise ValueError(f"Error during partitioning: {str(e)}")
+    if engine == 'xml':
+        from excel_utils.xml_engine import create_filtered_files_xml
+        return create_filtered_files_xml(source_path(source), file_list, valid_sheets)
+    if engine not in ('openpyxl', 'columnar'):
+        raise ValueError(f"Unknown engine: {engine}")
+    logger.info(f"Partitioning {source_path(source)} into {len(file_list)} files in a single pass")
+    if not file_list:
+        return []
+    try:
+        table = None
+        if engine == 'columnar':
+            from excel_utils.columnar import columnar_table, filter_columns
+            columns = filter_columns([filters for filters, _ in file_list])
+            if columns:
+                table = columnar_table(source, valid_sheets, columns)
+        with full_workbook(source) as wb_source, \
+                passthrough_sheets(source_path(source), wb_source, valid_sheets) as passthrough:
+            skeleton = workbook_skeleton(source, wb_source, valid_sheets)
+            return partition_workbook(
+                wb_source, file_list, valid_sheets, write_only, progress, cancel, table, passthrough, skeleton
+            )
+    except SplitCancelled:
+        raise
+    except Exception as e:
+        logger.exception(f"Error during partitioning: {str(e)}")
+        raise ValueError(f"Error during partitioning: {str(e)}")
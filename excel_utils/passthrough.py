@@ -0,0 +1,252 @@
+"""
+Перенос нефильтруемых листов в выходные книги openpyxl исходными частями XML.
+
+Лист без заголовков одинаков во всех выходных файлах, поэтому вместо
+копирования ячеек в выходной книге создается пустой лист-заместитель,
+а при сохранении на его место записывается исходная часть
+xl/worksheets/sheetN.xml без разбора ячеек. Чтобы индексы в исходной
+разметке оставались действительными:
+
+- выходная книга получает таблицы стилей источника на тех же позициях
+  (как книга, загруженная openpyxl), поэтому атрибуты s и dxfId ячеек,
+  строк, столбцов и условного форматирования указывают на те же стили;
+- openpyxl пишет строки ячеек как встроенные, поэтому таблица общих строк
+  выходного файла - начало таблицы источника до последней строки, на
+  которую ссылаются переносимые листы;
+- связи листа копируются, поэтому переносятся только листы, все связи
+  которых внешние (гиперссылки); листы с рисунками, примечаниями и
+  таблицами копируются по ячейкам, как раньше.
+"""
+import re
+import copy
+import shutil
+import logging
+import zipfile
+import datetime
+from contextlib import contextmanager
+import xml.etree.ElementTree as ET
+from openpyxl.writer.excel import ExcelWriter
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.styles.named_styles import NamedStyleList
+from openpyxl.styles.differential import DifferentialStyleList
+from openpyxl.packaging.relationship import Relationship, RelationshipList
+from openpyxl.xml.constants import ARC_WORKBOOK_RELS, ARC_SHARED_STRINGS
+from excel_utils.xlsx_parts import (
+    MAIN_NS, REL_TYPE_SHARED_STRINGS, SHARED_STRINGS_CONTENT_TYPE,
+    qname, read_relationships, read_workbook_sheets, SharedStringTable,
+)
+from excel_utils.instrumentation import stage, count
+
+logger = logging.getLogger('excel_splitter')
+
+_CELL_TAG = qname(MAIN_NS, "c")
+_VALUE_TAG = qname(MAIN_NS, "v")
+_ROW_TAG = qname(MAIN_NS, "row")
+# Начало sheetData с любым префиксом пространства имен
+_SHEET_DATA_RE = re.compile(rb"<(?:\w+:)?sheetData[\s>/]")
+_TAB_SELECTED_RE = re.compile(rb'tabSelected="(?:1|true)"')
+_SHARED_STRINGS_REL_ID = "rIdPassthroughStrings"
+
+# Таблицы стилей книги openpyxl, которые переносятся из источника по позициям
+_STYLE_TABLES = ('_fonts', '_fills', '_borders', '_alignments', '_protections', '_number_formats', '_cell_styles')
+
+class _SharedStringsPart:
+    """Запись [Content_Types].xml для части общих строк."""
+    path = "/" + ARC_SHARED_STRINGS
+    mime_type = SHARED_STRINGS_CONTENT_TYPE
+
+class SheetPassthrough:
+    """
+    Нефильтруемые листы источника path, переносимые частями XML.
+    sheets - имя листа -> (путь части, внешние связи листа).
+    """
+
+    def __init__(self, path, wb_source, valid_sheets):
+        self.path = path
+        self.wb_source = wb_source
+        self.sheets = {}
+        self.heads = {}
+        self.strings_xml = None
+        self.zf = zipfile.ZipFile(path)
+        try:
+            for sheet in read_workbook_sheets(self.zf):
+                if sheet['name'] in valid_sheets or sheet['state'] != 'visible':
+                    continue
+                if not sheet['is_worksheet'] or sheet['path'] not in self.zf.namelist():
+                    continue
+                relationships = read_relationships(self.zf, sheet['path'])
+                if any(mode != "External" for _, _, mode in relationships.values()):
+                    logger.debug(f"Sheet {sheet['name']} has related parts, its cells will be copied")
+                    continue
+                self.sheets[sheet['name']] = (sheet['path'], relationships)
+            if self.sheets:
+                self._prepare_strings()
+                for sheet_path, _ in self.sheets.values():
+                    self.heads[sheet_path] = self._read_head(sheet_path)
+        except Exception:
+            self.zf.close()
+            raise
+
+    def _read_head(self, sheet_path):
+        """
+        Начало части листа до sheetData: (исходная длина, начало без выделения вкладки).
+        Выделенными остаются только вкладки, которые выбрал openpyxl.
+        """
+        with self.zf.open(sheet_path) as stream:
+            head = b""
+            while True:
+                chunk = stream.read(65536)
+                head += chunk
+                match = _SHEET_DATA_RE.search(head)
+                if match or not chunk:
+                    break
+        end = match.start() if match else len(head)
+        return end, _TAB_SELECTED_RE.sub(b'tabSelected="0"', head[:end])
+
+    def _prepare_strings(self):
+        """Готовит таблицу общих строк выходных файлов: строки до последней используемой."""
+        last_idx = -1
+        references = 0
+        for sheet_path, _ in self.sheets.values():
+            with self.zf.open(sheet_path) as stream:
+                for _, elem in ET.iterparse(stream):
+                    if elem.tag == _CELL_TAG and elem.get("t") == "s":
+                        value = elem.find(_VALUE_TAG)
+                        if value is not None and value.text:
+                            last_idx = max(last_idx, int(value.text))
+                            references += 1
+                    elif elem.tag == _ROW_TAG:
+                        elem.clear()
+        if last_idx < 0:
+            return
+        table = SharedStringTable(self.zf)
+        self.strings_xml = table.xml(range(last_idx + 1), references).encode("utf-8")
+
+    def __bool__(self):
+        return bool(self.sheets)
+
+    def __contains__(self, sheet_name):
+        return sheet_name in self.sheets
+
+    def prepare(self, wb_new):
+        """
+        Переносит в новую выходную книгу таблицы стилей источника по тем же позициям.
+        Вызывается до создания листов и записи строк.
+        """
+        if not self.sheets:
+            return
+        wb_source = self.wb_source
+        for name in _STYLE_TABLES:
+            setattr(wb_new, name, IndexedList(getattr(wb_source, name)))
+        wb_new._differential_styles = DifferentialStyleList(dxf=list(wb_source._differential_styles.styles))
+        wb_new._named_styles = NamedStyleList([copy.copy(style) for style in wb_source._named_styles])
+        for style in wb_new._named_styles:
+            style.bind(wb_new)
+        wb_new._table_styles = wb_source._table_styles
+        wb_new._colors = wb_source._colors
+        wb_new._date_formats = copy.copy(wb_source._date_formats)
+        wb_new._timedelta_formats = copy.copy(wb_source._timedelta_formats)
+        wb_new.epoch = wb_source.epoch
+        wb_new.loaded_theme = wb_source.loaded_theme
+
+    def add_sheet(self, wb_new, sheet_name):
+        """Создает лист-заместитель, который при сохранении заменяется исходной частью."""
+        logger.debug(f"Carrying sheet {sheet_name} over as its original XML part")
+        return wb_new.create_sheet(title=sheet_name)
+
+    def copy_part(self, sheet_name, archive, part_name):
+        """Записывает исходную часть листа в архив выходного файла."""
+        sheet_path, _ = self.sheets[sheet_name]
+        head_length, head = self.heads[sheet_path]
+        with self.zf.open(sheet_path) as stream, archive.open(part_name, "w") as out:
+            stream.read(head_length)
+            out.write(head)
+            shutil.copyfileobj(stream, out, 1024 * 1024)
+        count('raw_sheets_copied')
+
+    def relationships(self, sheet_name):
+        """Внешние связи листа в виде списка связей openpyxl."""
+        rels = RelationshipList()
+        for rel_id, (rel_type, target, mode) in self.sheets[sheet_name][1].items():
+            rels.append(Relationship(Id=rel_id, Type=rel_type, Target=target, TargetMode=mode))
+        return rels
+
+    def save(self, wb_new, target):
+        """Сохраняет выходную книгу, записывая переносимые листы исходными частями."""
+        if wb_new.write_only and not wb_new.worksheets:
+            wb_new.create_sheet()
+        wb_new.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+        strings = self.strings_xml is not None and any(ws.title in self.sheets for ws in wb_new.worksheets)
+        archive = _PassthroughArchive(target, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        archive.shared_strings = strings
+        _PassthroughWriter(wb_new, archive, self, strings).save()
+
+    def close(self):
+        self.zf.close()
+
+def open_passthrough(path, wb_source, valid_sheets):
+    """SheetPassthrough для нефильтруемых листов источника или None, если переносить нечего."""
+    try:
+        with stage('passthrough_scan'):
+            passthrough = SheetPassthrough(path, wb_source, valid_sheets)
+    except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError) as e:
+        logger.debug(f"Sheets of {path} will be copied cell by cell: {str(e)}")
+        return None
+    if not passthrough:
+        passthrough.close()
+        return None
+    return passthrough
+
+@contextmanager
+def passthrough_sheets(path, wb_source, valid_sheets):
+    """Контекст open_passthrough: SheetPassthrough или None, закрывается по выходе."""
+    passthrough = open_passthrough(path, wb_source, valid_sheets)
+    try:
+        yield passthrough
+    finally:
+        if passthrough is not None:
+            passthrough.close()
+
+def save_workbook(wb_new, target, passthrough=None):
+    """Сохраняет выходную книгу; листы из passthrough записываются исходными частями."""
+    if passthrough is None:
+        wb_new.save(target)
+    else:
+        passthrough.save(wb_new, target)
+
+class _PassthroughArchive(zipfile.ZipFile):
+    """Архив выходного файла, добавляющий в связи книги таблицу общих строк."""
+    shared_strings = False
+
+    def writestr(self, zinfo_or_arcname, data, *args, **kwargs):
+        if self.shared_strings and zinfo_or_arcname == ARC_WORKBOOK_RELS:
+            relationship = (
+                f'<Relationship Id="{_SHARED_STRINGS_REL_ID}" Type="{REL_TYPE_SHARED_STRINGS}" '
+                f'Target="sharedStrings.xml"/></Relationships>'
+            )
+            data = data.replace(b"</Relationships>", relationship.encode("utf-8"))
+        super().writestr(zinfo_or_arcname, data, *args, **kwargs)
+
+class _PassthroughWriter(ExcelWriter):
+    """ExcelWriter, записывающий листы-заместители исходными частями XML."""
+
+    def __init__(self, workbook, archive, passthrough, shared_strings):
+        super().__init__(workbook, archive)
+        self.passthrough = passthrough
+        self.shared_strings = shared_strings
+
+    def write_data(self):
+        if self.shared_strings:
+            self._archive.writestr(ARC_SHARED_STRINGS, self.passthrough.strings_xml)
+            self.manifest.append(_SharedStringsPart())
+        super().write_data()
+
+    def write_worksheet(self, ws):
+        if ws.title not in self.passthrough:
+            return super().write_worksheet(ws)
+        ws._drawing = None
+        ws._comments = []
+        ws._hyperlinks = []
+        ws._rels = self.passthrough.relationships(ws.title)
+        self.passthrough.copy_part(ws.title, self._archive, ws.path[1:])
+        self.manifest.append(ws)
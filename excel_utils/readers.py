@@ -0,0 +1,348 @@
+"""
+Сменные движки чтения значений исходной книги.
+
+Движок - объект с методом open(path), возвращающим книгу для чтения значений
+с интерфейсом книги openpyxl в режиме read_only: sheetnames, worksheets,
+wb[имя] и close(). Лист книги предоставляет title, sheet_state (видимость),
+max_row и iter_rows(min_row, max_row, values_only=True) - кортежи значений
+строк, в том числе строк для поиска заголовков. Такой объект передается
+всюду, где принимается cache (SourceCache - тоже движок чтения).
+
+  'openpyxl' - openpyxl.load_workbook(read_only=True) с объектами ячеек
+  'lean'     - разбор XML листов и таблицы общих строк из zip напрямую
+               через xml.etree.ElementTree.iterparse; читает и файлы CSV
+
+Значения движка 'lean' совпадают со значениями openpyxl: числа, даты по
+формату стиля, логические значения, общие и встроенные строки, формулы
+(в виде текста '=...', как при data_only=False).
+"""
+import os
+import csv
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+import openpyxl
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import from_excel, from_ISO8601, WINDOWS_EPOCH, CALENDAR_MAC_1904
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.worksheet.formula import ArrayFormula, DataTableFormula
+from excel_utils.xlsx_parts import (
+    MAIN_NS, qname, column_index_from_letters, read_workbook_sheets, read_shared_strings, read_cell_formats,
+    read_date1904, _string_item_text
+)
+
+logger = logging.getLogger('excel_splitter')
+
+READERS = ('openpyxl', 'lean')
+
+_ROW_TAG = qname(MAIN_NS, "row")
+_CELL_TAG = qname(MAIN_NS, "c")
+_VALUE_TAG = qname(MAIN_NS, "v")
+_FORMULA_TAG = qname(MAIN_NS, "f")
+_INLINE_TAG = qname(MAIN_NS, "is")
+_SHEET_DATA_TAG = qname(MAIN_NS, "sheetData")
+_DIMENSION_TAG = qname(MAIN_NS, "dimension")
+_DIGITS = "0123456789"
+
+def is_csv_source(path):
+    """Признак источника CSV по расширению файла."""
+    return str(path).lower().endswith('.csv')
+
+class OpenpyxlReader:
+    """Чтение значений через openpyxl в режиме read_only."""
+    name = 'openpyxl'
+
+    def open(self, path):
+        return openpyxl.load_workbook(path, read_only=True)
+
+class LeanReader:
+    """Чтение значений разбором XML листов (.xlsx, .xlsm) или файла CSV."""
+    name = 'lean'
+
+    def open(self, path):
+        if is_csv_source(path):
+            return CsvWorkbook(path)
+        return LeanWorkbook(path)
+
+def get_reader(name):
+    """Движок чтения по имени ('openpyxl' или 'lean')."""
+    if name == 'openpyxl':
+        return OpenpyxlReader()
+    if name == 'lean':
+        return LeanReader()
+    raise ValueError(f"Unknown reader: {name}")
+
+def source_reader(name, path=None):
+    """
+    Движок чтения для сессии SourceWorkbook: None для 'openpyxl' (значения
+    читаются из полной книги сессии) и LeanReader для 'lean' и источников CSV.
+    """
+    if name not in READERS:
+        raise ValueError(f"Unknown reader: {name}")
+    if name == 'lean' or (path is not None and is_csv_source(path)):
+        return LeanReader()
+    return None
+
+def _cast_number(value):
+    """Число из текста ячейки так же, как в openpyxl."""
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+class LeanWorkbook:
+    """Книга .xlsx, листы которой читаются потоково из XML без объектов ячеек."""
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        try:
+            self.shared_strings = read_shared_strings(self._zip)
+            formats = read_cell_formats(self._zip)
+            self.date_styles = {idx for idx, fmt in enumerate(formats) if fmt and is_date_format(fmt)}
+            self.timedelta_styles = {idx for idx, fmt in enumerate(formats) if fmt and is_timedelta_format(fmt)}
+            self.epoch = CALENDAR_MAC_1904 if read_date1904(self._zip) else WINDOWS_EPOCH
+            self.worksheets = [
+                LeanSheet(self, sheet['name'], sheet['path'], sheet['state'])
+                for sheet in read_workbook_sheets(self._zip) if sheet['is_worksheet'] and sheet['path']
+            ]
+        except Exception:
+            self._zip.close()
+            raise
+        self._by_name = {ws.title: ws for ws in self.worksheets}
+
+    @property
+    def sheetnames(self):
+        return [ws.title for ws in self.worksheets]
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def open_part(self, path):
+        return self._zip.open(path)
+
+    def close(self):
+        self._zip.close()
+
+class LeanSheet:
+    """Лист LeanWorkbook с интерфейсом листа openpyxl в режиме read_only (только значения)."""
+
+    def __init__(self, workbook, title, path, sheet_state='visible'):
+        self.parent = workbook
+        self.title = title
+        self.path = path
+        self.sheet_state = sheet_state
+        self.max_column, self.max_row = self._dimensions()
+
+    def _dimensions(self):
+        """Размеры листа из элемента dimension (как в openpyxl) или (None, None)."""
+        with self.parent.open_part(self.path) as stream:
+            for _, elem in ET.iterparse(stream, events=("start",)):
+                if elem.tag == _DIMENSION_TAG:
+                    try:
+                        _, _, max_col, max_row = range_boundaries(elem.get("ref", ""))
+                        return max_col, max_row
+                    except (TypeError, ValueError):
+                        return None, None
+                if elem.tag == _SHEET_DATA_TAG:
+                    break
+        return None, None
+
+    def iter_rows(self, min_row=None, max_row=None, values_only=True):
+        """
+        Кортежи значений строк min_row..max_row. Как в openpyxl, строки дополняются
+        до max_column, а отсутствующие строки внутри диапазона возвращаются пустыми.
+        """
+        if not values_only:
+            raise ValueError("Lean reader sheets only provide cell values")
+        return self._cells_by_row(min_row or 1, max_row or self.max_row)
+
+    def _cells_by_row(self, min_row, max_row):
+        width = self.max_column
+        empty_row = (None,) * width if width else ()
+        counter = min_row
+        row_idx = 1
+        for row_idx, cells in self._parse():
+            if max_row is not None and row_idx > max_row:
+                break
+            # Пропущенные в XML строки
+            for _ in range(counter, row_idx):
+                counter += 1
+                yield empty_row
+            if counter <= row_idx:
+                counter += 1
+                yield self._row(cells, width)
+        if max_row is not None and max_row < row_idx:
+            for _ in range(counter, max_row + 1):
+                yield empty_row
+
+    @staticmethod
+    def _row(cells, width):
+        if not cells and not width:
+            return ()
+        width = width or cells[-1][0]
+        values = [None] * width
+        for column, value in cells:
+            if column <= width:
+                values[column - 1] = value
+        return tuple(values)
+
+    def _parse(self):
+        """Разбирает строки листа: пары (номер строки, список (номер колонки, значение))."""
+        shared_formulae = {}
+        # Номера колонок по буквам адреса ячейки, чтобы не вычислять их для каждой ячейки
+        columns = {}
+        row_counter = 0
+        sheet_data = None
+        with self.parent.open_part(self.path) as stream:
+            for event, elem in ET.iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == _SHEET_DATA_TAG:
+                        sheet_data = elem
+                    continue
+                if elem.tag != _ROW_TAG:
+                    continue
+                row_number = elem.get("r")
+                row_counter = int(float(row_number)) if row_number else row_counter + 1
+                cells = []
+                col_counter = 0
+                for cell in elem:
+                    if cell.tag != _CELL_TAG:
+                        continue
+                    ref = cell.get("r")
+                    if ref:
+                        letters = ref.rstrip(_DIGITS)
+                        col_counter = columns.get(letters)
+                        if col_counter is None:
+                            col_counter = columns[letters] = column_index_from_letters(letters)
+                    else:
+                        col_counter += 1
+                    cells.append((col_counter, self._value(cell, ref, shared_formulae)))
+                yield row_counter, cells
+                # Разобранные строки удаляются, чтобы память не росла с размером листа
+                if sheet_data is not None:
+                    sheet_data.clear()
+                else:
+                    elem.clear()
+
+    def _value(self, cell, ref, shared_formulae):
+        # Дочерние элементы ячейки просматриваются один раз
+        value = None
+        inline = None
+        for child in cell:
+            tag = child.tag
+            if tag == _VALUE_TAG:
+                value = child.text or None
+            elif tag == _FORMULA_TAG:
+                return self._formula(child, ref, shared_formulae)
+            elif tag == _INLINE_TAG:
+                inline = child
+        data_type = cell.get("t", "n")
+        if data_type == "inlineStr":
+            return _string_item_text(inline) if inline is not None else None
+        if value is None:
+            return None
+        if data_type == "n":
+            value = _cast_number(value)
+            style_id = int(cell.get("s", 0))
+            if style_id in self.parent.date_styles:
+                try:
+                    return from_excel(
+                        value, self.parent.epoch, timedelta=style_id in self.parent.timedelta_styles
+                    )
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if data_type == "s":
+            return self.parent.shared_strings[int(value)]
+        if data_type == "b":
+            return bool(int(value))
+        if data_type == "d":
+            return from_ISO8601(value)
+        return value
+
+    @staticmethod
+    def _formula(formula, ref, shared_formulae):
+        """Формула ячейки в виде, который openpyxl возвращает при data_only=False."""
+        formula_type = formula.get("t")
+        value = "="
+        if formula.text is not None:
+            value += formula.text
+        if formula_type == "array":
+            return ArrayFormula(ref=formula.get("ref"), text=value)
+        if formula_type == "shared":
+            idx = formula.get("si")
+            if idx in shared_formulae:
+                return shared_formulae[idx].translate_formula(ref)
+            if value != "=":
+                shared_formulae[idx] = Translator(value, ref)
+            return value
+        if formula_type == "dataTable":
+            return DataTableFormula(**formula.attrib)
+        return value
+
+class CsvWorkbook:
+    """
+    Файл CSV как книга из одного видимого листа с именем файла. Разделитель
+    определяется по началу файла, значения - строки, пустые поля - None.
+    """
+
+    def __init__(self, path, encoding='utf-8-sig'):
+        self.path = path
+        self.encoding = encoding
+        with open(path, newline='', encoding=encoding) as f:
+            sample = f.read(65536)
+        try:
+            self.dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            self.dialect = csv.excel
+        self.worksheets = [CsvSheet(self, os.path.splitext(os.path.basename(path))[0])]
+
+    @property
+    def sheetnames(self):
+        return [ws.title for ws in self.worksheets]
+
+    def __getitem__(self, name):
+        for ws in self.worksheets:
+            if ws.title == name:
+                return ws
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self.sheetnames
+
+    def close(self):
+        pass
+
+class CsvSheet:
+    """Лист CsvWorkbook; строки имеют длину строки файла, как у листа без размеров."""
+
+    def __init__(self, workbook, title):
+        self.parent = workbook
+        self.title = title
+        self.sheet_state = 'visible'
+        self._max_row = None
+
+    @property
+    def max_row(self):
+        """Количество строк файла (считается при первом обращении)."""
+        if self._max_row is None:
+            self._max_row = sum(1 for _ in self._records())
+        return self._max_row
+
+    def _records(self):
+        with open(self.parent.path, newline='', encoding=self.parent.encoding) as f:
+            yield from csv.reader(f, self.parent.dialect)
+
+    def iter_rows(self, min_row=None, max_row=None, values_only=True):
+        if not values_only:
+            raise ValueError("CSV sheets only provide cell values")
+        min_row = min_row or 1
+        for row_idx, record in enumerate(self._records(), 1):
+            if max_row is not None and row_idx > max_row:
+                break
+            if row_idx >= min_row:
+                yield tuple(value if value != "" else None for value in record)
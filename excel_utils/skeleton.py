@@ -0,0 +1,89 @@
+"""
+Заготовка выходной книги, общая для всех комбинаций фильтров.
+
+Порядок видимых листов, ширина столбцов, высота строк, объединенные
+ячейки, условное форматирование, технические строки и строка заголовков
+не зависят от фильтров. WorkbookSkeleton вычисляет их один раз на запуск
+(SheetTemplate на каждый видимый лист), а каждый выходной лист создается
+из шаблона, после чего в него добавляются только строки данных.
+"""
+import logging
+from excel_utils.common import copy_cell_style
+from excel_utils.workbook import (
+    worksheet_structure,
+    copy_worksheet_structure,
+    conditional_formatting_rules,
+    copy_conditional_formatting,
+)
+from excel_utils.source import SourceWorkbook
+from excel_utils.instrumentation import stage, count
+
+logger = logging.getLogger('excel_splitter')
+
+class SheetTemplate:
+    """
+    Не зависящая от фильтров часть выходного листа.
+    header_row_idx - индекс строки заголовков (None для листов без заголовков).
+    leading_rows - ячейки источника строк 1..header_row_idx.
+    """
+
+    def __init__(self, ws_source, header_row_idx=None):
+        self.ws_source = ws_source
+        self.title = ws_source.title
+        self.header_row_idx = header_row_idx
+        self.structure = worksheet_structure(ws_source)
+        self.conditional_formats = conditional_formatting_rules(ws_source)
+        self.leading_rows = []
+        if header_row_idx:
+            self.leading_rows = [tuple(row) for row in ws_source.iter_rows(min_row=1, max_row=header_row_idx)]
+
+    @property
+    def header_cells(self):
+        return self.leading_rows[-1] if self.leading_rows else ()
+
+    def apply_structure(self, ws_new):
+        """Переносит структуру и условное форматирование в новый лист."""
+        copy_worksheet_structure(self.ws_source, ws_new, self.structure)
+        copy_conditional_formatting(self.ws_source, ws_new, self.conditional_formats)
+
+    def write_leading_rows(self, ws_new, style_cache=None):
+        """Записывает технические строки и строку заголовков в лист обычной книги."""
+        for row_idx, row in enumerate(self.leading_rows, start=1):
+            for col_idx, source_cell in enumerate(row, start=1):
+                try:
+                    if source_cell.value is not None or source_cell.has_style:
+                        target_cell = ws_new.cell(row=row_idx, column=col_idx, value=source_cell.value)
+                        copy_cell_style(source_cell, target_cell, style_cache)
+                except Exception as e:
+                    logger.debug(f"Error copying cell at row {row_idx}, col {col_idx}: {str(e)}")
+
+class WorkbookSkeleton:
+    """Шаблоны видимых листов исходной книги в порядке листов (скрытые пропускаются)."""
+
+    def __init__(self, wb_source, valid_sheets):
+        self.templates = []
+        with stage('skeleton'):
+            for sheet_name in wb_source.sheetnames:
+                ws_source = wb_source[sheet_name]
+                if ws_source.sheet_state != 'visible':
+                    logger.debug(f"Skipping hidden sheet: {sheet_name}")
+                    continue
+                header_row_idx = valid_sheets[sheet_name][1] if sheet_name in valid_sheets else None
+                self.templates.append(SheetTemplate(ws_source, header_row_idx))
+        count('skeleton_sheets', len(self.templates))
+        self._by_name = {template.title: template for template in self.templates}
+
+    def __iter__(self):
+        return iter(self.templates)
+
+    def get(self, sheet_name):
+        return self._by_name.get(sheet_name)
+
+def workbook_skeleton(source, wb_source, valid_sheets):
+    """
+    Заготовка выходной книги для полной книги wb_source источника source.
+    Для сессии SourceWorkbook заготовка строится один раз и переиспользуется.
+    """
+    if isinstance(source, SourceWorkbook):
+        return source.skeleton(valid_sheets)
+    return WorkbookSkeleton(wb_source, valid_sheets)
@@ -0,0 +1,156 @@
+"""
+Сессия работы с исходной книгой: файл открывается и разбирается один раз,
+а анализ заголовков, выбор категорий и создание файлов используют одну и ту же книгу.
+"""
+import logging
+from contextlib import contextmanager
+import openpyxl
+from excel_utils.instrumentation import stage
+
+logger = logging.getLogger('excel_splitter')
+
+@contextmanager
+def safe_workbook(file_path, read_only=False):
+    """Контекстный менеджер для безопасной работы с файлами Excel."""
+    wb = None
+    try:
+        logger.debug(f"Opening workbook: {file_path}")
+        with stage('load_source'):
+            wb = openpyxl.load_workbook(file_path, read_only=read_only)
+        yield wb
+    finally:
+        if wb:
+            try:
+                wb.close()
+                logger.debug(f"Workbook closed: {file_path}")
+            except Exception as e:
+                logger.error(f"Error closing workbook: {str(e)}")
+
+class SourceWorkbook:
+    """
+    Исходная книга, открытая на время обработки.
+
+    Книга разбирается один раз при первом обращении и используется
+    и для чтения значений, и для создания выходных файлов. Если задан
+    cache (SourceCache или движок чтения из readers), значения для анализа
+    читаются через него, а полная книга загружается только когда она нужна
+    для записи.
+    release() освобождает память, при следующем обращении книга откроется снова.
+    """
+
+    def __init__(self, path, cache=None):
+        self.path = path
+        self.cache = cache
+        self.opens = 0
+        self._workbook = None
+        self._cached = None
+        self._headers = {}
+        self._tables = []
+        self._skeletons = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def workbook(self):
+        """Полная книга openpyxl (со стилями и структурой листов)."""
+        if self._workbook is None:
+            logger.info(f"Loading source workbook: {self.path}")
+            with stage('load_source'):
+                self._workbook = openpyxl.load_workbook(self.path, read_only=False)
+            self.opens += 1
+        return self._workbook
+
+    def values(self):
+        """Книга для чтения значений: кэш или движок чтения, если он задан, иначе полная книга."""
+        if self.cache is None:
+            return self.workbook()
+        if self._cached is None:
+            self._cached = self.cache.open(self.path)
+            self.opens += 1
+        return self._cached
+
+    def sheet_headers(self, max_scan_rows=10):
+        """Заголовки и индексы строк заголовков всех видимых листов (вычисляются один раз)."""
+        if max_scan_rows not in self._headers:
+            from excel_utils.analysis import get_all_sheets_headers
+            self._headers[max_scan_rows] = get_all_sheets_headers(self, max_scan_rows)
+        return self._headers[max_scan_rows]
+
+    @property
+    def valid_sheets(self):
+        """Листы, в которых найдены заголовки."""
+        return {sheet: data for sheet, data in self.sheet_headers().items() if data[0] is not None}
+
+    def columnar_table(self, valid_sheets, hierarchy_columns):
+        """
+        Колоночная таблица колонок иерархии (строится один раз). Подходит и таблица,
+        построенная для более длинной иерархии с теми же первыми колонками.
+        """
+        columns = list(hierarchy_columns)
+        for table in self._tables:
+            if table.hierarchy_columns[:len(columns)] == columns and set(table.sheets) == set(valid_sheets):
+                return table
+        from excel_utils.columnar import build_columnar_table
+        table = build_columnar_table(self, valid_sheets, columns)
+        self._tables.append(table)
+        return table
+
+    def skeleton(self, valid_sheets):
+        """
+        Заготовка выходной книги (WorkbookSkeleton) для листов valid_sheets
+        (строится один раз для каждого набора строк заголовков).
+        """
+        key = tuple(sorted((sheet, data[1]) for sheet, data in valid_sheets.items()))
+        if key not in self._skeletons:
+            from excel_utils.skeleton import WorkbookSkeleton
+            self._skeletons[key] = WorkbookSkeleton(self.workbook(), valid_sheets)
+        return self._skeletons[key]
+
+    def release(self):
+        """Освобождает разобранную книгу; метаданные заголовков сохраняются."""
+        # Шаблоны ссылаются на листы освобождаемой книги
+        self._skeletons.clear()
+        if self._workbook is not None:
+            try:
+                self._workbook.close()
+            except Exception as e:
+                logger.error(f"Error closing workbook: {str(e)}")
+            self._workbook = None
+        if self._cached is not None:
+            self._cached.close()
+            self._cached = None
+
+    def close(self):
+        """Завершает сессию."""
+        self.release()
+        self._headers.clear()
+        self._tables.clear()
+
+def source_path(source):
+    """Путь к исходному файлу для пути или сессии SourceWorkbook."""
+    return source.path if isinstance(source, SourceWorkbook) else source
+
+@contextmanager
+def values_workbook(source, cache=None):
+    """
+    Книга для чтения значений. Книга сессии не закрывается по выходу из блока,
+    файл по пути открывается из кэша или в режиме read_only и закрывается.
+    """
+    if isinstance(source, SourceWorkbook):
+        yield source.values()
+        return
+    from excel_utils.source_cache import open_source
+    with open_source(source, cache) as wb:
+        yield wb
+
+@contextmanager
+def full_workbook(source):
+    """Полная книга openpyxl для создания выходных файлов."""
+    if isinstance(source, SourceWorkbook):
+        yield source.workbook()
+        return
+    with safe_workbook(source, read_only=False) as wb:
+        yield wb
@@ -0,0 +1,344 @@
+"""
+Постоянный кэш разобранных исходных книг.
+
+Значения видимых листов хранятся по колонкам в бинарном файле: каждая колонка -
+отдельный сжатый блок JSON, поэтому анализ читает с диска только нужные колонки.
+Даты, время и интервалы записываются помеченными списками; формат не позволяет
+выполнить код при чтении подмененного файла кэша, в отличие от pickle.
+Кэш привязан к пути, размеру, времени изменения и хэшу содержимого источника
+и автоматически перестраивается, если файл изменился.
+"""
+import os
+import json
+import zlib
+import struct
+import hashlib
+import logging
+import datetime
+import tempfile
+from contextlib import contextmanager
+import openpyxl
+
+logger = logging.getLogger('excel_splitter')
+
+CACHE_MAGIC = b"XLSCACHE"
+CACHE_VERSION = 2
+CACHE_EXTENSION = ".xlsc"
+_TRAILER = struct.Struct("<Q")
+
+def _encode_value(value):
+    """Значение ячейки для JSON: даты, время и интервалы - списки [тип, ...]."""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return ["datetime", value.isoformat()]
+    if isinstance(value, datetime.date):
+        return ["date", value.isoformat()]
+    if isinstance(value, datetime.time):
+        return ["time", value.isoformat()]
+    if isinstance(value, datetime.timedelta):
+        return ["timedelta", value.days, value.seconds, value.microseconds]
+    return str(value)
+
+def _decode_value(value):
+    if value.__class__ is not list:
+        return value
+    kind = value[0]
+    if kind == "datetime":
+        return datetime.datetime.fromisoformat(value[1])
+    if kind == "date":
+        return datetime.date.fromisoformat(value[1])
+    if kind == "time":
+        return datetime.time.fromisoformat(value[1])
+    if kind == "timedelta":
+        return datetime.timedelta(days=value[1], seconds=value[2], microseconds=value[3])
+    raise ValueError(f"Unknown cached value type: {kind}")
+
+def encode_column(values):
+    """Сжатый блок колонки и признак того, что в ней есть помеченные значения."""
+    encoded = [_encode_value(value) for value in values]
+    tagged = any(value.__class__ is list for value in encoded)
+    data = json.dumps(encoded, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(data), tagged
+
+def decode_column(data, tagged):
+    values = json.loads(zlib.decompress(data).decode("utf-8"))
+    if not isinstance(values, list):
+        raise ValueError("Cached column is not a list")
+    if tagged:
+        values = [_decode_value(value) for value in values]
+    return values
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Хэш содержимого файла (SHA-1), читаемого блоками."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class CachedSheet:
+    """
+    Лист из кэша с интерфейсом листа openpyxl в режиме read_only
+    (только iter_rows(values_only=True)). Колонки загружаются с диска при первом обращении.
+    """
+
+    def __init__(self, workbook, title, row_count, column_blocks):
+        self.workbook = workbook
+        self.title = title
+        self.sheet_state = 'visible'
+        self.max_row = row_count
+        self.max_column = len(column_blocks)
+        self.column_blocks = column_blocks
+        self.columns = {}
+
+    def column(self, idx):
+        """Возвращает значения колонки idx (с 0) для всех строк листа."""
+        values = self.columns.get(idx)
+        if values is None:
+            offset, length, tagged = self.column_blocks[idx]
+            values = decode_column(self.workbook.read_block(offset, length), tagged)
+            self.columns[idx] = values
+        return values
+
+    def iter_rows(self, min_row=1, max_row=None, values_only=True, columns=None):
+        """
+        Возвращает строки листа кортежами значений, как iter_rows(values_only=True).
+        columns - номера колонок (с 0), которые нужно загрузить; остальные будут None.
+        """
+        if not values_only:
+            raise ValueError("Cached sheets only provide cell values")
+        last_row = self.max_row if max_row is None else min(max_row, self.max_row)
+        if min_row > last_row:
+            return iter(())
+        if columns is None:
+            needed = range(self.max_column)
+        else:
+            needed = [idx for idx in columns if idx < self.max_column]
+        start, stop = min_row - 1, last_row
+        empty = [None] * (stop - start)
+        data = [empty] * self.max_column
+        for idx in needed:
+            data[idx] = self.column(idx)[start:stop]
+        return zip(*data) if data else iter([()] * (stop - start))
+
+    def release(self):
+        """Освобождает загруженные колонки."""
+        self.columns.clear()
+
+class CachedWorkbook:
+    """Разобранная книга из файла кэша с интерфейсом книги openpyxl для чтения значений."""
+
+    def __init__(self, cache_path, meta):
+        self.cache_path = cache_path
+        self.meta = meta
+        self._file = None
+        self.worksheets = [
+            CachedSheet(self, sheet['name'], sheet['rows'], [tuple(block) for block in sheet['columns']])
+            for sheet in meta['sheets']
+        ]
+        self._by_name = {ws.title: ws for ws in self.worksheets}
+
+    @property
+    def sheetnames(self):
+        return [ws.title for ws in self.worksheets]
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def read_block(self, offset, length):
+        if self._file is None:
+            self._file = open(self.cache_path, "rb")
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def release(self):
+        """Освобождает загруженные в память колонки всех листов."""
+        for ws in self.worksheets:
+            ws.release()
+
+    def close(self):
+        self.release()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class SourceCache:
+    """
+    Каталог с кэшами исходных книг.
+
+    Файл кэша: CACHE_MAGIC, сжатые блоки колонок (JSON), метаданные JSON
+    (ключ источника, листы, смещения блоков) и хвост со смещением метаданных.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.builds = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_path(self, source):
+        """Путь к файлу кэша для исходного файла."""
+        name = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name + CACHE_EXTENSION)
+
+    def open(self, source):
+        """Возвращает книгу из кэша, при отсутствии или устаревании кэша строит его заново."""
+        cache_path = self.cache_path(source)
+        meta = self._load_meta(source, cache_path)
+        if meta is None:
+            meta = self._build(source, cache_path)
+        return CachedWorkbook(cache_path, meta)
+
+    def invalidate(self, source):
+        """Удаляет кэш исходного файла."""
+        cache_path = self.cache_path(source)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    def _source_key(self, source, with_digest=True):
+        stat = os.stat(source)
+        key = {
+            'source': os.path.abspath(source),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+        if with_digest:
+            key['sha1'] = file_digest(source)
+        return key
+
+    def _load_meta(self, source, cache_path):
+        """Читает метаданные кэша и проверяет, что они соответствуют источнику."""
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, "rb") as f:
+                if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                    raise ValueError("bad header")
+                f.seek(-(_TRAILER.size + len(CACHE_MAGIC)), os.SEEK_END)
+                meta_offset, = _TRAILER.unpack(f.read(_TRAILER.size))
+                if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                    raise ValueError("bad trailer")
+                trailer_start = f.tell() - _TRAILER.size - len(CACHE_MAGIC)
+                f.seek(meta_offset)
+                meta = json.loads(f.read(trailer_start - meta_offset).decode("utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring damaged cache {cache_path}: {str(e)}")
+            self._remove(cache_path)
+            return None
+
+        key = self._source_key(source, with_digest=False)
+        if meta.get('version') != CACHE_VERSION or meta['key']['source'] != key['source']:
+            logger.info(f"Cache for {source} has another version, rebuilding")
+            self._remove(cache_path)
+            return None
+        if meta['key']['size'] == key['size'] and meta['key']['mtime_ns'] == key['mtime_ns']:
+            logger.debug(f"Using cache {cache_path} for {source}")
+            return meta
+        # Время изменения отличается: сверяем содержимое по хэшу
+        if meta['key']['size'] == key['size'] and meta['key']['sha1'] == file_digest(source):
+            logger.debug(f"Source {source} was touched but not changed, cache is still valid")
+            meta['key']['mtime_ns'] = key['mtime_ns']
+            self._rewrite_meta(cache_path, meta_offset, meta)
+            return meta
+        logger.info(f"Source {source} changed, cache is stale")
+        self._remove(cache_path)
+        return None
+
+    def _build(self, source, cache_path):
+        """Разбирает исходную книгу один раз и записывает значения листов по колонкам."""
+        logger.info(f"Building cache for {source}")
+        key = self._source_key(source)
+        sheets = []
+        # Уникальное имя: параллельные построения кэша одного источника не мешают друг другу
+        fd, temp_path = tempfile.mkstemp(suffix=".part", dir=self.cache_dir)
+        try:
+            wb = openpyxl.load_workbook(source, read_only=True)
+        except Exception:
+            os.close(fd)
+            self._remove(temp_path)
+            raise
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(CACHE_MAGIC)
+                for ws in wb.worksheets:
+                    # Скрытые листы не участвуют ни в анализе, ни в разбиении
+                    if ws.sheet_state != 'visible':
+                        continue
+                    columns = []
+                    row_count = 0
+                    for row in ws.iter_rows(values_only=True):
+                        for idx in range(len(columns), len(row)):
+                            columns.append([None] * row_count)
+                        for idx, column in enumerate(columns):
+                            column.append(row[idx] if idx < len(row) else None)
+                        row_count += 1
+                    blocks = []
+                    for column in columns:
+                        data, tagged = encode_column(column)
+                        blocks.append([f.tell(), len(data), tagged])
+                        f.write(data)
+                    sheets.append({'name': ws.title, 'rows': row_count, 'columns': blocks})
+                meta = {'version': CACHE_VERSION, 'key': key, 'sheets': sheets}
+                self._write_meta(f, f.tell(), meta)
+            os.replace(temp_path, cache_path)
+        except Exception:
+            self._remove(temp_path)
+            raise
+        finally:
+            wb.close()
+        self.builds += 1
+        return meta
+
+    def _write_meta(self, f, meta_offset, meta):
+        f.seek(meta_offset)
+        f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        f.write(_TRAILER.pack(meta_offset))
+        f.write(CACHE_MAGIC)
+        f.truncate()
+
+    def _rewrite_meta(self, cache_path, meta_offset, meta):
+        try:
+            with open(cache_path, "r+b") as f:
+                self._write_meta(f, meta_offset, meta)
+        except OSError as e:
+            logger.warning(f"Failed to update cache metadata {cache_path}: {str(e)}")
+
+    def _remove(self, path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to remove cache file {path}: {str(e)}")
+
+@contextmanager
+def open_source(file_path, cache=None):
+    """
+    Открывает исходную книгу для чтения значений: из кэша или движком чтения
+    (см. readers), если он задан, иначе через openpyxl в режиме read_only.
+    Файлы CSV без заданного движка читаются движком 'lean'.
+    """
+    wb = None
+    try:
+        if cache is None:
+            from excel_utils.readers import source_reader
+            cache = source_reader('openpyxl', file_path)
+        wb = cache.open(file_path) if cache is not None else openpyxl.load_workbook(file_path, read_only=True)
+        yield wb
+    finally:
+        if wb:
+            try:
+                wb.close()
+            except Exception as e:
+                logger.error(f"Error closing workbook: {str(e)}")
+
+def iter_sheet_values(ws, min_row=1, max_row=None, columns=None):
+    """
+    Строки листа кортежами значений. Для листа из кэша загружаются
+    только колонки columns (номера с 0), остальные возвращаются как None.
+    """
+    if isinstance(ws, CachedSheet):
+        return ws.iter_rows(min_row=min_row, max_row=max_row, columns=columns)
+    return ws.iter_rows(min_row=min_row, max_row=max_row, values_only=True)
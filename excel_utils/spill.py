@@ -0,0 +1,268 @@
+"""
+Разбиение с ограничением памяти: строки сбрасываются во временные файлы.
+
+Первый проход распределяет строки значений исходной книги по выходам
+и накапливает их в буферах. Когда оценка размера буферов достигает
+бюджета памяти, все буферы записываются в очередной файл серии (run) -
+pickle-пакеты строк с индексом смещений по выходам и листам - и
+очищаются. Второй проход строит выходы по одному, читая строки выхода
+из файлов серий по смещениям, поэтому в памяти одновременно находятся
+только буферы в пределах бюджета, один пакет строк и одна выходная книга.
+
+Пишутся только значения ячеек: выходы .xlsx - как в режиме values_only,
+форматы csv, parquet и feather - как в tabular_output.
+"""
+import os
+import sys
+import shutil
+import pickle
+import logging
+import tempfile
+from itertools import islice
+import openpyxl
+from excel_utils.source import values_workbook
+from excel_utils.source_cache import iter_sheet_values
+from excel_utils.output_sheets import ValuesSheet
+from excel_utils.tabular_output import column_names, open_writer, tabular_target, output_extension, _fit
+from excel_utils.partitioning import RowRouter, SplitCancelled, _tracked_rows, _prepare_target_path, _save_output
+from excel_utils.instrumentation import stage, count, record_output
+
+logger = logging.getLogger('excel_splitter')
+
+# Каталог временных файлов серий (None - системный каталог временных файлов)
+SPILL_DIR = None
+
+def _row_size(values):
+    """Оценка памяти, занимаемой строкой значений, в байтах."""
+    return sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values if value is not None)
+
+class SpillStore:
+    """
+    Буферы строк по ключам с выгрузкой во временные файлы серий.
+
+    Ключ - (индекс выхода, имя листа) или (None, имя листа) для листов,
+    копируемых во все выходы целиком. memory_budget - бюджет буферов в МБ.
+    """
+
+    def __init__(self, memory_budget, directory=None):
+        self.budget = int(memory_budget * 1024 * 1024)
+        self.parent_dir = directory if directory is not None else SPILL_DIR
+        self.directory = None
+        self.buffers = {}
+        self.buffered = 0
+        # Ключ -> список (номер серии, смещение, длина) выгруженных пакетов
+        self.segments = {}
+        self.runs = []
+
+    def add(self, keys, values):
+        """Добавляет строку значений в буферы ключей keys."""
+        for key in keys:
+            rows = self.buffers.get(key)
+            if rows is None:
+                rows = self.buffers[key] = []
+            rows.append(values)
+        # Строка хранится один раз, в буферах - только ссылки на нее
+        self.buffered += _row_size(values) + 8 * len(keys)
+        if self.buffered >= self.budget:
+            self.spill()
+
+    def spill(self):
+        """Записывает все буферы в новый файл серии и очищает их."""
+        if not self.buffers:
+            return
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="excel_split_spill_", dir=self.parent_dir)
+        run_idx = len(self.runs)
+        path = os.path.join(self.directory, f"run_{run_idx}.bin")
+        rows = 0
+        with stage('spill'):
+            with open(path, 'wb') as f:
+                for key, buffer in self.buffers.items():
+                    data = pickle.dumps(buffer, pickle.HIGHEST_PROTOCOL)
+                    self.segments.setdefault(key, []).append((run_idx, f.tell(), len(data)))
+                    f.write(data)
+                    rows += len(buffer)
+        self.runs.append(path)
+        count('spill_runs')
+        count('rows_spilled', rows)
+        count('spill_bytes', os.path.getsize(path))
+        logger.debug(f"Spilled {rows} rows ({self.buffered} bytes buffered) to {path}")
+        self.buffers = {}
+        self.buffered = 0
+
+    def has_rows(self, key):
+        return key in self.segments or key in self.buffers
+
+    def rows(self, key):
+        """Строки ключа по порядку: выгруженные пакеты, затем буфер."""
+        for run_idx, offset, length in self.segments.get(key, ()):
+            with open(self.runs[run_idx], 'rb') as f:
+                f.seek(offset)
+                batch = pickle.loads(f.read(length))
+            yield from batch
+        yield from self.buffers.get(key, ())
+
+    def close(self):
+        """Удаляет временные файлы серий."""
+        self.buffers = {}
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+def _write_values_output(store, output_idx, layout, target):
+    """
+    Строит и сохраняет книгу выхода output_idx из строк хранилища.
+    Возвращает (путь или None, число строк данных).
+    """
+    wb_new = openpyxl.Workbook(write_only=True)
+    has_data = False
+    output_rows = 0
+    cells_copied = 0
+    for sheet_name, ws_source, header_row_idx, leading in layout:
+        sheet = ValuesSheet(wb_new, ws_source, sheet_name)
+        if leading is None:
+            sheet.copy_value_rows(store.rows((None, sheet_name)))
+            cells_copied += sheet.cells_copied
+            continue
+        technical_rows, header_values = leading[:-1], leading[-1] if leading else ()
+        sheet.write_value_header(technical_rows, header_values)
+        for values in store.rows((output_idx, sheet_name)):
+            sheet.append_values(values)
+        cells_copied += sheet.cells_copied
+        if sheet.next_row > header_row_idx + 1:
+            has_data = True
+            output_rows += sheet.next_row - header_row_idx - 1
+            with stage('table_boundaries'):
+                sheet.add_table(header_row_idx)
+        else:
+            sheet.discard()
+    count('cells_copied', cells_copied)
+    if not has_data:
+        return None, 0
+    _save_output(wb_new, target)
+    record_output(target, rows=output_rows, cells=cells_copied)
+    return target, output_rows
+
+def _write_tabular_output(store, output_idx, layout, target, output_format):
+    """
+    Записывает файлы формата output_format выхода output_idx (по файлу на лист).
+    Возвращает (путь первого файла или None, число строк данных).
+    """
+    created = []
+    output_rows = 0
+    for sheet_name, _, _, leading in layout:
+        key = (output_idx, sheet_name)
+        if not store.has_rows(key):
+            continue
+        columns = column_names(leading[-1] if leading else ())
+        width = len(columns)
+        path = tabular_target(target, output_format, sheet_name if len(layout) > 1 else None)
+        temp_path = f"{path}.part"
+        writer = open_writer(temp_path, columns, output_format)
+        try:
+            try:
+                for values in store.rows(key):
+                    writer.write(_fit(values, width))
+                    output_rows += 1
+            finally:
+                writer.close()
+            logger.info(f"Saving filtered file: {path}")
+            with stage('save'):
+                os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        created.append(path)
+        record_output(created[0], bytes_written=os.path.getsize(path))
+    if not created:
+        return None, 0
+    record_output(created[0], rows=output_rows)
+    return created[0], output_rows
+
+def partition_spilled(source, file_list, valid_sheets, memory_budget, output_format='xlsx', progress=None,
+                      cancel=None):
+    """
+    Создает выходные файлы с ограничением памяти memory_budget (МБ): строки
+    распределяются за один проход по значениям исходной книги и при достижении
+    бюджета выгружаются во временные файлы серий (SpillStore), затем выходы
+    строятся по одному из этих файлов. output_format - 'xlsx' (только значения,
+    как partition_values) или 'csv', 'parquet', 'feather' (как partition_tabular).
+    События progress и проверка cancel - как в partition_workbook.
+    Возвращает пути созданных файлов в порядке file_list (None, если данных нет).
+    """
+    output_extension(output_format)
+    if not memory_budget or memory_budget <= 0:
+        raise ValueError(f"Memory budget must be positive, got {memory_budget}")
+    filters_list = [filters for filters, _ in file_list]
+    if output_format == 'xlsx':
+        targets = [_prepare_target_path(target) for _, target in file_list]
+    else:
+        targets = [tabular_target(target, output_format) for _, target in file_list]
+    store = SpillStore(memory_budget)
+    try:
+        with values_workbook(source) as wb_source:
+            sheet_names = [name for name in wb_source.sheetnames if wb_source[name].sheet_state == 'visible']
+            if output_format != 'xlsx':
+                # Листы без заголовков в табличные форматы не записываются
+                sheet_names = [name for name in sheet_names if name in valid_sheets]
+            if progress is not None:
+                total_rows = sum(
+                    max((wb_source[name].max_row or 0) - valid_sheets[name][1], 0)
+                    for name in sheet_names if name in valid_sheets
+                )
+                progress({'type': 'start', 'rows': total_rows, 'files': len(file_list)})
+
+            # Листы выходов: (имя, лист источника, индекс строки заголовков, строки до данных)
+            layout = []
+            for sheet_name in sheet_names:
+                ws_source = wb_source[sheet_name]
+                rows = iter_sheet_values(ws_source)
+                if sheet_name not in valid_sheets:
+                    logger.debug(f"Copying entire sheet {sheet_name} without filtering")
+                    keys = ((None, sheet_name),)
+                    for values in rows:
+                        store.add(keys, values)
+                    layout.append((sheet_name, ws_source, None, None))
+                    continue
+
+                headers, header_row_idx = valid_sheets[sheet_name]
+                layout.append((sheet_name, ws_source, header_row_idx, list(islice(rows, header_row_idx))))
+                if progress is not None or cancel is not None:
+                    rows = _tracked_rows(rows, progress, cancel)
+                router = RowRouter(headers, filters_list)
+                scanned = 0
+                matched = 0
+                with stage('row_routing'):
+                    for values in rows:
+                        scanned += 1
+                        routed = router.route(values)
+                        if routed:
+                            matched += 1
+                            store.add([(output_idx, sheet_name) for output_idx in routed], values)
+                count('rows_scanned', scanned)
+                count('rows_matched', matched)
+                logger.debug(f"Routed {scanned} rows of sheet {sheet_name}, {len(store.runs)} spill runs so far")
+
+            results = []
+            for output_idx, target in enumerate(targets):
+                if cancel is not None and cancel.is_set():
+                    logger.info(f"Split cancelled after {output_idx} of {len(targets)} files")
+                    raise SplitCancelled([created for created in results if created is not None])
+                if progress is not None:
+                    progress({'type': 'saving', 'index': output_idx + 1, 'files': len(targets), 'path': target})
+                if output_format == 'xlsx':
+                    created, output_rows = _write_values_output(store, output_idx, layout, target)
+                else:
+                    created, output_rows = _write_tabular_output(store, output_idx, layout, target, output_format)
+                if created is None:
+                    logger.warning(f"No data matched the filters {filters_list[output_idx]}, file not created")
+                results.append(created)
+                if progress is not None:
+                    progress({
+                        'type': 'file', 'index': output_idx + 1, 'files': len(targets), 'path': created,
+                        'rows': output_rows,
+                    })
+            return results
+    finally:
+        store.close()
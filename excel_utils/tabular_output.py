@@ -0,0 +1,303 @@
+"""
+Запись выходных файлов в табличных форматах: CSV, Parquet и Feather.
+
+Строки отбираются так же, как при записи .xlsx (те же заголовки, фильтры
+и имена файлов), но в файл попадают только строка заголовков и подходящие
+строки данных листа: технические строки над заголовками, стили и листы без
+заголовков не записываются. CSV пишется построчно, Parquet и Feather -
+пакетами колонок по OUTPUT_BATCH_ROWS строк и требуют pyarrow.
+
+Файлы CSV пишутся за один проход, все сразу, если выходов не больше
+MAX_OPEN_WRITERS. Parquet и Feather держат в памяти пакет строк на каждый
+открытый файл, поэтому их, как и CSV с большим числом выходов, разбиение
+ведет через SpillStore (см. spill) с бюджетом TABULAR_MEMORY_BUDGET_MB:
+файлы пишутся по одному.
+
+Число колонок задается строкой заголовков (без пустых ячеек в конце).
+Если в книге несколько листов с заголовками, каждый лист записывается
+в отдельный файл с именем листа в суффиксе.
+"""
+import os
+import csv
+import logging
+from itertools import islice
+from excel_utils.source import values_workbook
+from excel_utils.source_cache import iter_sheet_values
+from excel_utils.formatting import sanitize_filename
+from excel_utils.instrumentation import stage, count, record_output
+
+logger = logging.getLogger('excel_splitter')
+
+# Разделитель и кодировка файлов CSV
+CSV_DELIMITER = ','
+CSV_ENCODING = 'utf-8'
+# Количество строк в пакете колонок при записи Parquet и Feather
+OUTPUT_BATCH_ROWS = 65536
+# Наибольшее число файлов CSV, открытых одновременно при записи за один проход
+MAX_OPEN_WRITERS = 64
+# Бюджет памяти буферов строк (МБ), когда выходы пишутся по одному через SpillStore
+TABULAR_MEMORY_BUDGET_MB = 64
+
+# Форматы выходных файлов и их расширения
+OUTPUT_FORMATS = {
+    'xlsx': '.xlsx',
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather',
+}
+
+def output_extension(output_format):
+    """Расширение файлов формата output_format."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return OUTPUT_FORMATS[output_format]
+
+def _pyarrow():
+    """Модуль pyarrow; форматы Parquet и Feather без него недоступны."""
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ValueError("Parquet and Feather outputs require pyarrow (pip install pyarrow)")
+
+def column_names(header_values):
+    """Уникальные имена колонок по строке заголовков; пустые заголовки получают имя ColumnN."""
+    values = list(header_values)
+    while values and values[-1] is None:
+        values.pop()
+    names = []
+    used = set()
+    for idx, value in enumerate(values, 1):
+        name = str(value).strip() if value is not None else ""
+        name = name or f"Column{idx}"
+        unique = name
+        suffix = 2
+        while unique.lower() in used:
+            unique = f"{name}_{suffix}"
+            suffix += 1
+        used.add(unique.lower())
+        names.append(unique)
+    return names
+
+class CsvWriter:
+    """Построчная запись CSV; первая строка - имена колонок."""
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='', encoding=CSV_ENCODING)
+        self.writer = csv.writer(self.file, delimiter=CSV_DELIMITER)
+        self.writer.writerow(columns)
+
+    def write(self, values):
+        self.writer.writerow(values)
+
+    def close(self):
+        self.file.close()
+
+class ArrowWriter:
+    """
+    Запись Parquet или Feather (формат Arrow IPC) пакетами колонок.
+    Типы колонок определяются по первому пакету: числа записываются как float64
+    (Excel хранит все числа в double, а openpyxl возвращает целые значения как int),
+    колонки со значениями разных типов и пустые колонки - строками.
+    """
+
+    def __init__(self, path, columns, output_format, batch_rows=None):
+        self.pa = _pyarrow()
+        self.path = path
+        self.columns = columns
+        self.output_format = output_format
+        self.batch_rows = batch_rows or OUTPUT_BATCH_ROWS
+        self.rows = []
+        self.schema = None
+        self.writer = None
+
+    def write(self, values):
+        self.rows.append(values)
+        if len(self.rows) >= self.batch_rows:
+            self._flush()
+
+    def _array(self, name, values, field_type=None):
+        pa = self.pa
+        if field_type is None:
+            try:
+                array = pa.array(values)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                return pa.array([_as_text(value) for value in values], type=pa.string())
+            if pa.types.is_null(array.type):
+                return array.cast(pa.string())
+            if pa.types.is_integer(array.type):
+                return array.cast(pa.float64())
+            return array
+        try:
+            return pa.array(values, type=field_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if pa.types.is_string(field_type):
+                return pa.array([_as_text(value) for value in values], type=field_type)
+            raise ValueError(
+                f"Column '{name}' has values of another type than {field_type} in its first "
+                f"{self.batch_rows} rows; use the csv format for this data"
+            )
+
+    def _flush(self):
+        if not self.rows:
+            return
+        pa = self.pa
+        columns = list(zip(*self.rows))
+        self.rows = []
+        if self.schema is None:
+            arrays = [self._array(name, values) for name, values in zip(self.columns, columns)]
+            self.schema = pa.schema([pa.field(name, array.type) for name, array in zip(self.columns, arrays)])
+            self.writer = self._open()
+        else:
+            arrays = [
+                self._array(field.name, values, field.type) for field, values in zip(self.schema, columns)
+            ]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def _open(self):
+        if self.output_format == 'parquet':
+            import pyarrow.parquet
+            return pyarrow.parquet.ParquetWriter(self.path, self.schema)
+        return self.pa.ipc.new_file(self.path, self.schema)
+
+    def close(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+
+def _as_text(value):
+    return None if value is None else str(value)
+
+def open_writer(path, columns, output_format):
+    """Открывает запись файла формата output_format с колонками columns."""
+    if output_format == 'csv':
+        return CsvWriter(path, columns)
+    if output_format in ('parquet', 'feather'):
+        return ArrowWriter(path, columns, output_format)
+    raise ValueError(f"Unsupported tabular output format: {output_format}")
+
+def tabular_target(target, output_format, sheet_name=None):
+    """Путь файла формата output_format; sheet_name добавляется в имя для книг из нескольких листов."""
+    stem = os.path.splitext(target)[0]
+    if sheet_name is not None:
+        stem = f"{stem}_{sanitize_filename(sheet_name)}"
+    return stem + output_extension(output_format)
+
+def _fit(values, width):
+    """Дополняет или обрезает строку значений до width колонок."""
+    if len(values) == width:
+        return values
+    if len(values) > width:
+        return values[:width]
+    return tuple(values) + (None,) * (width - len(values))
+
+def partition_tabular(source, file_list, valid_sheets, output_format, progress=None, cancel=None):
+    """
+    Создает файлы формата output_format ('csv', 'parquet' или 'feather') за один
+    проход по значениям исходной книги. Файлы пишутся во временные пути и
+    переименовываются после прохода (Parquet, Feather и CSV с числом выходов
+    больше MAX_OPEN_WRITERS - по одному через partition_spilled). События
+    progress и проверка cancel - как в partition_workbook, при отмене уже
+    переименованные файлы остаются.
+    Возвращает для каждой пары file_list путь созданного файла (первого
+    из файлов листов) или None, если данных нет.
+    """
+    from excel_utils.partitioning import RowRouter, SplitCancelled, _tracked_rows
+    output_extension(output_format)
+    if output_format in ('parquet', 'feather') or len(file_list) > MAX_OPEN_WRITERS:
+        from excel_utils.spill import partition_spilled
+        if output_format != 'csv':
+            _pyarrow()
+        logger.debug(f"Writing {len(file_list)} {output_format} files one at a time through the spill store")
+        return partition_spilled(
+            source, file_list, valid_sheets, TABULAR_MEMORY_BUDGET_MB, output_format, progress, cancel
+        )
+    filters_list = [filters for filters, _ in file_list]
+    # Файлы каждого выхода: пары (временный путь, итоговый путь)
+    written = [[] for _ in file_list]
+    output_rows = [0] * len(file_list)
+    try:
+        with values_workbook(source) as wb_source:
+            sheet_names = [
+                name for name in wb_source.sheetnames
+                if name in valid_sheets and wb_source[name].sheet_state == 'visible'
+            ]
+            if progress is not None:
+                total_rows = sum(
+                    max((wb_source[name].max_row or 0) - valid_sheets[name][1], 0) for name in sheet_names
+                )
+                progress({'type': 'start', 'rows': total_rows, 'files': len(file_list)})
+            for sheet_name in sheet_names:
+                headers, header_row_idx = valid_sheets[sheet_name]
+                rows = iter_sheet_values(wb_source[sheet_name])
+                leading = list(islice(rows, header_row_idx))
+                columns = column_names(leading[-1] if leading else ())
+                width = len(columns)
+                suffix = sheet_name if len(sheet_names) > 1 else None
+                if progress is not None or cancel is not None:
+                    rows = _tracked_rows(rows, progress, cancel)
+                router = RowRouter(headers, filters_list)
+                writers = {}
+                scanned = 0
+                matched = 0
+                try:
+                    with stage('row_routing'):
+                        for values in rows:
+                            scanned += 1
+                            routed = router.route(values)
+                            if not routed:
+                                continue
+                            matched += 1
+                            values = _fit(values, width)
+                            for output_idx in routed:
+                                writer = writers.get(output_idx)
+                                if writer is None:
+                                    # Файл листа создается при первой подходящей строке
+                                    # Временный путь уникален и для повторяющихся целевых путей
+                                    target = tabular_target(file_list[output_idx][1], output_format, suffix)
+                                    temp_path = f"{target}.{output_idx}.part"
+                                    written[output_idx].append((temp_path, target))
+                                    writer = writers[output_idx] = open_writer(temp_path, columns, output_format)
+                                writer.write(values)
+                                output_rows[output_idx] += 1
+                finally:
+                    for writer in writers.values():
+                        writer.close()
+                count('rows_scanned', scanned)
+                count('rows_matched', matched)
+                count('cells_copied', matched * width)
+                logger.debug(f"Routed {scanned} rows of sheet {sheet_name} to {len(writers)} {output_format} files")
+
+        results = []
+        for output_idx, files in enumerate(written):
+            if cancel is not None and cancel.is_set():
+                logger.info(f"Split cancelled after {output_idx} of {len(written)} files")
+                raise SplitCancelled([created for created in results if created is not None])
+            if not files:
+                logger.warning(f"No data matched the filters {filters_list[output_idx]}, file not created")
+                results.append(None)
+                if progress is not None:
+                    progress({'type': 'file', 'index': output_idx + 1, 'files': len(written), 'path': None, 'rows': 0})
+                continue
+            target = files[0][1]
+            if progress is not None:
+                progress({'type': 'saving', 'index': output_idx + 1, 'files': len(written), 'path': target})
+            with stage('save'):
+                for temp_path, path in files:
+                    logger.info(f"Saving filtered file: {path}")
+                    os.replace(temp_path, path)
+                    record_output(target, bytes_written=os.path.getsize(path))
+            record_output(target, rows=output_rows[output_idx])
+            results.append(target)
+            if progress is not None:
+                progress({
+                    'type': 'file', 'index': output_idx + 1, 'files': len(written), 'path': target,
+                    'rows': output_rows[output_idx],
+                })
+        return results
+    finally:
+        # Временные файлы прерванного разбиения удаляются
+        for files in written:
+            for temp_path, _ in files:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
@@ -3,11 +3,13 @@ import re
 import logging
 import openpyxl
 from copy import copy
-from contextlib import contextmanager
 from openpyxl.worksheet.table import Table, TableStyleInfo
-from excel_utils.common import validate_row, copy_cell_style
+from excel_utils.common import compile_filters, copy_cell_style, StyleCache
 from excel_utils.formatting import sanitize_filename
 from excel_utils.analysis import get_all_sheets_headers
+from excel_utils.source import full_workbook, source_path
+from excel_utils.passthrough import passthrough_sheets, save_workbook
+from excel_utils.instrumentation import stage, count, record_output
 
 logger = logging.getLogger('excel_splitter')
 
@@ -40,23 +42,7 @@ def is_openpyxl_new_version():
     except (ImportError, ValueError):
         return False
 
-@contextmanager
-def safe_workbook(file_path, read_only=False):
-    """Контекстный менеджер для безопасной работы с файлами Excel."""
-    wb = None
-    try:
-        logger.debug(f"Opening workbook: {file_path}")
-        wb = openpyxl.load_workbook(file_path, read_only=read_only)
-        yield wb
-    finally:
-        if wb:
-            try:
-                wb.close()
-                logger.debug(f"Workbook closed: {file_path}")
-            except Exception as e:
-                logger.error(f"Error closing workbook: {str(e)}")
-
-def copy_technical_rows(ws_source, ws_new, header_row_idx):
+def copy_technical_rows(ws_source, ws_new, header_row_idx, style_cache=None):
     """Копирует технические строки выше таблицы (строки выше заголовков)."""
     for row_idx in range(1, header_row_idx):
         for col_idx in range(1, ws_source.max_column + 1):
@@ -64,35 +50,34 @@ def copy_technical_rows(ws_source, ws_new, header_row_idx):
                 source_cell = ws_source.cell(row=row_idx, column=col_idx)
                 if source_cell.value is not None or source_cell.has_style:
                     target_cell = ws_new.cell(row=row_idx, column=col_idx, value=source_cell.value)
-                    copy_cell_style(source_cell, target_cell)
+                    copy_cell_style(source_cell, target_cell, style_cache)
             except Exception as e:
                 logger.debug(f"Error copying cell at row {row_idx}, col {col_idx}: {str(e)}")
 
-def copy_headers(ws_source, ws_new, header_row_idx):
+def copy_headers(ws_source, ws_new, header_row_idx, style_cache=None):
     """Копирует строку заголовков."""
     for col_idx in range(1, ws_source.max_column + 1):
         try:
             source_cell = ws_source.cell(row=header_row_idx, column=col_idx)
             if source_cell.value is not None or source_cell.has_style:
                 target_cell = ws_new.cell(row=header_row_idx, column=col_idx, value=source_cell.value)
-                copy_cell_style(source_cell, target_cell)
+                copy_cell_style(source_cell, target_cell, style_cache)
         except Exception as e:
             logger.debug(f"Error copying header at col {col_idx}: {str(e)}")
 
-def filter_data_rows(ws_source, ws_new, header_row_idx, filters, headers, sheet_name, valid_sheets):
+def filter_data_rows(ws_source, ws_new, header_row_idx, filters, headers, sheet_name, valid_sheets, style_cache=None):
     """Фильтрует и копирует данные в соответствии с фильтрами."""
     new_row_idx = header_row_idx + 1
     filtered_count = 0
+    cells_copied = 0
     has_data = False
+    # Фильтры компилируются один раз на лист
+    matcher = compile_filters(headers, filters)
     
     for row_idx in range(header_row_idx + 1, ws_source.max_row + 1):
         try:
             row = ws_source[row_idx]
-            # Добавлена проверка на пустой фильтр
-            if not filters:
-                should_include = True
-            else:
-                should_include = validate_row([cell.value for cell in row], headers, header_row_idx, filters)
+            should_include = matcher.matches([cell.value for cell in row])
             
             if should_include:
                 filtered_count += 1
@@ -102,7 +87,8 @@ def filter_data_rows(ws_source, ws_new, header_row_idx, filters, headers, sheet_
                         source_cell = ws_source.cell(row=row_idx, column=col_idx)
                         if source_cell.value is not None or source_cell.has_style:
                             target_cell = ws_new.cell(row=new_row_idx, column=col_idx, value=source_cell.value)
-                            copy_cell_style(source_cell, target_cell)
+                            copy_cell_style(source_cell, target_cell, style_cache)
+                            cells_copied += 1
                     except Exception as e:
                         logger.debug(f"Error copying data cell at row {row_idx}, col {col_idx}: {str(e)}")
                 new_row_idx += 1
@@ -110,6 +96,9 @@ def filter_data_rows(ws_source, ws_new, header_row_idx, filters, headers, sheet_
             logger.debug(f"Error processing row {row_idx}: {str(e)}")
     
     logger.debug(f"Filtered {filtered_count} rows out of {ws_source.max_row - header_row_idx} possible")
+    count('rows_scanned', max(ws_source.max_row - header_row_idx, 0))
+    count('rows_matched', filtered_count)
+    count('cells_copied', cells_copied)
     return has_data, new_row_idx
 
 def determine_table_boundaries(ws_source, ws_new, header_row_idx, new_row_idx):
@@ -135,12 +124,19 @@ def determine_table_boundaries(ws_source, ws_new, header_row_idx, new_row_idx):
     
     return last_col_letter, data_start_row, data_end_row
 
-def apply_table_formatting(ws_new, header_row_idx, last_col_letter, data_start_row, data_end_row):
-    """Применяет форматирование таблицы к отфильтрованным данным."""
+def apply_table_formatting(ws_new, header_row_idx, last_col_letter, data_start_row, data_end_row, column_names=None):
+    """
+    Применяет форматирование таблицы к отфильтрованным данным.
+    column_names задаются для листов write_only, где заголовки нельзя прочитать из листа.
+    """
     table_range = f"A{header_row_idx}:{last_col_letter}{data_end_row}"
     # Создаем таблицу с безопасным именем
     safe_table_name = clean_table_name(ws_new.title)
     table = Table(displayName=safe_table_name, ref=table_range)
+    if column_names is not None:
+        table._initialise_columns()
+        for table_column, name in zip(table.tableColumns, column_names):
+            table_column.name = name
     
     # Создаем стиль таблицы с только поддерживаемыми параметрами
     try:
@@ -167,34 +163,56 @@ def apply_table_formatting(ws_new, header_row_idx, last_col_letter, data_start_r
     
     ws_new.add_table(table)
 
-def copy_worksheet_structure(ws_source, ws_new):
-    """Копирует структурные элементы листа (ширина столбцов, высота строк, объединенные ячейки)."""
-    # Копирование ширины столбцов
+def worksheet_structure(ws_source):
+    """
+    Структурные элементы листа: ширина столбцов, высота строк и диапазоны
+    объединенных ячеек в виде, пригодном для копирования в несколько листов.
+    """
+    column_widths = []
     if hasattr(ws_source, 'column_dimensions'):
-        for col_letter, dim in ws_source.column_dimensions.items():
-            try:
-                ws_new.column_dimensions[col_letter].width = dim.width
-            except Exception as e:
-                logger.debug(f"Error copying column width for {col_letter}: {str(e)}")
+        column_widths = [(col_letter, dim.width) for col_letter, dim in ws_source.column_dimensions.items()]
+    row_heights = []
+    if hasattr(ws_source, 'row_dimensions'):
+        row_heights = [(row_idx, dim.height) for row_idx, dim in ws_source.row_dimensions.items()]
+    merged_ranges = []
+    if hasattr(ws_source, 'merged_cells'):
+        merged_ranges = [str(merged_cell) for merged_cell in ws_source.merged_cells.ranges]
+    return column_widths, row_heights, merged_ranges
+
+def copy_worksheet_structure(ws_source, ws_new, structure=None):
+    """
+    Копирует структурные элементы листа (ширина столбцов, высота строк, объединенные ячейки).
+    structure - заранее вычисленный результат worksheet_structure(ws_source).
+    """
+    column_widths, row_heights, merged_ranges = structure if structure is not None else worksheet_structure(ws_source)
+    # Копирование ширины столбцов
+    for col_letter, width in column_widths:
+        try:
+            ws_new.column_dimensions[col_letter].width = width
+        except Exception as e:
+            logger.debug(f"Error copying column width for {col_letter}: {str(e)}")
     
     # Копирование высоты строк
-    if hasattr(ws_source, 'row_dimensions'):
-        for row_idx, dim in ws_source.row_dimensions.items():
-            try:
-                ws_new.row_dimensions[row_idx].height = dim.height
-            except Exception as e:
-                logger.debug(f"Error copying row height for {row_idx}: {str(e)}")
+    for row_idx, height in row_heights:
+        try:
+            ws_new.row_dimensions[row_idx].height = height
+        except Exception as e:
+            logger.debug(f"Error copying row height for {row_idx}: {str(e)}")
     
     # Копирование объединенных ячеек
-    if hasattr(ws_source, 'merged_cells'):
-        for merged_cell in ws_source.merged_cells.ranges:
-            try:
-                ws_new.merge_cells(str(merged_cell))
-            except Exception as e:
-                logger.debug(f"Error copying merged cells: {str(e)}")
+    for merged_range in merged_ranges:
+        try:
+            if hasattr(ws_new, 'merge_cells'):
+                ws_new.merge_cells(merged_range)
+            else:
+                # Листы write_only хранят только диапазоны
+                ws_new.merged_cells.add(merged_range)
+        except Exception as e:
+            logger.debug(f"Error copying merged cells: {str(e)}")
 
-def copy_conditional_formatting(ws_source, ws_new):
-    """Копирует условное форматирование с исходного листа на новый."""
+def conditional_formatting_rules(ws_source):
+    """Пары (диапазон, правило) условного форматирования листа."""
+    rules = []
     if hasattr(ws_source, 'conditional_formatting'):
         for cf in ws_source.conditional_formatting:
             try:
@@ -205,87 +223,108 @@ def copy_conditional_formatting(ws_source, ws_new):
                 # Определяем, какой тип правил используем
                 if hasattr(cf, 'cfRule') and hasattr(cf, 'cfRules'):
                     # Новые версии openpyxl
-                    for rule in cf.cfRules:
-                        try:
-                            ws_new.conditional_formatting.add(range_value, rule)
-                        except Exception as e:
-                            logger.debug(f"Error adding rule in new format: {str(e)}")
+                    rules.extend((range_value, rule) for rule in cf.cfRules)
                 elif hasattr(cf, 'rules'):
                     # Средние версии
-                    for rule in cf.rules:
-                        try:
-                            ws_new.conditional_formatting.add(range_value, rule)
-                        except Exception as e:
-                            logger.debug(f"Error adding rule in medium format: {str(e)}")
+                    rules.extend((range_value, rule) for rule in cf.rules)
                 else:
                     # Старые версии
-                    try:
-                        ws_new.conditional_formatting.add(range_value, cf)
-                    except Exception as e:
-                        logger.debug(f"Error adding rule in old format: {str(e)}")
+                    rules.append((range_value, cf))
             except Exception as e:
                 logger.debug(f"Error copying conditional formatting: {str(e)}")
+    return rules
+
+def copy_conditional_formatting(ws_source, ws_new, rules=None):
+    """
+    Копирует условное форматирование с исходного листа на новый.
+    rules - заранее вычисленный результат conditional_formatting_rules(ws_source).
+    """
+    for range_value, rule in rules if rules is not None else conditional_formatting_rules(ws_source):
+        try:
+            ws_new.conditional_formatting.add(range_value, rule)
+        except Exception as e:
+            logger.debug(f"Error adding conditional formatting rule: {str(e)}")
 
-def create_filtered_file(source, target, valid_sheets, filters):
-    """Создаёт файл с фильтрацией по комбинации условий."""
+def create_filtered_file(source, target, valid_sheets, filters, write_only=False, engine='openpyxl',
+                         values_only=False, output_format='xlsx', memory_budget=None):
+    """
+    Создаёт файл с фильтрацией по комбинации условий.
+    source - путь к исходному файлу или сессия SourceWorkbook.
+    При write_only файл пишется потоково через движок разбиения,
+    при engine='xml' - движком уровня XML без объектной модели openpyxl,
+    при values_only - только значения ячеек, без стилей и форматирования,
+    при output_format 'csv', 'parquet' или 'feather' - файл этого формата,
+    при memory_budget (МБ) строки сверх бюджета памяти выгружаются во временные файлы.
+    """
+    if write_only or values_only or engine != 'openpyxl' or output_format != 'xlsx' or memory_budget:
+        from excel_utils.partitioning import create_filtered_files
+        return create_filtered_files(
+            source, [(filters, target)], valid_sheets, write_only, engine, values_only=values_only,
+            output_format=output_format, memory_budget=memory_budget
+        )[0]
     logger.info(f"Creating filtered file: {target} with filters {filters}")
     # Добавлена проверка на пустой фильтр
     if not filters:
         logger.info("Empty filters, copying all data")
+    from excel_utils.skeleton import workbook_skeleton
     try:
         # Всегда сохраняем как .xlsx
         if target.lower().endswith('.xlsm'):
             logger.debug("Converting .xlsm to .xlsx format")
             target = target[:-5] + '.xlsx'
-        with safe_workbook(source, read_only=False) as wb_source:
+        with full_workbook(source) as wb_source, \
+                passthrough_sheets(source_path(source), wb_source, valid_sheets) as passthrough:
             wb_new = openpyxl.Workbook()
             wb_new.remove(wb_new.active)
+            if passthrough is not None:
+                passthrough.prepare(wb_new)
+            # Кэш стилей общий для всех листов целевой книги
+            style_cache = StyleCache()
             has_data = False  # Флаг наличия данных
             logger.debug(f"Processing {len(wb_source.sheetnames)} sheets")
-            for sheet_name in wb_source.sheetnames:
-                ws_source = wb_source[sheet_name]
-                # Игнорируем скрытые листы
-                if ws_source.sheet_state != 'visible':
-                    logger.debug(f"Skipping hidden sheet: {sheet_name}")
+            # Шаблоны видимых листов (скрытые листы в заготовку не входят)
+            skeleton = workbook_skeleton(source, wb_source, valid_sheets)
+            for template in skeleton:
+                sheet_name = template.title
+                ws_source = template.ws_source
+                if passthrough is not None and sheet_name in passthrough:
+                    # Лист без заголовков переносится исходной частью XML при сохранении
+                    passthrough.add_sheet(wb_new, sheet_name)
                     continue
                 ws_new = wb_new.create_sheet(title=sheet_name)
                 logger.debug(f"Processing sheet: {sheet_name}")
                 
-                # Копируем структурные элементы листа
-                copy_worksheet_structure(ws_source, ws_new)
-                
-                # Копируем условное форматирование
-                copy_conditional_formatting(ws_source, ws_new)
+                # Копируем структурные элементы листа и условное форматирование
+                template.apply_structure(ws_new)
                 
                 if sheet_name in valid_sheets:
                     headers, header_row_idx = valid_sheets[sheet_name]
                     logger.debug(f"Headers for sheet {sheet_name}: {headers}")
                     logger.debug(f"Header row index: {header_row_idx}")
                     
-                    # 1. Технические строки выше таблицы
-                    copy_technical_rows(ws_source, ws_new, header_row_idx)
-                    
-                    # 2. Заголовки
-                    copy_headers(ws_source, ws_new, header_row_idx)
+                    # 1. Технические строки выше таблицы и заголовки
+                    template.write_leading_rows(ws_new, style_cache)
                     
-                    # 3. Фильтрация данных
+                    # 2. Фильтрация данных
                     sheet_has_data, new_row_idx = filter_data_rows(
                         ws_source, ws_new, header_row_idx, filters, 
-                        headers, sheet_name, valid_sheets
+                        headers, sheet_name, valid_sheets, style_cache
                     )
                     
                     if sheet_has_data:
                         has_data = True
-                        # Определяем границы таблицы
-                        last_col_letter, data_start_row, data_end_row = determine_table_boundaries(
-                            ws_source, ws_new, header_row_idx, new_row_idx
-                        )
-                        
-                        # Применяем форматирование таблицы
-                        apply_table_formatting(
-                            ws_new, header_row_idx, last_col_letter, 
-                            data_start_row, data_end_row
-                        )
+                        record_output(target, rows=new_row_idx - header_row_idx - 1)
+                        with stage('table_boundaries'):
+                            # Определяем границы таблицы
+                            last_col_letter, data_start_row, data_end_row = determine_table_boundaries(
+                                ws_source, ws_new, header_row_idx, new_row_idx
+                            )
+                            
+                            # Применяем форматирование таблицы
+                            apply_table_formatting(
+                                ws_new, header_row_idx, last_col_letter, 
+                                data_start_row, data_end_row
+                            )
                     else:
                         # Удаляем лист без данных
                         wb_new.remove(ws_new)
@@ -299,7 +338,7 @@ def create_filtered_file(source, target, valid_sheets, filters):
                                 source_cell = ws_source.cell(row=row_idx, column=col_idx)
                                 if source_cell.value is not None or source_cell.has_style:
                                     target_cell = ws_new.cell(row=row_idx, column=col_idx, value=source_cell.value)
-                                    copy_cell_style(source_cell, target_cell)
+                                    copy_cell_style(source_cell, target_cell, style_cache)
                             except Exception as e:
                                 logger.debug(f"Error copying cell at row {row_idx}, col {col_idx}: {str(e)}")
             
@@ -314,7 +353,11 @@ def create_filtered_file(source, target, valid_sheets, filters):
             
             # Сохраняем как .xlsx
             logger.info(f"Saving filtered file: {target}")
-            wb_new.save(target)
+            with stage('save'):
+                save_workbook(wb_new, target, passthrough)
+            count('styles_copied', style_cache.misses)
+            count('styles_reused', style_cache.hits)
+            record_output(target, bytes_written=os.path.getsize(target))
             return target
     except Exception as e:
         logger.exception(f"Error during filtering: {str(e)}")
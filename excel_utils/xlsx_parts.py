@@ -0,0 +1,302 @@
+"""
+Низкоуровневая работа с частями пакета .xlsx (zip с XML) без объектной модели openpyxl.
+"""
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import from_excel
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+
+REL_TYPE_WORKSHEET = REL_NS + "/worksheet"
+REL_TYPE_TABLE = REL_NS + "/table"
+REL_TYPE_SHARED_STRINGS = REL_NS + "/sharedStrings"
+REL_TYPE_STYLES = REL_NS + "/styles"
+REL_TYPE_CALC_CHAIN = REL_NS + "/calcChain"
+REL_TYPE_VBA_PROJECT = "http://schemas.microsoft.com/office/2006/relationships/vbaProject"
+WORKBOOK_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"
+VBA_PROJECT_CONTENT_TYPE = "application/vnd.ms-office.vbaProject"
+TABLE_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.table+xml"
+SHARED_STRINGS_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+
+_CELL_REF_RE = re.compile(r"([A-Z]+)(\d+)")
+
+def qname(ns, tag):
+    """Возвращает имя элемента в нотации ElementTree."""
+    return f"{{{ns}}}{tag}"
+
+def column_index_from_letters(letters):
+    """Конвертирует буквы столбца в индекс (A -> 1, AA -> 27)."""
+    idx = 0
+    for char in letters:
+        idx = idx * 26 + (ord(char) - 64)
+    return idx
+
+def split_cell_ref(ref):
+    """Разбирает адрес ячейки 'B12' на (индекс столбца, номер строки)."""
+    match = _CELL_REF_RE.match(ref)
+    if not match:
+        return None, None
+    return column_index_from_letters(match.group(1)), int(match.group(2))
+
+def rels_path_for(part_path):
+    """Возвращает путь к файлу связей части: xl/workbook.xml -> xl/_rels/workbook.xml.rels."""
+    folder, name = posixpath.split(part_path)
+    return posixpath.join(folder, "_rels", name + ".rels")
+
+def resolve_target(source_part, target):
+    """Переводит цель связи в путь внутри архива."""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+def read_relationships(zf, part_path):
+    """Читает связи части: Id -> (Type, Target, TargetMode)."""
+    path = rels_path_for(part_path)
+    if path not in zf.namelist():
+        return {}
+    root = ET.fromstring(zf.read(path))
+    rels = {}
+    for rel in root.findall(qname(PKG_REL_NS, "Relationship")):
+        rels[rel.get("Id")] = (rel.get("Type"), rel.get("Target"), rel.get("TargetMode"))
+    return rels
+
+def read_workbook_sheets(zf):
+    """
+    Возвращает описание листов книги в порядке workbook.xml:
+    список словарей name, state, sheet_id, rel_id, path.
+    """
+    root = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = read_relationships(zf, "xl/workbook.xml")
+    sheets = []
+    sheets_elem = root.find(qname(MAIN_NS, "sheets"))
+    for sheet in sheets_elem.findall(qname(MAIN_NS, "sheet")) if sheets_elem is not None else []:
+        rel_id = sheet.get(qname(REL_NS, "id"))
+        rel_type, target, _ = rels.get(rel_id, (None, None, None))
+        sheets.append({
+            'name': sheet.get("name"),
+            'state': sheet.get("state", "visible"),
+            'sheet_id': sheet.get("sheetId"),
+            'rel_id': rel_id,
+            'path': resolve_target("xl/workbook.xml", target) if target else None,
+            'is_worksheet': rel_type == REL_TYPE_WORKSHEET,
+        })
+    return sheets
+
+def find_part_by_type(zf, rel_type):
+    """Возвращает путь части книги с заданным типом связи или None."""
+    for found_type, target, _ in read_relationships(zf, "xl/workbook.xml").values():
+        if found_type == rel_type:
+            return resolve_target("xl/workbook.xml", target)
+    return None
+
+def _string_item_text(si):
+    """Собирает текст элемента si/is, пропуская фонетические подсказки rPh."""
+    texts = []
+    for child in si:
+        if child.tag == qname(MAIN_NS, "t"):
+            texts.append(child.text or "")
+        elif child.tag == qname(MAIN_NS, "r"):
+            for t in child.iter(qname(MAIN_NS, "t")):
+                texts.append(t.text or "")
+    return "".join(texts)
+
+def read_shared_strings(zf):
+    """Читает таблицу общих строк в список Python-строк."""
+    path = find_part_by_type(zf, REL_TYPE_SHARED_STRINGS)
+    if not path or path not in zf.namelist():
+        return []
+    strings = []
+    with zf.open(path) as stream:
+        for _, elem in ET.iterparse(stream):
+            if elem.tag == qname(MAIN_NS, "si"):
+                strings.append(_string_item_text(elem))
+                elem.clear()
+    return strings
+
+def read_cell_formats(zf):
+    """Возвращает коды форматов чисел стилей cellXfs по порядку (None - формат не найден)."""
+    path = find_part_by_type(zf, REL_TYPE_STYLES)
+    if not path or path not in zf.namelist():
+        return []
+    root = ET.fromstring(zf.read(path))
+    formats = dict(BUILTIN_FORMATS)
+    num_fmts = root.find(qname(MAIN_NS, "numFmts"))
+    if num_fmts is not None:
+        for fmt in num_fmts.findall(qname(MAIN_NS, "numFmt")):
+            formats[int(fmt.get("numFmtId"))] = fmt.get("formatCode")
+    cell_xfs = root.find(qname(MAIN_NS, "cellXfs"))
+    if cell_xfs is None:
+        return []
+    return [formats.get(int(xf.get("numFmtId", 0))) for xf in cell_xfs.findall(qname(MAIN_NS, "xf"))]
+
+def read_date_styles(zf):
+    """Возвращает множество индексов cellXfs, у которых формат числа - дата."""
+    return {idx for idx, fmt in enumerate(read_cell_formats(zf)) if fmt and is_date_format(fmt)}
+
+def read_date1904(zf):
+    """Признак системы дат 1904 (workbookPr date1904) в workbook.xml."""
+    root = ET.fromstring(zf.read("xl/workbook.xml"))
+    properties = root.find(qname(MAIN_NS, "workbookPr"))
+    return properties is not None and properties.get("date1904") in ("1", "true")
+
+def cell_value(cell, shared_strings, date_styles=frozenset()):
+    """Возвращает значение ячейки <c> так же, как его отдает openpyxl."""
+    data_type = cell.get("t", "n")
+    if data_type == "inlineStr":
+        inline = cell.find(qname(MAIN_NS, "is"))
+        return _string_item_text(inline) if inline is not None else None
+    v = cell.find(qname(MAIN_NS, "v"))
+    if v is None or v.text is None:
+        return None
+    raw = v.text
+    if data_type == "s":
+        return shared_strings[int(raw)]
+    if data_type == "b":
+        return raw == "1"
+    if data_type in ("str", "e"):
+        return raw
+    if data_type == "d":
+        return raw
+    try:
+        number = float(raw) if any(ch in raw for ch in ".eE") else int(raw)
+    except ValueError:
+        return raw
+    if date_styles and int(cell.get("s", 0)) in date_styles:
+        try:
+            return from_excel(number)
+        except (ValueError, OverflowError):
+            return number
+    return number
+
+class XmlSerializer:
+    """Сериализует элементы ElementTree с исходными префиксами пространств имен."""
+
+    def __init__(self, namespaces):
+        # namespaces: список пар (префикс, URI) в порядке объявления
+        self.namespaces = []
+        self.prefixes = {XML_NS: "xml"}
+        for prefix, uri in namespaces:
+            self.ensure_namespace(prefix, uri)
+
+    def ensure_namespace(self, prefix, uri):
+        """Добавляет объявление пространства имен, если его нет."""
+        if uri in self.prefixes:
+            return
+        # Один префикс не может указывать на два пространства имен в одном элементе
+        used = {used_prefix for used_prefix, _ in self.namespaces}
+        if prefix in used:
+            prefix = f"ns{len(self.namespaces)}"
+        self.namespaces.append((prefix, uri))
+        self.prefixes[uri] = prefix
+
+    def name(self, tag):
+        """Переводит имя {uri}local в prefix:local."""
+        if tag[0] != "{":
+            return tag
+        uri, local = tag[1:].split("}", 1)
+        prefix = self.prefixes.get(uri)
+        if prefix is None:
+            raise ValueError(f"Namespace {uri} is not declared")
+        return f"{prefix}:{local}" if prefix else local
+
+    def namespace_declarations(self):
+        """Возвращает строку объявлений xmlns для корневого элемента."""
+        parts = []
+        for prefix, uri in self.namespaces:
+            attr = f"xmlns:{prefix}" if prefix else "xmlns"
+            parts.append(f' {attr}={quote_attr(uri)}')
+        return "".join(parts)
+
+    def start_tag(self, elem, declare_namespaces=False):
+        """Возвращает открывающий тег элемента."""
+        attrs = "".join(f" {self.name(key)}={quote_attr(value)}" for key, value in elem.attrib.items())
+        declarations = self.namespace_declarations() if declare_namespaces else ""
+        return f"<{self.name(elem.tag)}{declarations}{attrs}>"
+
+    def serialize(self, elem, declare_namespaces=False):
+        """Сериализует элемент вместе с потомками (без хвостового текста)."""
+        parts = []
+        self._write(elem, parts, declare_namespaces)
+        return "".join(parts)
+
+    def _write(self, elem, parts, declare_namespaces=False):
+        tag = self.name(elem.tag)
+        attrs = "".join(f" {self.name(key)}={quote_attr(value)}" for key, value in elem.attrib.items())
+        declarations = self.namespace_declarations() if declare_namespaces else ""
+        if elem.text is None and len(elem) == 0:
+            parts.append(f"<{tag}{declarations}{attrs}/>")
+            return
+        parts.append(f"<{tag}{declarations}{attrs}>")
+        if elem.text:
+            parts.append(escape(elem.text))
+        for child in elem:
+            self._write(child, parts)
+            if child.tail:
+                parts.append(escape(child.tail))
+        parts.append(f"</{tag}>")
+
+def quote_attr(value):
+    """Экранирует значение атрибута в двойных кавычках."""
+    return '"' + escape(value, {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}) + '"'
+
+def parse_with_namespaces(stream):
+    """Разбирает XML-часть целиком, возвращая (корень, объявления пространств имен корня)."""
+    namespaces = []
+    root = None
+    for event, item in ET.iterparse(stream, events=("start-ns", "start")):
+        if event == "start-ns":
+            namespaces.append(item)
+        elif root is None:
+            root = item
+    # iterparse дочитывает документ до конца, корень содержит полное дерево
+    return root, namespaces
+
+class SharedStringTable:
+    """
+    Таблица общих строк источника: тексты для вычисления фильтров
+    и исходная разметка элементов si для записи в выходные файлы.
+    """
+
+    def __init__(self, zf):
+        self.path = find_part_by_type(zf, REL_TYPE_SHARED_STRINGS)
+        self.texts = []
+        self.items = []
+        self.serializer = XmlSerializer([])
+        self.root = None
+        if not self.path or self.path not in zf.namelist():
+            self.path = None
+            return
+        depth = 0
+        with zf.open(self.path) as stream:
+            for event, item in ET.iterparse(stream, events=("start-ns", "start", "end")):
+                if event == "start-ns":
+                    self.serializer.ensure_namespace(*item)
+                elif event == "start":
+                    depth += 1
+                    if depth == 1:
+                        self.root = item
+                else:
+                    if depth == 2:
+                        self.texts.append(_string_item_text(item))
+                        self.items.append(self.serializer.serialize(item))
+                        self.root.remove(item)
+                    depth -= 1
+
+    def xml(self, indexes, count):
+        """Формирует часть sharedStrings.xml только из строк с исходными индексами indexes."""
+        root = self.root
+        root.set("count", str(count))
+        root.set("uniqueCount", str(len(indexes)))
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            + self.serializer.start_tag(root, declare_namespaces=True)
+            + "".join(self.items[idx] for idx in indexes)
+            + f"</{self.serializer.name(root.tag)}>"
+        )
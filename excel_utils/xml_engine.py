@@ -0,0 +1,745 @@
+"""
+Движок разбиения на уровне XML: строки листов читаются потоково из частей
+xl/worksheets/sheetN.xml и переписываются в новые части без создания объектов
+ячеек openpyxl. styles.xml, тема и прочие части копируются без изменений,
+поэтому индексы стилей в ячейках остаются действительными. Таблица общих строк
+каждого выходного файла содержит только строки, на которые ссылаются его ячейки.
+"""
+import os
+import shutil
+import logging
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from openpyxl.formula.translate import Translator
+from excel_utils.partitioning import RowRouter
+from excel_utils.instrumentation import count, record_output
+from excel_utils.workbook import clean_table_name, get_column_letter
+from excel_utils.xlsx_parts import (
+    MAIN_NS, REL_NS, PKG_REL_NS, CT_NS,
+    REL_TYPE_TABLE, REL_TYPE_CALC_CHAIN, REL_TYPE_VBA_PROJECT,
+    TABLE_CONTENT_TYPE, WORKBOOK_CONTENT_TYPE, VBA_PROJECT_CONTENT_TYPE,
+    qname, split_cell_ref, rels_path_for, resolve_target, read_relationships,
+    read_workbook_sheets, read_date_styles, cell_value,
+    XmlSerializer, SharedStringTable, parse_with_namespaces, quote_attr,
+)
+
+logger = logging.getLogger('excel_splitter')
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+# Объем строк в памяти, после которого они сбрасываются в общий временный файл
+SPOOL_BUFFER_BYTES = 32 * 1024 * 1024
+
+_ROW = qname(MAIN_NS, "row")
+_CELL = qname(MAIN_NS, "c")
+_FORMULA = qname(MAIN_NS, "f")
+_VALUE = qname(MAIN_NS, "v")
+_INLINE = qname(MAIN_NS, "is")
+_SHEET_DATA = qname(MAIN_NS, "sheetData")
+_DIMENSION = qname(MAIN_NS, "dimension")
+_TABLE_PARTS = qname(MAIN_NS, "tableParts")
+_AUTO_FILTER = qname(MAIN_NS, "autoFilter")
+_EXT_LST = qname(MAIN_NS, "extLst")
+
+class RowSpool:
+    """
+    Строки выходных листов всех выходов в одном временном файле.
+    Строки копятся в памяти по ключам и сбрасываются в файл отрезками, когда
+    их общий объем превышает buffer_bytes, поэтому число открытых файлов
+    не зависит от числа выходов.
+    """
+
+    def __init__(self, buffer_bytes=None):
+        self.buffer_bytes = SPOOL_BUFFER_BYTES if buffer_bytes is None else buffer_bytes
+        self.buffers = {}
+        self.segments = {}
+        self.buffered = 0
+        self.file = None
+
+    def write(self, key, data):
+        self.buffers.setdefault(key, []).append(data)
+        self.buffered += len(data)
+        if self.buffered > self.buffer_bytes:
+            self.flush()
+
+    def flush(self):
+        """Сбрасывает буферы в конец временного файла."""
+        if self.file is None:
+            self.file = tempfile.TemporaryFile()
+        self.file.seek(0, os.SEEK_END)
+        for key, chunks in self.buffers.items():
+            data = b"".join(chunks)
+            self.segments.setdefault(key, []).append((self.file.tell(), len(data)))
+            self.file.write(data)
+        self.buffers.clear()
+        self.buffered = 0
+
+    def copy_to(self, key, out):
+        """Записывает строки ключа key в поток out в порядке записи."""
+        for offset, length in self.segments.get(key, ()):
+            self.file.seek(offset)
+            while length:
+                chunk = self.file.read(min(length, 1024 * 1024))
+                out.write(chunk)
+                length -= len(chunk)
+        for chunk in self.buffers.get(key, ()):
+            out.write(chunk)
+
+    def discard(self, key):
+        """Забывает строки ключа key (место в файле освобождается при закрытии)."""
+        chunks = self.buffers.pop(key, ())
+        self.buffered -= sum(len(chunk) for chunk in chunks)
+        self.segments.pop(key, None)
+
+    def close(self):
+        self.buffers.clear()
+        self.segments.clear()
+        self.buffered = 0
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class SheetOutput:
+    """Состояние одного выходного листа при потоковой записи строк."""
+
+    def __init__(self, spool, key, header_row_idx):
+        self.spool = spool
+        self.key = key
+        self.next_row = header_row_idx + 1
+        self.max_col = 0
+        self.last_value_col = 0
+        self.table_id = None
+
+    def write(self, text):
+        self.spool.write(self.key, text.encode("utf-8"))
+
+class SheetLayout:
+    """Общая для всех выходов разметка фильтруемого листа: все, кроме строк данных."""
+
+    def __init__(self, sheet, serializer, root, before_data, after_data, header_row_idx, header_values, header_rows):
+        self.sheet = sheet
+        self.serializer = serializer
+        self.root = root
+        self.before_data = before_data
+        self.after_data = after_data
+        self.header_row_idx = header_row_idx
+        self.header_values = header_values
+        self.header_rows = header_rows
+
+class SharedStringRemap:
+    """
+    Компактная таблица общих строк одного выходного файла.
+    Новые индексы выдаются в порядке первого обращения во время прохода по строкам.
+    """
+
+    def __init__(self, seed=None):
+        self.mapping = dict(seed.mapping) if seed else {}
+        self.order = list(seed.order) if seed else []
+        self.count = seed.count if seed else 0
+
+    def index(self, old_idx):
+        """Возвращает новый индекс строки с исходным индексом old_idx."""
+        new_idx = self.mapping.get(old_idx)
+        if new_idx is None:
+            new_idx = len(self.order)
+            self.mapping[old_idx] = new_idx
+            self.order.append(old_idx)
+        self.count += 1
+        return new_idx
+
+class XmlOutput:
+    """
+    Выходная книга. Во время прохода по листам запоминаются только ее части
+    (parts: лист без изменений или SheetLayout с состоянием строк); архив
+    пишется во временный файл рядом с целевым в _finish, по одному за раз.
+    """
+
+    def __init__(self, filters, target):
+        self.filters = filters
+        self.target = target
+        self.temp_path = target + ".part"
+        self.kept_sheets = []
+        self.parts = []
+        self.table_parts = []
+        self.has_data = False
+        self.strings = SharedStringRemap()
+
+    def discard(self):
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+def _expand_shared_formulae(row, shared_formulae):
+    """
+    Превращает общие формулы строки в обычные. Зависимые ячейки ссылаются
+    на ячейку-образец в другой строке, поэтому формула образца переводится
+    на исходный адрес каждой ячейки, как это делает openpyxl при чтении.
+    shared_formulae - si -> Translator образца, пополняется по ходу чтения листа.
+    """
+    for cell in row.iter(_CELL):
+        formula = cell.find(_FORMULA)
+        if formula is None or formula.get("t") != "shared":
+            continue
+        ref = cell.get("r")
+        idx = formula.get("si")
+        if formula.text:
+            if ref:
+                shared_formulae[idx] = Translator("=" + formula.text, ref)
+        elif idx in shared_formulae and ref:
+            formula.text = shared_formulae[idx].translate_formula(ref)[1:]
+        else:
+            # Образец неизвестен: ячейка сохраняет только значение
+            cell.remove(formula)
+            continue
+        for attr in ("t", "ref", "si"):
+            formula.attrib.pop(attr, None)
+
+def _renumber_row(row, new_row_idx):
+    """Переносит строку на номер new_row_idx вместе с адресами ее ячеек."""
+    row.set("r", str(new_row_idx))
+    for cell in row.iter(_CELL):
+        ref = cell.get("r")
+        if ref:
+            letters = ref.rstrip("0123456789")
+            cell.set("r", f"{letters}{new_row_idx}")
+        formula = cell.find(_FORMULA)
+        if formula is not None and formula.get("t") == "array" and ref:
+            formula.set("ref", cell.get("r"))
+
+def _shared_string_cells(row):
+    """Возвращает пары (элемент v, исходный индекс) для ячеек строки с общими строками."""
+    cells = []
+    for cell in row.iter(_CELL):
+        if cell.get("t") == "s":
+            v = cell.find(_VALUE)
+            if v is not None and v.text:
+                cells.append((v, int(v.text)))
+    return cells
+
+def _remap_shared_strings(cells, remap):
+    """Переписывает индексы общих строк ячеек под таблицу выходного файла."""
+    for v, old_idx in cells:
+        v.text = str(remap.index(old_idx))
+
+def _row_columns(row):
+    """Возвращает (последний столбец, последний столбец со значением) строки."""
+    max_col = 0
+    last_value_col = 0
+    col_idx = 0
+    for cell in row.iter(_CELL):
+        ref = cell.get("r")
+        col_idx = split_cell_ref(ref)[0] if ref else col_idx + 1
+        max_col = max(max_col, col_idx)
+        if cell.find(_VALUE) is not None or cell.find(_INLINE) is not None or cell.find(_FORMULA) is not None:
+            last_value_col = max(last_value_col, col_idx)
+    return max_col, last_value_col
+
+def _row_values(row, needed_cols, shared_strings, date_styles):
+    """Собирает значения ячеек строки по позициям для RowRouter (только нужные колонки)."""
+    if not needed_cols:
+        return []
+    values = [None] * (max(needed_cols) + 1)
+    col_idx = 0
+    for cell in row.iter(_CELL):
+        ref = cell.get("r")
+        col_idx = split_cell_ref(ref)[0] if ref else col_idx + 1
+        position = col_idx - 1
+        if position in needed_cols:
+            values[position] = cell_value(cell, shared_strings, date_styles)
+    return values
+
+def _table_xml(table_id, name, ref, column_names):
+    """Формирует часть таблицы Excel в том же стиле, что apply_table_formatting."""
+    columns = "".join(
+        f'<tableColumn id="{idx}" name={quote_attr(col_name)}/>'
+        for idx, col_name in enumerate(column_names, start=1)
+    )
+    return (
+        XML_DECLARATION
+        + f'<table xmlns="{MAIN_NS}" id="{table_id}" name={quote_attr(name)} '
+        + f'displayName={quote_attr(name)} ref="{ref}">'
+        + f'<autoFilter ref="{ref}"/>'
+        + f'<tableColumns count="{len(column_names)}">{columns}</tableColumns>'
+        + '<tableStyleInfo name="TableStyleLight1" showFirstColumn="0" showLastColumn="0" '
+        + 'showRowStripes="1" showColumnStripes="0"/>'
+        + '</table>'
+    )
+
+def _rels_xml(relationships):
+    """Формирует часть связей из списка (Id, Type, Target, TargetMode)."""
+    items = []
+    for rel_id, rel_type, target, target_mode in relationships:
+        mode = f" TargetMode={quote_attr(target_mode)}" if target_mode else ""
+        items.append(
+            f"<Relationship Id={quote_attr(rel_id)} Type={quote_attr(rel_type)} Target={quote_attr(target)}{mode}/>"
+        )
+    return XML_DECLARATION + f'<Relationships xmlns="{PKG_REL_NS}">' + "".join(items) + "</Relationships>"
+
+class XmlSplitter:
+    """Разбиение одной исходной книги на несколько выходных за один проход по XML листов."""
+
+    def __init__(self, source, file_list, valid_sheets):
+        self.source = source
+        self.file_list = file_list
+        self.valid_sheets = valid_sheets
+        self.zf = zipfile.ZipFile(source)
+        self.names = self.zf.namelist()
+        self.sheets = read_workbook_sheets(self.zf)
+        self.string_table = SharedStringTable(self.zf)
+        self.shared_strings = self.string_table.texts
+        self.date_styles = read_date_styles(self.zf)
+        self.next_table_id = self._max_table_id() + 1
+        self.spool = RowSpool()
+        # Части, которые переписываются или исключаются при копировании
+        self.handled_parts = {"[Content_Types].xml", "xl/workbook.xml", rels_path_for("xl/workbook.xml")}
+        self.dropped_parts = set()
+        if self.string_table.path:
+            self.handled_parts.add(self.string_table.path)
+        # Нефильтруемые листы с переписанными индексами общих строк: путь -> (начало, тело, конец)
+        self.copied_parts = {}
+        for sheet in self.sheets:
+            if sheet['path']:
+                self.handled_parts.add(sheet['path'])
+                self.handled_parts.add(rels_path_for(sheet['path']))
+                if sheet['state'] != 'visible' or sheet['name'] in valid_sheets:
+                    # Таблицы фильтруемых и скрытых листов в выходные файлы не попадают
+                    self.dropped_parts.update(self._table_parts(sheet['path']))
+        for rel_type, target, _ in read_relationships(self.zf, "xl/workbook.xml").values():
+            if rel_type == REL_TYPE_CALC_CHAIN:
+                self.dropped_parts.add(resolve_target("xl/workbook.xml", target))
+            elif rel_type == REL_TYPE_VBA_PROJECT:
+                # Выходные файлы всегда .xlsx: проект VBA и его подпись не переносятся
+                self.dropped_parts.update(self._part_with_related(resolve_target("xl/workbook.xml", target)))
+
+    def _max_table_id(self):
+        max_id = 0
+        for name in self.names:
+            if name.startswith("xl/tables/") and name.endswith(".xml"):
+                try:
+                    max_id = max(max_id, int(ET.fromstring(self.zf.read(name)).get("id", 0)))
+                except (ET.ParseError, ValueError):
+                    continue
+        return max_id
+
+    def _table_parts(self, sheet_path):
+        return {
+            resolve_target(sheet_path, target)
+            for rel_type, target, mode in read_relationships(self.zf, sheet_path).values()
+            if rel_type == REL_TYPE_TABLE and mode != "External"
+        }
+
+    def _part_with_related(self, part_path):
+        """Часть, ее файл связей и связанные с ней внутренние части."""
+        parts = {part_path, rels_path_for(part_path)}
+        for _, target, mode in read_relationships(self.zf, part_path).values():
+            if mode != "External":
+                parts.add(resolve_target(part_path, target))
+        return parts
+
+    def run(self):
+        """Создает выходные файлы. Возвращает пути в порядке file_list (None, если данных нет)."""
+        outputs = []
+        try:
+            for filters, target in self.file_list:
+                if target.lower().endswith('.xlsm'):
+                    target = target[:-5] + '.xlsx'
+                outputs.append(XmlOutput(filters, target))
+            if self.string_table.path:
+                self._prepare_copied_sheets(outputs)
+            for sheet in self.sheets:
+                if sheet['state'] != 'visible' or not sheet['path']:
+                    logger.debug(f"Skipping hidden sheet: {sheet['name']}")
+                    continue
+                if sheet['name'] in self.valid_sheets and sheet['is_worksheet']:
+                    self._split_sheet(sheet, outputs)
+                else:
+                    self._copy_sheet(sheet, outputs)
+            return [self._finish(output) for output in outputs]
+        except Exception:
+            for output in outputs:
+                output.discard()
+            raise
+        finally:
+            for _, body, _ in self.copied_parts.values():
+                body.close()
+            self.spool.close()
+            self.zf.close()
+
+    def _prepare_copied_sheets(self, outputs):
+        """
+        Переписывает индексы общих строк нефильтруемых листов один раз для всех выходов.
+        Эти листы одинаковы во всех выходных файлах, поэтому их строки занимают
+        начало таблицы общих строк каждого файла.
+        """
+        seed = SharedStringRemap()
+        for sheet in self.sheets:
+            if sheet['state'] != 'visible' or not sheet['path']:
+                continue
+            if sheet['name'] in self.valid_sheets and sheet['is_worksheet']:
+                continue
+            self.copied_parts[sheet['path']] = self._remap_sheet_strings(sheet, seed)
+        for output in outputs:
+            output.strings = SharedStringRemap(seed)
+
+    def _remap_sheet_strings(self, sheet, remap):
+        """Потоково переписывает часть листа с новыми индексами общих строк."""
+        body = tempfile.TemporaryFile()
+        serializer = XmlSerializer([])
+        root = None
+        sheet_data = None
+        depth = 0
+        with self.zf.open(sheet['path']) as stream:
+            for event, item in ET.iterparse(stream, events=("start-ns", "start", "end")):
+                if event == "start-ns":
+                    serializer.ensure_namespace(*item)
+                    continue
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = item
+                    elif depth == 2 and item.tag == _SHEET_DATA:
+                        sheet_data = item
+                        body.write(serializer.start_tag(item).encode("utf-8"))
+                    continue
+                if depth == 3 and item.tag == _ROW and sheet_data is not None:
+                    _remap_shared_strings(_shared_string_cells(item), remap)
+                    body.write(serializer.serialize(item).encode("utf-8"))
+                    sheet_data.remove(item)
+                elif depth == 2:
+                    if item is sheet_data:
+                        body.write(f"</{serializer.name(_SHEET_DATA)}>".encode("utf-8"))
+                    else:
+                        body.write(serializer.serialize(item).encode("utf-8"))
+                    root.remove(item)
+                depth -= 1
+        # Объявления пространств имен известны только после полного прохода
+        start = XML_DECLARATION + serializer.start_tag(root, declare_namespaces=True)
+        return start, body, f"</{serializer.name(root.tag)}>"
+
+    def _copy_sheet(self, sheet, outputs):
+        """Отмечает нефильтруемый лист для копирования во все выходы без изменений."""
+        logger.debug(f"Copying entire sheet {sheet['name']} without filtering")
+        for output in outputs:
+            output.parts.append((sheet, None, None))
+            output.kept_sheets.append(sheet)
+
+    def _write_copied_sheet(self, sheet, archive):
+        """Записывает нефильтруемый лист и его связи в архив выходного файла."""
+        copied = self.copied_parts.get(sheet['path'])
+        with archive.open(sheet['path'], "w") as out:
+            if copied is None:
+                with self.zf.open(sheet['path']) as stream:
+                    shutil.copyfileobj(stream, out, 1024 * 1024)
+            else:
+                start, body, end = copied
+                out.write(start.encode("utf-8"))
+                body.seek(0)
+                shutil.copyfileobj(body, out)
+                out.write(end.encode("utf-8"))
+        rels_path = rels_path_for(sheet['path'])
+        if rels_path in self.names:
+            archive.writestr(rels_path, self.zf.read(rels_path))
+
+    def _split_sheet(self, sheet, outputs):
+        """Один потоковый проход по XML листа с записью строк во все подходящие выходы."""
+        headers, header_row_idx = self.valid_sheets[sheet['name']]
+        router = RowRouter(headers, [output.filters for output in outputs])
+        needed_cols = {idx for col_indexes, _ in router.groups for idx in col_indexes}
+        blank_targets = router.route([])
+        states = [
+            SheetOutput(self.spool, (output_idx, sheet['path']), header_row_idx)
+            for output_idx in range(len(outputs))
+        ]
+        serializer = XmlSerializer([])
+        root = None
+        sheet_data = None
+        before_data, after_data = [], []
+        header_values = {}
+        header_rows = []
+        shared_formulae = {}
+        depth = 0
+        last_row_idx = 0
+        last_data_row = header_row_idx
+        scanned = 0
+        matched = 0
+
+        with self.zf.open(sheet['path']) as stream:
+            for event, item in ET.iterparse(stream, events=("start-ns", "start", "end")):
+                if event == "start-ns":
+                    serializer.ensure_namespace(*item)
+                    continue
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = item
+                    elif depth == 2 and item.tag == _SHEET_DATA:
+                        sheet_data = item
+                    continue
+
+                if depth == 3 and item.tag == _ROW and sheet_data is not None:
+                    row_idx = int(item.get("r")) if item.get("r") else last_row_idx + 1
+                    last_row_idx = row_idx
+                    _expand_shared_formulae(item, shared_formulae)
+                    if row_idx <= header_row_idx:
+                        if row_idx == header_row_idx:
+                            col_idx = 0
+                            for cell in item.iter(_CELL):
+                                ref = cell.get("r")
+                                col_idx = split_cell_ref(ref)[0] if ref else col_idx + 1
+                                header_values[col_idx] = cell_value(cell, self.shared_strings, self.date_styles)
+                        max_col, last_value_col = _row_columns(item)
+                        # Строки до заголовка записываются только в выходы, где лист останется
+                        header_rows.append((item, _shared_string_cells(item)))
+                        for state in states:
+                            state.max_col = max(state.max_col, max_col)
+                            if row_idx == header_row_idx:
+                                state.last_value_col = max(state.last_value_col, last_value_col)
+                    else:
+                        scanned += 1
+                        # Пропущенные в XML пустые строки попадают только в выходы без фильтров
+                        gap = row_idx - last_data_row - 1
+                        if gap > 0:
+                            for output_idx in blank_targets:
+                                states[output_idx].next_row += gap
+                        last_data_row = row_idx
+                        values = _row_values(item, needed_cols, self.shared_strings, self.date_styles)
+                        targets = router.route(values)
+                        if targets:
+                            matched += 1
+                            max_col, last_value_col = _row_columns(item)
+                            string_cells = _shared_string_cells(item)
+                            for output_idx in targets:
+                                state = states[output_idx]
+                                _remap_shared_strings(string_cells, outputs[output_idx].strings)
+                                _renumber_row(item, state.next_row)
+                                state.write(serializer.serialize(item))
+                                state.next_row += 1
+                                state.max_col = max(state.max_col, max_col)
+                                state.last_value_col = max(state.last_value_col, last_value_col)
+                    sheet_data.remove(item)
+                elif depth == 2 and item is not sheet_data:
+                    # Элементы листа до и после sheetData (размеры, объединения, форматы).
+                    # Таблицы и автофильтр относятся к исходным строкам: лист получает новую таблицу
+                    if item.tag not in (_TABLE_PARTS, _AUTO_FILTER):
+                        target_list = after_data if sheet_data is not None else before_data
+                        target_list.append((item.tag, serializer.serialize(item)))
+                    root.remove(item)
+                depth -= 1
+
+        logger.debug(f"Scanned {scanned} data rows of sheet {sheet['name']} at XML level")
+        count('rows_scanned', scanned)
+        count('rows_matched', matched)
+        layout = SheetLayout(
+            sheet, serializer, root, before_data, after_data, header_row_idx, header_values, header_rows
+        )
+        for output, state in zip(outputs, states):
+            if state.next_row > header_row_idx + 1:
+                record_output(output.target, rows=state.next_row - header_row_idx - 1)
+                state.table_id = self.next_table_id
+                self.next_table_id += 1
+                output.has_data = True
+                output.kept_sheets.append(sheet)
+                output.parts.append((sheet, layout, state))
+            else:
+                logger.debug(f"Removed sheet {sheet['name']} from {output.target} due to no matching data")
+
+    def _write_split_sheet(self, output, archive, layout, state):
+        """Собирает часть листа выходного файла и создает для нее таблицу."""
+        sheet = layout.sheet
+        serializer = layout.serializer
+        header_row_idx = layout.header_row_idx
+        header_values = layout.header_values
+        last_row = state.next_row - 1
+        last_col = state.last_value_col or state.max_col or 1
+        dimension_col = max(state.max_col, last_col)
+
+        table_id = state.table_id
+        table_path = f"xl/tables/table_split{table_id}.xml"
+        table_ref = f"A{header_row_idx}:{get_column_letter(last_col)}{last_row}"
+        column_names = [
+            str(header_values[idx]) if header_values.get(idx) is not None else f"Column{idx}"
+            for idx in range(1, last_col + 1)
+        ]
+        archive.writestr(
+            table_path, _table_xml(table_id, clean_table_name(sheet['name']), table_ref, column_names)
+        )
+        output.table_parts.append(table_path)
+
+        # Связи листа: исходные без таблиц плюс новая таблица
+        table_rel_id = f"rIdSplitTable{table_id}"
+        relationships = [
+            (rel_id, rel_type, target, mode)
+            for rel_id, (rel_type, target, mode) in read_relationships(self.zf, sheet['path']).items()
+            if rel_type != REL_TYPE_TABLE
+        ]
+        relationships.append((table_rel_id, REL_TYPE_TABLE, "/" + table_path, None))
+        archive.writestr(rels_path_for(sheet['path']), _rels_xml(relationships))
+
+        serializer.ensure_namespace("r", REL_NS)
+        table_parts = (
+            f'<{serializer.name(_TABLE_PARTS)} count="1">'
+            f'<{serializer.name(qname(MAIN_NS, "tablePart"))} {serializer.name(qname(REL_NS, "id"))}="{table_rel_id}"/>'
+            f'</{serializer.name(_TABLE_PARTS)}>'
+        )
+        sheet_data_name = serializer.name(_SHEET_DATA)
+        with archive.open(sheet['path'], "w") as out:
+            out.write(XML_DECLARATION.encode("utf-8"))
+            out.write(serializer.start_tag(layout.root, declare_namespaces=True).encode("utf-8"))
+            for tag, text in layout.before_data:
+                if tag == _DIMENSION:
+                    text = f'<{serializer.name(_DIMENSION)} ref="A1:{get_column_letter(dimension_col)}{last_row}"/>'
+                out.write(text.encode("utf-8"))
+            out.write(f"<{sheet_data_name}>".encode("utf-8"))
+            for row, string_cells in layout.header_rows:
+                _remap_shared_strings(string_cells, output.strings)
+                out.write(serializer.serialize(row).encode("utf-8"))
+            self.spool.copy_to(state.key, out)
+            out.write(f"</{sheet_data_name}>".encode("utf-8"))
+            inserted = False
+            for tag, text in layout.after_data:
+                if tag == _EXT_LST and not inserted:
+                    out.write(table_parts.encode("utf-8"))
+                    inserted = True
+                out.write(text.encode("utf-8"))
+            if not inserted:
+                out.write(table_parts.encode("utf-8"))
+            out.write(f"</{serializer.name(layout.root.tag)}>".encode("utf-8"))
+        self.spool.discard(state.key)
+
+    def _finish(self, output):
+        """Записывает архив выходного файла и переносит его на место целевого."""
+        if not output.has_data:
+            logger.warning(f"No data matched the filters {output.filters}, file not created")
+            output.discard()
+            return None
+        kept_paths = {sheet['path'] for sheet in output.kept_sheets}
+        dropped = set(self.dropped_parts)
+        for sheet in self.sheets:
+            if sheet['path'] and sheet['path'] not in kept_paths:
+                dropped.add(sheet['path'])
+
+        try:
+            with zipfile.ZipFile(output.temp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                for sheet, layout, state in output.parts:
+                    if layout is None:
+                        self._write_copied_sheet(sheet, archive)
+                    else:
+                        self._write_split_sheet(output, archive, layout, state)
+                for name in self.names:
+                    if name in self.handled_parts or name in dropped or name.endswith("/"):
+                        continue
+                    with self.zf.open(name) as stream, archive.open(name, "w") as out:
+                        shutil.copyfileobj(stream, out, 1024 * 1024)
+                if self.string_table.path:
+                    archive.writestr(
+                        self.string_table.path,
+                        self.string_table.xml(output.strings.order, output.strings.count)
+                    )
+                    logger.debug(
+                        f"Kept {len(output.strings.order)} of {len(self.shared_strings)} shared strings "
+                        f"in {output.target}"
+                    )
+                archive.writestr("xl/workbook.xml", self._workbook_xml(output))
+                archive.writestr(rels_path_for("xl/workbook.xml"), self._workbook_rels_xml(output, dropped))
+                archive.writestr("[Content_Types].xml", self._content_types_xml(output, dropped))
+        except Exception:
+            output.discard()
+            raise
+        output.parts = []
+
+        if os.path.exists(output.target):
+            logger.info(f"Removing existing target file: {output.target}")
+            os.remove(output.target)
+        os.replace(output.temp_path, output.target)
+        logger.info(f"Saved filtered file: {output.target}")
+        record_output(output.target, bytes_written=os.path.getsize(output.target))
+        return output.target
+
+    def _read_part_tree(self, name):
+        with self.zf.open(name) as stream:
+            return parse_with_namespaces(stream)
+
+    def _workbook_xml(self, output):
+        """Оставляет в workbook.xml только листы выходного файла."""
+        root, namespaces = self._read_part_tree("xl/workbook.xml")
+        kept_ids = [sheet['rel_id'] for sheet in output.kept_sheets]
+        sheets_elem = root.find(qname(MAIN_NS, "sheets"))
+        old_positions = {}
+        for position, sheet in enumerate(list(sheets_elem)):
+            rel_id = sheet.get(qname(REL_NS, "id"))
+            old_positions[position] = rel_id
+            if rel_id not in kept_ids:
+                sheets_elem.remove(sheet)
+        new_positions = {rel_id: idx for idx, rel_id in enumerate(
+            sheet.get(qname(REL_NS, "id")) for sheet in sheets_elem
+        )}
+
+        # Локальные имена ссылаются на лист по позиции
+        defined_names = root.find(qname(MAIN_NS, "definedNames"))
+        if defined_names is not None:
+            for name in list(defined_names):
+                local_id = name.get("localSheetId")
+                if local_id is None:
+                    continue
+                rel_id = old_positions.get(int(local_id))
+                if rel_id in new_positions:
+                    name.set("localSheetId", str(new_positions[rel_id]))
+                else:
+                    defined_names.remove(name)
+            if len(defined_names) == 0:
+                root.remove(defined_names)
+
+        book_views = root.find(qname(MAIN_NS, "bookViews"))
+        if book_views is not None:
+            for view in book_views:
+                for attr in ("activeTab", "firstSheet"):
+                    if view.get(attr) is not None and int(view.get(attr)) >= len(new_positions):
+                        view.set(attr, "0")
+        return XML_DECLARATION + XmlSerializer(namespaces).serialize(root, declare_namespaces=True)
+
+    def _workbook_rels_xml(self, output, dropped):
+        """Удаляет связи на исключенные листы и цепочку вычислений."""
+        relationships = []
+        for rel_id, (rel_type, target, mode) in read_relationships(self.zf, "xl/workbook.xml").items():
+            if mode != "External" and resolve_target("xl/workbook.xml", target) in dropped:
+                continue
+            relationships.append((rel_id, rel_type, target, mode))
+        return _rels_xml(relationships)
+
+    def _content_types_xml(self, output, dropped):
+        """Обновляет [Content_Types].xml под состав частей выходного файла."""
+        root, namespaces = self._read_part_tree("[Content_Types].xml")
+        for default in list(root.findall(qname(CT_NS, "Default"))):
+            if default.get("ContentType") == VBA_PROJECT_CONTENT_TYPE:
+                root.remove(default)
+        for override in list(root.findall(qname(CT_NS, "Override"))):
+            part_name = override.get("PartName", "").lstrip("/")
+            if part_name in dropped:
+                root.remove(override)
+            elif part_name == "xl/workbook.xml":
+                # Книга с макросами (.xlsm) сохраняется как обычная .xlsx
+                override.set("ContentType", WORKBOOK_CONTENT_TYPE)
+        for table_path in output.table_parts:
+            ET.SubElement(root, qname(CT_NS, "Override"), {
+                "PartName": "/" + table_path,
+                "ContentType": TABLE_CONTENT_TYPE,
+            })
+        return XML_DECLARATION + XmlSerializer(namespaces).serialize(root, declare_namespaces=True)
+
+def create_filtered_files_xml(source, file_list, valid_sheets):
+    """
+    Создаёт файлы из file_list движком уровня XML за один проход по листам.
+
+    Значения для фильтров берутся из XML ячеек (с разрешением общих строк и дат),
+    подходящие элементы <row> перенумеровываются и записываются в новые части листов.
+
+    Возвращает:
+    list: Пути созданных файлов в порядке file_list (None, если данных нет)
+    """
+    logger.info(f"Partitioning {source} into {len(file_list)} files at XML level")
+    if not file_list:
+        return []
+    try:
+        return XmlSplitter(source, file_list, valid_sheets).run()
+    except Exception as e:
+        logger.exception(f"Error during XML partitioning: {str(e)}")
+        raise ValueError(f"Error during XML partitioning: {str(e)}")
@@ -2,12 +2,15 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import logging
 import os
-from core.processing import process_file
-from excel_utils.analysis import get_all_sheets_headers
-from excel_utils.filtering import select_categories_sequentially
+import queue
+from gui.worker import BackgroundWorker, ProgressTracker, analysis_task, split_task
+from config import WRITE_ONLY_OUTPUT
 
 logger = logging.getLogger('excel_splitter')
 
+# Интервал опроса очереди событий фоновой задачи, мс
+POLL_INTERVAL_MS = 100
+
 class ExcelSplitterGUI:
     def __init__(self, root):
         self.root = root
@@ -21,6 +24,14 @@ class ExcelSplitterGUI:
         self.selected_columns = []
         self.filters = {}
         self.valid_sheets = {}
+        self.create_hierarchy = tk.BooleanVar(value=False)
+        self.status = tk.StringVar(value="Ready")
+        
+        # Фоновая задача и очередь ее событий
+        self.events = queue.Queue()
+        self.worker = None
+        self.tracker = None
+        self.on_done = None
         
         self.create_widgets()
         
@@ -54,6 +65,18 @@ class ExcelSplitterGUI:
         # Список колонок
         columns_label = ttk.Label(columns_frame, text="Available columns:")
         columns_label.pack(side=tk.LEFT, padx=5)
+        self.columns_list = tk.Listbox(columns_frame, selectmode=tk.MULTIPLE, height=5, exportselection=False)
+        self.columns_list.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Checkbutton(
+            columns_frame, text="Folder hierarchy", variable=self.create_hierarchy
+        ).pack(side=tk.LEFT, padx=5)
+        
+        # Ход выполнения
+        progress_frame = ttk.Frame(main_frame)
+        progress_frame.pack(fill=tk.X, pady=5)
+        self.progress = ttk.Progressbar(progress_frame, mode='determinate', maximum=100)
+        self.progress.pack(fill=tk.X)
+        ttk.Label(progress_frame, textvariable=self.status).pack(anchor=tk.W)
         
         # Фрейм для логов
         log_frame = ttk.LabelFrame(main_frame, text="Processing Log", padding="10")
@@ -72,7 +95,10 @@ class ExcelSplitterGUI:
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X, pady=5)
         
-        ttk.Button(button_frame, text="Run", command=self.run_processing).pack(side=tk.RIGHT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_processing, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        self.run_button = ttk.Button(button_frame, text="Run", command=self.run_processing)
+        self.run_button.pack(side=tk.RIGHT, padx=5)
         ttk.Button(button_frame, text="Clear", command=self.clear_log).pack(side=tk.RIGHT, padx=5)
     
     def log(self, message):
@@ -95,42 +121,86 @@ class ExcelSplitterGUI:
         if folder_path:
             self.destination_folder.set(folder_path)
     
+    def start_task(self, task, on_done):
+        """Запускает задачу в фоновом потоке; on_done получает ее результат в потоке Tk"""
+        if self.worker is not None and self.worker.is_alive():
+            messagebox.showwarning("Busy", "Another operation is still running")
+            return
+        self.tracker = ProgressTracker()
+        self.on_done = on_done
+        self.progress['value'] = 0
+        self.run_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.worker = BackgroundWorker(task, self.events)
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_events)
+    
+    def poll_events(self):
+        """Забирает события фоновой задачи из очереди и обновляет интерфейс"""
+        finished = False
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            kind = event['type']
+            if kind == 'log':
+                self.log(event['message'])
+            elif kind in ('pass_started', 'rows', 'output_finished'):
+                self.tracker.update(event)
+                self.progress['value'] = self.tracker.fraction() * 100
+                self.status.set(self.tracker.describe())
+            elif kind == 'done':
+                finished = True
+                self.on_done(event['result'])
+            elif kind == 'cancelled':
+                finished = True
+                self.status.set(f"Cancelled, {len(event['created'])} files created")
+                self.log(f"Operation cancelled, {len(event['created'])} files were created")
+            elif kind == 'error':
+                finished = True
+                self.status.set("Failed")
+                self.log(f"Error: {event['message']}")
+                messagebox.showerror("Error", event['message'])
+        if finished:
+            self.run_button.config(state=tk.NORMAL)
+            self.cancel_button.config(state=tk.DISABLED)
+        else:
+            self.root.after(POLL_INTERVAL_MS, self.poll_events)
+    
+    def cancel_processing(self):
+        """Запрашивает остановку фоновой задачи между выходными файлами"""
+        if self.worker is not None and self.worker.is_alive():
+            self.worker.cancel()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status.set("Cancelling...")
+    
     def analyze_file(self):
-        """Анализирует файл и показывает доступные колонки"""
+        """Анализирует файл в фоне и показывает доступные колонки"""
         source = self.source_file.get()
         if not source or not os.path.exists(source):
             messagebox.showerror("Error", "Please select a valid source file")
             return
-            
-        try:
-            # Анализируем файл
-            self.log(f"Analyzing file: {source}")
-            sheet_headers = get_all_sheets_headers(source)
-            self.valid_sheets = {sheet: data for sheet, data in sheet_headers.items() if data[0] is not None}
-            
-            if not self.valid_sheets:
-                self.log("Error: No headers found in any sheet")
-                return
-                
-            # Поиск пересечения заголовков
-            all_headers = [set(headers) for headers, _ in self.valid_sheets.values()]
-            common_headers = set.intersection(*all_headers) if all_headers else set()
-            
-            if not common_headers:
-                self.log("Warning: No common headers found between sheets")
-                return
-                
-            # Отображаем колонки
-            self.columns = list(common_headers)
-            self.log(f"Found {len(self.columns)} common columns:")
-            for i, col in enumerate(self.columns, 1):
-                self.log(f"  {i}. {col}")
-                
-        except Exception as e:
-            self.log(f"Error analyzing file: {str(e)}")
+        self.status.set("Analyzing...")
+        self.start_task(analysis_task(source), self.show_columns)
+    
+    def show_columns(self, result):
+        """Отображает общие колонки после анализа"""
+        self.valid_sheets = result['valid_sheets']
+        self.columns = result['columns']
+        self.columns_list.delete(0, tk.END)
+        if not self.columns:
+            self.log("Warning: No common headers found between sheets")
+            self.status.set("No common columns")
+            return
+        self.log(f"Found {len(self.columns)} common columns:")
+        for i, col in enumerate(self.columns, 1):
+            self.log(f"  {i}. {col}")
+            self.columns_list.insert(tk.END, col)
+        self.status.set("Select columns and press Run")
     
     def run_processing(self):
-        """Запускает обработку файла"""
+        """Запускает разбиение в фоновом потоке"""
         source = self.source_file.get()
         destination = self.destination_folder.get()
         
@@ -142,39 +212,25 @@ class ExcelSplitterGUI:
             messagebox.showerror("Error", "Please select a valid destination folder")
             return
         
-        try:
-            # Имитируем процесс обработки
-            self.log("Starting file processing...")
-            
-            # Временно сохраняем стандартный вывод
-            import sys
-            original_stdout = sys.stdout
-            from io import StringIO
-            sys.stdout = StringIO()
-            
-            # Запускаем основную функцию обработки
-            success = process_file()
-            
-            # Получаем вывод
-            output = sys.stdout.getvalue()
-            sys.stdout = original_stdout
-            
-            # Отображаем результаты
-            self.log("Processing completed!")
-            if success:
-                self.log("Operation was successful")
-            else:
-                self.log("Operation failed")
-            
-            # Показываем сообщение об успехе
-            if success:
-                messagebox.showinfo("Success", "File processing completed successfully!")
-            else:
-                messagebox.showerror("Error", "File processing failed")
-                
-        except Exception as e:
-            self.log(f"Unexpected error: {str(e)}")
-            messagebox.showerror("Error", f"Unexpected error: {str(e)}")
+        self.selected_columns = [self.columns[i] for i in self.columns_list.curselection()]
+        if not self.valid_sheets or not self.selected_columns:
+            messagebox.showerror("Error", "Please analyze the file and select filter columns")
+            return
+        
+        self.log("Starting file processing...")
+        self.status.set("Processing...")
+        task = split_task(
+            source, destination, self.selected_columns,
+            self.create_hierarchy.get(), WRITE_ONLY_OUTPUT
+        )
+        self.start_task(task, self.show_results)
+    
+    def show_results(self, created):
+        """Сообщает о завершении разбиения"""
+        self.progress['value'] = 100
+        self.status.set(f"Done, {len(created)} files created")
+        self.log(f"Processing completed! Created {len(created)} files")
+        messagebox.showinfo("Success", "File processing completed successfully!")
     
     def clear_log(self):
         """Очищает лог-окно"""
@@ -0,0 +1,151 @@
+"""
+Фоновое выполнение анализа и разбиения для графического интерфейса.
+
+Задача выполняется в отдельном потоке, а все сообщения для интерфейса
+(ход работы, записи журнала, результат или ошибка) передаются словарями
+через потокобезопасную очередь. Интерфейс забирает их из очереди в главном
+потоке Tk, поэтому виджеты никогда не изменяются из рабочего потока.
+"""
+import time
+import queue
+import logging
+import threading
+from excel_utils.source import SourceWorkbook
+from excel_utils.partitioning import SplitCancelled
+from core.api import split_workbook
+
+logger = logging.getLogger('excel_splitter')
+
+class _QueueLogHandler(logging.Handler):
+    """Передает записи журнала в очередь событий интерфейса."""
+
+    def __init__(self, events):
+        super().__init__(logging.INFO)
+        self.events = events
+        self.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
+
+    def emit(self, record):
+        self.events.put({'type': 'log', 'message': self.format(record)})
+
+class BackgroundWorker(threading.Thread):
+    """
+    Выполняет task(emit, cancel) в фоновом потоке.
+
+    emit(event) кладет событие в очередь events, cancel - threading.Event
+    запроса отмены. По завершении в очередь попадает одно из событий:
+    'done' (result - результат задачи), 'cancelled' (created - уже созданные
+    файлы) или 'error' (message - текст ошибки).
+    """
+
+    def __init__(self, task, events=None):
+        super().__init__(daemon=True)
+        self.task = task
+        self.events = events if events is not None else queue.Queue()
+        self.cancel_event = threading.Event()
+
+    def emit(self, event):
+        self.events.put(event)
+
+    def cancel(self):
+        """Запрашивает остановку; задача завершится в ближайшей точке проверки."""
+        self.cancel_event.set()
+
+    def run(self):
+        handler = _QueueLogHandler(self.events)
+        logger.addHandler(handler)
+        try:
+            result = self.task(self.emit, self.cancel_event)
+            self.emit({'type': 'done', 'result': result})
+        except SplitCancelled as e:
+            self.emit({'type': 'cancelled', 'created': e.created})
+        except Exception as e:
+            logger.error(f"Background task failed: {str(e)}")
+            self.emit({'type': 'error', 'message': str(e)})
+        finally:
+            logger.removeHandler(handler)
+
+class ProgressTracker:
+    """
+    Накапливает события хода разбиения и оценивает оставшееся время
+    по средней скорости обработки строк.
+    """
+
+    def __init__(self):
+        self.total_rows = 0
+        self.rows = 0
+        self.total_files = 0
+        self.files = 0
+        self.started = time.monotonic()
+
+    def update(self, event):
+        if event['type'] == 'pass_started':
+            self.total_rows = event['rows']
+            self.total_files = event['files']
+            self.started = time.monotonic()
+        elif event['type'] == 'rows':
+            self.rows += event['rows']
+        elif event['type'] == 'output_finished':
+            self.files = event['index']
+
+    def fraction(self):
+        """Доля выполненной работы: строки - до сохранения, далее - файлы."""
+        if self.total_rows and self.rows < self.total_rows:
+            return 0.9 * self.rows / self.total_rows
+        if self.total_files:
+            return 0.9 + 0.1 * self.files / self.total_files
+        return 0.0
+
+    def eta(self):
+        """Оставшееся время в секундах или None, если оценить еще нельзя."""
+        done = self.fraction()
+        if done <= 0:
+            return None
+        elapsed = time.monotonic() - self.started
+        return elapsed * (1 - done) / done
+
+    def describe(self):
+        parts = [f"Rows {self.rows:,} of {self.total_rows:,}"]
+        if self.total_files:
+            parts.append(f"file {self.files} of {self.total_files}")
+        eta = self.eta()
+        if eta is not None:
+            parts.append(f"ETA {int(eta) // 60}:{int(eta) % 60:02d}")
+        return ", ".join(parts)
+
+def analysis_task(source):
+    """Задача анализа: листы с заголовками и общие колонки всех листов."""
+    def task(emit, cancel):
+        logger.info(f"Analyzing file: {source}")
+        with SourceWorkbook(source) as session:
+            valid_sheets = session.valid_sheets
+        if not valid_sheets:
+            raise ValueError("No headers found in any sheet")
+        all_headers = [set(headers) for headers, _ in valid_sheets.values()]
+        common_headers = set.intersection(*all_headers)
+        # Порядок колонок - как в первом листе
+        first_headers = next(iter(valid_sheets.values()))[0]
+        columns = [header for header in first_headers if header in common_headers]
+        return {'valid_sheets': valid_sheets, 'columns': columns}
+    return task
+
+def split_task(source, destination, columns, create_hierarchy=False, write_only=False):
+    """
+    Задача разбиения по всем категориям выбранных колонок (как выбор "all"
+    в пакетном режиме). События split_workbook передаются в интерфейс.
+    Возвращает пути созданных файлов.
+    """
+    def task(emit, cancel):
+        events = split_workbook(
+            source, destination, columns, folder_hierarchy=create_hierarchy,
+            write_only=write_only, cancel=cancel
+        )
+        for event in events:
+            if event['type'] == 'plan':
+                logger.info(f"Creating {len(event['files'])} files")
+            elif event['type'] == 'cancelled':
+                raise SplitCancelled(event['created'])
+            elif event['type'] == 'done':
+                return event['created']
+            else:
+                emit(event)
+    return task
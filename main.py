@@ -1,10 +1,125 @@
 import sys
 import os
+import argparse
+from config import (
+    DEFAULT_JOBS, WRITE_ONLY_OUTPUT, DEFAULT_ENGINE, SOURCE_CACHE_DIR, INCREMENTAL_SPLIT, REMOVE_STALE_OUTPUTS,
+    DELTA_SPLIT, VALUES_ONLY_OUTPUT, OUTPUT_FORMAT, DEFAULT_READER, MEMORY_BUDGET_MB, RUN_STATS_JSON, PROFILE_OUTPUT
+)
 
-def run_cli():
+def parse_args(argv):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Excel Splitter")
+    parser.add_argument("mode", nargs="?", choices=["cli", "gui", "batch"], help="Режим работы")
+    parser.add_argument("spec", nargs="?", help="Файл спецификации заданий для режима batch (JSON/YAML)")
+    parser.add_argument(
+        "--jobs", type=int, default=DEFAULT_JOBS,
+        help="Количество процессов для параллельного создания файлов"
+    )
+    parser.add_argument(
+        "--write-only", action="store_true", default=WRITE_ONLY_OUTPUT,
+        help="Потоковая запись выходных файлов с постоянным расходом памяти"
+    )
+    parser.add_argument(
+        "--engine", choices=["openpyxl", "xml", "columnar"], default=DEFAULT_ENGINE,
+        help="Движок разбиения: объектная модель openpyxl, потоковая обработка XML "
+             "или выбор строк по колоночной таблице кодов категорий"
+    )
+    parser.add_argument(
+        "--cache-dir", default=SOURCE_CACHE_DIR,
+        help="Каталог кэша разобранных исходных книг для повторных запусков"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true", default=INCREMENTAL_SPLIT,
+        help="Перезаписывать только файлы, содержимое которых изменилось с прошлого запуска"
+    )
+    parser.add_argument(
+        "--remove-stale", action="store_true", default=REMOVE_STALE_OUTPUTS,
+        help="В инкрементальном режиме удалять файлы комбинаций, которые больше не создаются"
+    )
+    parser.add_argument(
+        "--delta", action="store_true", default=DELTA_SPLIT,
+        help="Дописывать в существующие файлы только строки, добавленные в конец источника"
+    )
+    parser.add_argument(
+        "--values-only", action="store_true", default=VALUES_ONLY_OUTPUT,
+        help="Записывать только значения ячеек без стилей, размеров и условного форматирования"
+    )
+    parser.add_argument(
+        "--format", dest="output_format", choices=["xlsx", "csv", "parquet", "feather"], default=OUTPUT_FORMAT,
+        help="Формат выходных файлов; csv пишется построчно, parquet и feather требуют pyarrow"
+    )
+    parser.add_argument(
+        "--reader", choices=["openpyxl", "lean"], default=DEFAULT_READER,
+        help="Движок чтения источника: openpyxl или разбор XML листов напрямую (lean, читает и CSV)"
+    )
+    parser.add_argument(
+        "--memory-budget", type=float, default=MEMORY_BUDGET_MB, metavar="MB",
+        help="Бюджет памяти буферов строк в МБ; строки сверх него выгружаются во временные файлы "
+             "(с --values-only или форматом кроме xlsx)"
+    )
+    parser.add_argument(
+        "--stats-json", default=RUN_STATS_JSON,
+        help="Сохранить время этапов и счетчики запуска в JSON"
+    )
+    parser.add_argument(
+        "--profile", nargs="?", const="excel_split.prof", default=PROFILE_OUTPUT,
+        help="Профилировать запуск через cProfile и сохранить статистику в файл"
+    )
+    parser.add_argument(
+        "--summary", default=None,
+        help="Путь к JSON-сводке пакетного режима"
+    )
+    args = parser.parse_args(argv)
+    if args.mode == "batch" and not args.spec:
+        parser.error("batch mode requires a job spec file")
+    return args
+
+def run_cli(jobs=DEFAULT_JOBS, write_only=WRITE_ONLY_OUTPUT, engine=DEFAULT_ENGINE, cache_dir=SOURCE_CACHE_DIR,
+            incremental=INCREMENTAL_SPLIT, remove_stale=REMOVE_STALE_OUTPUTS, delta=DELTA_SPLIT,
+            values_only=VALUES_ONLY_OUTPUT, output_format=OUTPUT_FORMAT, reader=DEFAULT_READER,
+            memory_budget=MEMORY_BUDGET_MB, stats_json=RUN_STATS_JSON, profile=PROFILE_OUTPUT):
     """Запускает CLI версию приложения"""
     from cli.interface import main as cli_main
-    cli_main()
+    cli_main(
+        jobs=jobs, write_only=write_only, engine=engine, cache_dir=cache_dir,
+        incremental=incremental, remove_stale=remove_stale, delta=delta,
+        values_only=values_only, output_format=output_format, reader=reader, memory_budget=memory_budget,
+        stats_json=stats_json, profile=profile
+    )
+
+def run_batch(spec, jobs=DEFAULT_JOBS, write_only=WRITE_ONLY_OUTPUT, engine=DEFAULT_ENGINE,
+              cache_dir=SOURCE_CACHE_DIR, summary_path=None,
+              incremental=INCREMENTAL_SPLIT, remove_stale=REMOVE_STALE_OUTPUTS, delta=DELTA_SPLIT,
+              values_only=VALUES_ONLY_OUTPUT, output_format=OUTPUT_FORMAT, reader=DEFAULT_READER,
+              memory_budget=MEMORY_BUDGET_MB):
+    """
+    Запускает пакетный режим. jobs ограничивает число одновременно выполняемых заданий,
+    остальные параметры используются по умолчанию для заданий спецификации.
+    Возвращает код завершения: 0, если все задания выполнены успешно.
+    """
+    from core.batch import run_batch as run_batch_spec
+    try:
+        summary = run_batch_spec(
+            spec,
+            parallel=jobs if jobs > 1 else None,
+            summary_path=summary_path,
+            defaults={
+                'engine': engine, 'write_only': write_only, 'cache_dir': cache_dir,
+                'incremental': incremental, 'remove_stale': remove_stale, 'delta': delta,
+                'values_only': values_only, 'output_format': output_format, 'reader': reader,
+                'memory_budget': memory_budget,
+            },
+        )
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot run job spec {spec}: {str(e)}")
+        return 2
+    print(f"Batch finished: {summary['jobs_total'] - summary['jobs_failed']}/{summary['jobs_total']} jobs succeeded, "
+          f"{summary['files_created']} files created in {summary['elapsed']:.1f} s")
+    for job in summary['jobs']:
+        if job['status'] != 'ok':
+            print(f"  Failed: {job['name']}: {job['error']}")
+    print(f"Summary: {summary['summary_path']}")
+    return 1 if summary['jobs_failed'] else 0
 
 def run_gui():
     """Запускает GUI версию приложения"""
@@ -13,10 +128,22 @@ def run_gui():
 
 def main():
     """Точка входа в приложение с выбором режима работы"""
-    if len(sys.argv) > 1 and sys.argv[1] == "cli":
-        run_cli()
-    elif len(sys.argv) > 1 and sys.argv[1] == "gui":
+    args = parse_args(sys.argv[1:])
+    jobs = max(1, args.jobs)
+    if args.mode == "cli":
+        run_cli(
+            jobs, args.write_only, args.engine, args.cache_dir, args.incremental, args.remove_stale, args.delta,
+            args.values_only, args.output_format, args.reader, args.memory_budget, args.stats_json,
+            args.profile
+        )
+    elif args.mode == "gui":
         run_gui()
+    elif args.mode == "batch":
+        sys.exit(run_batch(
+            args.spec, jobs, args.write_only, args.engine, args.cache_dir, args.summary,
+            args.incremental, args.remove_stale, args.delta, args.values_only, args.output_format, args.reader,
+            args.memory_budget
+        ))
     else:
         print("Excel Splitter")
         print("1. Command Line Interface (CLI)")
@@ -26,7 +153,11 @@ def main():
         choice = input("Enter your choice (1/2/3): ").strip()
         
         if choice == "1":
-            run_cli()
+            run_cli(
+                jobs, args.write_only, args.engine, args.cache_dir, args.incremental, args.remove_stale, args.delta,
+                args.values_only, args.output_format, args.reader, args.memory_budget, args.stats_json,
+                args.profile
+            )
         elif choice == "2":
             run_gui()
         elif choice == "3":
@@ -1,6 +1,6 @@
 import unittest
 from excel_utils.analysis import get_all_sheets_headers, analyze_column
-from excel_utils.common import validate_row
+from excel_utils.common import validate_row, compile_filters
 import os
 import tempfile
 
@@ -50,6 +50,21 @@ class TestExcelAnalysis(unittest.TestCase):
         # Проверяем фильтр по нескольким колонкам
         self.assertTrue(validate_row(row, headers, 1, {"Header1": "Data1", "Header2": "ValueA"}))
         self.assertFalse(validate_row(row, headers, 1, {"Header1": "Data1", "Header2": "ValueB"}))
+    
+    def test_compiled_filters(self):
+        """Проверяет совпадение скомпилированных фильтров с validate_row"""
+        headers = ["Header1", "Header2", "Header3"]
+        rows = [
+            ["Data1", "ValueA", "100"],
+            ["Data2", " valuea ", 200],
+            ["Data3", None, "300"],
+            ["Data4"],
+        ]
+        for filters in [{}, {"header2": "ValueA"}, {"Header2": "ValueA", "Header3": "200"}, {"Missing": "x"}]:
+            matcher = compile_filters(headers, filters)
+            expected = [row for row in rows if validate_row(row, headers, 1, filters)]
+            self.assertEqual([row for row in rows if matcher.matches(row)], expected)
+            self.assertEqual(list(matcher.iter_matching(rows, chunk_size=3)), expected)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,77 @@
+import unittest
+import os
+import asyncio
+import tempfile
+import openpyxl
+from core.api import split_workbook, split_workbook_async, CancellationToken
+
+class TestSplitWorkbookApi(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "sales.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Region", "City", "Amount"])
+        for row in [["North", "Oslo", 10], ["North", "Bergen", 20], ["South", "Rome", 30]]:
+            ws.append(row)
+        wb.save(self.test_file)
+        self.destination = os.path.join(self.temp_dir, "out")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def test_events(self):
+        """Проверяет последовательность событий и итог разбиения"""
+        events = list(split_workbook(self.test_file, self.destination, ["Region"], ["each"]))
+        kinds = [event['type'] for event in events]
+        self.assertEqual(kinds[:3], ['analysis', 'plan', 'pass_started'])
+        self.assertEqual(kinds[-1], 'done')
+        self.assertEqual(events[0]['columns'], ["Region", "City", "Amount"])
+        self.assertEqual(events[1]['combinations'], 2)
+
+        finished = [event for event in events if event['type'] == 'output_finished']
+        self.assertEqual([event['filters'] for event in finished], [{"Region": "North"}, {"Region": "South"}])
+        self.assertEqual([event['rows'] for event in finished], [2, 1])
+        self.assertTrue(all(event['duration'] is not None for event in finished))
+        self.assertEqual(kinds.count('output_started'), 2)
+
+        done = events[-1]
+        self.assertEqual(done['created'], [event['created'] for event in finished])
+        self.assertTrue(all(os.path.exists(path) for path in done['created']))
+
+    def test_invalid_columns(self):
+        """Проверяет ошибку для колонки, которой нет в листах"""
+        with self.assertRaises(ValueError):
+            list(split_workbook(self.test_file, self.destination, ["Country"]))
+
+    def test_cancel(self):
+        """Проверяет отмену через токен и через закрытие генератора"""
+        cancel = CancellationToken()
+        events = []
+        for event in split_workbook(self.test_file, self.destination, ["Region"], ["each"], cancel=cancel):
+            events.append(event)
+            if event['type'] == 'output_finished':
+                cancel.cancel()
+        self.assertEqual(events[-1]['type'], 'cancelled')
+        self.assertEqual(len(events[-1]['created']), 1)
+        self.assertEqual(os.listdir(self.destination), [os.path.basename(events[-1]['created'][0])])
+
+        other = os.path.join(self.temp_dir, "other")
+        events = split_workbook(self.test_file, other, ["Region"], ["each"])
+        next(event for event in events if event['type'] == 'plan')
+        events.close()
+        self.assertFalse(os.path.exists(other))
+
+    def test_async(self):
+        """Проверяет асинхронный вариант"""
+        async def collect():
+            return [event async for event in split_workbook_async(self.test_file, self.destination, ["Region"])]
+        events = asyncio.run(collect())
+        self.assertEqual(events[-1]['type'], 'done')
+        self.assertTrue(events[-1]['created'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import json
+import tempfile
+import openpyxl
+from core.batch import run_batch
+from excel_utils.filtering import select_categories_from_spec, get_all_combinations
+from excel_utils.analysis import get_all_sheets_headers
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        # Два исходных файла и спецификация заданий
+        self.temp_dir = tempfile.mkdtemp()
+        self.create_source("sales.xlsx")
+        self.create_source("stock.xlsx")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def create_source(self, name):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Region", "City", "Amount"])
+        for row in [["North", "Oslo", 10], ["North", "Bergen", 20], ["South", "Rome", 30]]:
+            ws.append(row)
+        wb.save(os.path.join(self.temp_dir, name))
+
+    def write_spec(self, spec):
+        path = os.path.join(self.temp_dir, "jobs.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(spec, f)
+        return path
+
+    def test_select_from_spec(self):
+        """Проверяет неинтерактивный выбор категорий по уровням"""
+        source = os.path.join(self.temp_dir, "sales.xlsx")
+        valid_sheets = get_all_sheets_headers(source)
+        columns = ["Region", "City"]
+        # Как и интерактивный выбор, комбинации возвращаются без повторов
+        selected = select_categories_from_spec(source, valid_sheets, columns, ["all"])
+        self.assertEqual(len(selected), 5)
+        self.assertEqual(
+            {tuple(sorted(f.items())) for f in selected},
+            {tuple(sorted(f.items())) for f in get_all_combinations(source, valid_sheets, columns)},
+        )
+        self.assertEqual(
+            select_categories_from_spec(source, valid_sheets, columns, [["north", "West"], "each"]),
+            [{"Region": "North", "City": "Bergen"}, {"Region": "North", "City": "Oslo"}],
+        )
+
+    def test_run_batch(self):
+        """Проверяет выполнение заданий, сводку и изоляцию ошибок"""
+        spec_path = self.write_spec({
+            "parallel": 2,
+            "summary": "summary.json",
+            "jobs": [
+                {
+                    "source": "sales.xlsx",
+                    "destination": "out/sales",
+                    "hierarchy_columns": ["Region", "City"],
+                    "categories": [["North"], "each"],
+                    "folder_hierarchy": True,
+                },
+                {
+                    "source": "stock.xlsx",
+                    "destination": "out/stock",
+                    "hierarchy_columns": ["Region"],
+                    "engine": "xml",
+                },
+                {
+                    "source": "missing.xlsx",
+                    "destination": "out/missing",
+                    "hierarchy_columns": ["Region"],
+                },
+            ],
+        })
+        summary = run_batch(spec_path)
+        with open(os.path.join(self.temp_dir, "summary.json"), encoding="utf-8") as f:
+            written = json.load(f)
+        self.assertEqual(written["jobs_total"], 3)
+        self.assertEqual(written["jobs_failed"], 1)
+        self.assertEqual(summary["files_created"], 4)
+
+        sales, stock, missing = written["jobs"]
+        self.assertEqual(sales["status"], "ok")
+        self.assertEqual(len(sales["outputs"]), 2)
+        for output in sales["outputs"]:
+            self.assertTrue(os.path.exists(output["path"]))
+            self.assertIn(os.path.join("out", "sales", "North"), output["path"])
+        self.assertIn("writing", sales["timings"])
+        self.assertEqual([o["filters"] for o in stock["outputs"]], [{"Region": "North"}, {"Region": "South"}])
+        self.assertEqual(missing["status"], "error")
+        self.assertIn("missing.xlsx", missing["error"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import os
+import tempfile
+import openpyxl
+from benchmarks.generator import generate_workbook
+from benchmarks.suite import compare_results
+from benchmarks.memory import MemorySampler, record_budget, check_budget
+from benchmarks.readers import run_readers
+from excel_utils.analysis import get_all_sheets_headers, analyze_column
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "synthetic.xlsx")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def test_generator_structure(self):
+        """Проверяет, что синтетическая книга соответствует параметрам"""
+        params = generate_workbook(
+            self.path, rows=50, columns=6, sheets=2, hidden_sheets=1, cardinality=[3, 5],
+            technical_rows=3, merged_cells=4, conditional_formats=2
+        )
+        wb = openpyxl.load_workbook(self.path)
+        self.assertEqual(wb.sheetnames, ["Data1", "Data2", "Hidden1"])
+        self.assertEqual(wb["Hidden1"].sheet_state, "hidden")
+        ws = wb["Data1"]
+        self.assertEqual(ws.max_row, 54)
+        self.assertEqual(len(ws.merged_cells.ranges), 4)
+        self.assertEqual(len(ws.conditional_formatting), 2)
+
+        valid_sheets = get_all_sheets_headers(self.path)
+        self.assertEqual(valid_sheets["Data1"][1], 4)
+        self.assertLessEqual(len(analyze_column(self.path, valid_sheets, "Level1")), params['cardinality'][0])
+
+        # Одинаковые параметры дают одинаковые данные
+        other = os.path.join(self.temp_dir, "other.xlsx")
+        generate_workbook(
+            other, rows=50, columns=6, sheets=2, hidden_sheets=1, cardinality=[3, 5],
+            technical_rows=3, merged_cells=4, conditional_formats=2
+        )
+        self.assertEqual(
+            [row for row in openpyxl.load_workbook(other)["Data1"].iter_rows(values_only=True)],
+            [row for row in ws.iter_rows(values_only=True)],
+        )
+
+    def test_compare_results(self):
+        """Проверяет обнаружение регрессий относительно базового прогона"""
+        baseline = {'params': {'rows': 10}, 'engine': 'openpyxl', 'timings': {
+            'analyze_column': {'median': 1.0}, 'end_to_end_split': {'median': 2.0},
+        }}
+        results = {'params': {'rows': 10}, 'engine': 'openpyxl', 'timings': {
+            'analyze_column': {'median': 1.1}, 'end_to_end_split': {'median': 3.0},
+        }}
+        self.assertEqual(compare_results(results, baseline, 0.2), [('end_to_end_split', 2.0, 3.0, 1.5)])
+        self.assertEqual(compare_results(results, baseline, 0.6), [])
+        with self.assertRaises(ValueError):
+            compare_results(dict(results, params={'rows': 20}), baseline)
+
+    def test_memory_budget(self):
+        """Проверяет замер пика памяти и сравнение с бюджетом"""
+        with MemorySampler() as sampler:
+            data = bytearray(4 * 1048576)
+            del data
+        self.assertGreaterEqual(sampler.traced_peak, 4 * 1048576)
+        self.assertEqual(sampler.result(200000)['per_100k_rows'], round(sampler.traced_peak / 2))
+
+        def results(split_peak):
+            return {'params': {'sheets': 1}, 'engine': 'openpyxl', 'runs': [{
+                'rows': 1000,
+                'stages': {'split': {'per_100k_rows': split_peak}},
+                'outputs': {'A': {'per_100k_rows': 50}, 'B': {'per_100k_rows': 70}},
+            }]}
+
+        budget = record_budget(results(100))
+        self.assertEqual(budget['per_100k_rows'], {'1000': {'split': 100, 'output': 70}})
+        self.assertEqual(check_budget(results(105), budget, 0.1), [])
+        self.assertEqual(check_budget(results(120), budget, 0.1), [(1000, 'split', 120, 100)])
+
+    def test_reader_throughput(self):
+        """Проверяет, что замер движков чтения читает одинаковое число строк"""
+        results = run_readers(self.temp_dir, {'rows': 30, 'sheets': 1}, repeat=1)
+        self.assertEqual(set(results['readers']), {'openpyxl', 'lean'})
+        self.assertEqual(results['readers']['openpyxl']['rows'], results['readers']['lean']['rows'])
+        self.assertGreater(results['readers']['lean']['rows_per_second'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
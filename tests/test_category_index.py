@@ -0,0 +1,73 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+import openpyxl
+from excel_utils.category_index import build_category_index
+from excel_utils.filtering import get_all_combinations
+from excel_utils.analysis import get_all_sheets_headers, analyze_column
+
+class TestCategoryIndex(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_index.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "TestSheet"
+        ws.append(["Department", "Subdivision", "Position"])
+        data = [
+            ["Department A", "Subdivision A1", "Position A1"],
+            ["Department A", "Subdivision A1", "Position A2"],
+            ["department a", "Subdivision A2", "Position A3"],
+            ["Department B", "Subdivision B1", None],
+            ["Department B", None, "Position B2"],
+            [None, "Subdivision C1", "Position C1"],
+        ]
+        for row in data:
+            ws.append(row)
+        wb.save(self.test_file)
+
+        sheet_headers = get_all_sheets_headers(self.test_file)
+        self.valid_sheets = {k: v for k, v in sheet_headers.items() if v[0] is not None}
+        self.hierarchy_columns = ["Department", "Subdivision", "Position"]
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def test_categories_match_analyze_column(self):
+        """Проверяет, что списки категорий совпадают с analyze_column"""
+        index = build_category_index(self.test_file, self.valid_sheets, self.hierarchy_columns)
+        cases = [
+            (0, {}),
+            (1, {"Department": "Department A"}),
+            (1, {"Department": "department a"}),
+            (1, {"Department": "Department B"}),
+            (2, {"Department": "Department A", "Subdivision": "Subdivision A1"}),
+            (2, {"Department": "Department B", "Subdivision": "Subdivision B1"}),
+        ]
+        for level, filters in cases:
+            expected = analyze_column(self.test_file, self.valid_sheets, self.hierarchy_columns[level], filters)
+            self.assertEqual(index.categories(level, filters), expected)
+
+    def test_row_counts(self):
+        """Проверяет подсчет строк в узлах индекса"""
+        index = build_category_index(self.test_file, self.valid_sheets, self.hierarchy_columns)
+        self.assertEqual(index.row_count(), 6)
+        self.assertEqual(index.row_count({"Department": "Department A"}), 3)
+        self.assertEqual(index.row_count({"Department": "Department B", "Subdivision": "Subdivision B1"}), 1)
+
+    def test_combinations_without_workbook_io(self):
+        """Проверяет, что комбинации строятся из индекса без повторного чтения книги"""
+        index = build_category_index(self.test_file, self.valid_sheets, self.hierarchy_columns)
+        with mock.patch("excel_utils.category_index.values_workbook", side_effect=AssertionError("workbook reopened")):
+            combinations = get_all_combinations(
+                self.test_file, self.valid_sheets, self.hierarchy_columns, index=index
+            )
+        self.assertIn({"Department": "Department B"}, combinations)
+        self.assertIn({"Department": "Department A", "Subdivision": "Subdivision A1", "Position": "Position A2"}, combinations)
+        self.assertNotIn({"Department": "Department B", "Subdivision": "Subdivision B1", "Position": None}, combinations)
+
+if __name__ == '__main__':
+    unittest.main()
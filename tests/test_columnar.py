@@ -0,0 +1,102 @@
+import unittest
+import os
+import tempfile
+import openpyxl
+from excel_utils.analysis import get_all_sheets_headers
+from excel_utils.category_index import build_category_index
+from excel_utils.columnar import build_columnar_table, ColumnDictionary, EMPTY_CODE, MISSING_CODE
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.source import SourceWorkbook
+
+class TestColumnarTable(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл с двумя листами
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_columnar.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Sales"
+        ws.append(["Region", "City", "Amount"])
+        for row in [
+            ["North", "Oslo", 10], ["south", "Rome", 20], ["North ", "Bergen", 30],
+            [None, "Paris", 40], ["South", "Milan", 50], ["north", "Oslo", 60],
+        ]:
+            ws.append(row)
+        ws = wb.create_sheet("Returns")
+        ws.append(["Region", "Amount"])
+        for row in [["South", 1], ["North", 2]]:
+            ws.append(row)
+        wb.save(self.test_file)
+        self.valid_sheets = get_all_sheets_headers(self.test_file)
+        self.columns = ["Region", "City"]
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def test_encoding_and_rows(self):
+        """Проверяет кодирование значений и индексы строк комбинаций"""
+        table = build_columnar_table(self.test_file, self.valid_sheets, self.columns)
+        sales = table.sheets["Sales"]
+        self.assertEqual(sales.row_count, 6)
+        self.assertEqual(list(sales.codes[0]), [1, 2, 1, EMPTY_CODE, 2, 1])
+        self.assertEqual(set(table.sheets["Returns"].codes[1]), {MISSING_CODE})
+
+        self.assertEqual(list(table.sheet_rows("Sales", {"Region": "NORTH"})), [0, 2, 5])
+        self.assertEqual(list(table.sheet_rows("Sales", {"Region": "North", "City": "oslo"})), [0, 5])
+        self.assertEqual(list(table.sheet_rows("Sales", {"City": "Rome"})), [1])
+        self.assertEqual(list(table.sheet_rows("Sales", {"Region": ""})), [3])
+        self.assertEqual(list(table.sheet_rows("Sales", {"Region": "West"})), [])
+        rows = table.rows({"Region": "South", "City": "Rome"})
+        self.assertEqual((list(rows["Sales"]), list(rows["Returns"])), ([1], []))
+        self.assertEqual(list(table.rows({"Region": "South"})["Returns"]), [0])
+
+    def test_equal_values_of_other_types(self):
+        """Проверяет, что True, 1 и 1.0 кодируются по своему написанию"""
+        dictionary = ColumnDictionary()
+        true_code = dictionary.encode(True)
+        one_code = dictionary.encode(1)
+        self.assertNotEqual(true_code, one_code)
+        self.assertEqual(dictionary.encode("1"), one_code)
+        self.assertEqual(dictionary.lookup(1), one_code)
+        self.assertEqual(dictionary.lookup(True), true_code)
+        self.assertNotEqual(dictionary.encode(1.0), one_code)
+        self.assertEqual(dictionary.encode(None), EMPTY_CODE)
+
+    def test_matches_category_index(self):
+        """Проверяет, что категории и число строк совпадают с CategoryIndex"""
+        table = build_columnar_table(self.test_file, self.valid_sheets, self.columns)
+        index = build_category_index(self.test_file, self.valid_sheets, self.columns)
+        self.assertEqual(table.categories(0), index.categories(0))
+        for region in index.categories(0):
+            filters = {"Region": region}
+            self.assertEqual(table.categories(1, filters), index.categories(1, filters))
+            self.assertEqual(table.row_count(filters), index.row_count(filters))
+        self.assertEqual(table.row_count(), index.row_count())
+        self.assertEqual(table.categories(1, {"Region": ""}), [])
+
+        # Таблица сессии строится один раз и подходит для первых колонок иерархии
+        with SourceWorkbook(self.test_file) as session:
+            first = session.columnar_table(session.valid_sheets, self.columns)
+            self.assertIs(session.columnar_table(session.valid_sheets, ["Region"]), first)
+
+    def test_columnar_engine_output(self):
+        """Проверяет, что движок columnar создает те же файлы, что и openpyxl"""
+        filters_list = [{"Region": "North"}, {"Region": "South", "City": "Milan"}, {"Region": "West"}]
+        outputs = {}
+        for engine in ("openpyxl", "columnar"):
+            file_list = [
+                (filters, os.path.join(self.temp_dir, f"{engine}_{idx}.xlsx"))
+                for idx, filters in enumerate(filters_list)
+            ]
+            results = create_filtered_files(self.test_file, file_list, self.valid_sheets, engine=engine)
+            self.assertIsNone(results[2])
+            outputs[engine] = [
+                {ws.title: list(ws.iter_rows(values_only=True)) for ws in openpyxl.load_workbook(path)}
+                for path in results[:2]
+            ]
+        self.assertEqual(outputs["columnar"], outputs["openpyxl"])
+        self.assertEqual(len(outputs["columnar"][0]["Sales"]), 4)
+
+if __name__ == '__main__':
+    unittest.main()
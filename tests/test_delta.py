@@ -0,0 +1,100 @@
+import unittest
+import os
+import tempfile
+import openpyxl
+from openpyxl.styles import Font
+from excel_utils.delta import split_delta, load_state
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.analysis import get_all_sheets_headers
+
+class TestDelta(unittest.TestCase):
+    def setUp(self):
+        # Исходный журнал и каталог назначения
+        self.temp_dir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.temp_dir, "out")
+        os.makedirs(self.destination)
+        self.test_file = os.path.join(self.temp_dir, "test_delta.xlsx")
+        self.rows = [["North", "Oslo", 10], ["North", "Bergen", 20], ["South", "Rome", 30]]
+        self.write_source()
+        self.file_list = [
+            ({"Region": "North"}, os.path.join(self.destination, "north.xlsx")),
+            ({"Region": "South"}, os.path.join(self.destination, "south.xlsx")),
+            ({"Region": "West"}, os.path.join(self.destination, "west.xlsx")),
+        ]
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def write_source(self, bold_last=False):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Technical info"])
+        ws.append(["Region", "City", "Amount"])
+        for row in self.rows:
+            ws.append(row)
+        if bold_last:
+            ws.cell(row=ws.max_row, column=3).font = Font(bold=True)
+        wb.save(self.test_file)
+        self.valid_sheets = get_all_sheets_headers(self.test_file)
+
+    def run_delta(self):
+        return split_delta(self.test_file, self.file_list, self.valid_sheets, self.destination)
+
+    def read_values(self, path):
+        ws = openpyxl.load_workbook(path)["Data"]
+        return [list(row) for row in ws.iter_rows(values_only=True)]
+
+    def test_appends_new_rows(self):
+        """Проверяет дозапись новых строк в существующие выходы"""
+        run = self.run_delta()
+        self.assertEqual(run.mode, "rebuild")
+        self.assertIsNone(run.results[2])
+
+        self.rows += [["South", "Milan", 40], ["North", "Tromso", 50]]
+        self.write_source(bold_last=True)
+        run = self.run_delta()
+        self.assertEqual(run.mode, "delta")
+        north, south, _ = [target for _, target in self.file_list]
+        self.assertEqual(run.appended, {north: 1, south: 1})
+        self.assertEqual(run.rebuilt, [])
+        self.assertEqual(load_state(self.destination)["sheets"]["Data"]["last_row"], 7)
+
+        # Результат совпадает с созданием файлов с нуля
+        expected = create_filtered_files(
+            self.test_file,
+            [(filters, os.path.join(self.temp_dir, f"expected_{i}.xlsx")) for i, (filters, _) in enumerate(self.file_list)],
+            self.valid_sheets,
+        )
+        self.assertEqual(self.read_values(north), self.read_values(expected[0]))
+        self.assertEqual(self.read_values(south), self.read_values(expected[1]))
+        ws = openpyxl.load_workbook(north)["Data"]
+        self.assertEqual(ws.tables["Data"].ref, "A2:C5")
+        self.assertTrue(ws["C5"].font.bold)
+
+        # Без новых строк файлы не меняются
+        run = self.run_delta()
+        self.assertEqual((run.mode, run.appended), ("delta", {}))
+
+    def test_new_output_and_fallback(self):
+        """Проверяет создание выхода с первыми данными и полное пересоздание"""
+        self.run_delta()
+        self.rows.append(["West", "Lisbon", 60])
+        self.write_source()
+        run = self.run_delta()
+        self.assertEqual(run.mode, "delta")
+        west = self.file_list[2][1]
+        self.assertEqual(run.rebuilt, [west])
+        self.assertEqual(self.read_values(west)[-1], ["West", "Lisbon", 60])
+
+        # Изменение уже обработанной строки
+        self.rows[0][2] = 15
+        self.write_source()
+        run = self.run_delta()
+        self.assertEqual(run.mode, "rebuild")
+        self.assertIn("changed", run.reason)
+        self.assertEqual(self.read_values(self.file_list[0][1])[2], ["North", "Oslo", 15])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import os
+import queue
+import tempfile
+import openpyxl
+from excel_utils import partitioning
+from excel_utils.partitioning import SplitCancelled
+from gui.worker import BackgroundWorker, ProgressTracker, analysis_task, split_task
+
+class TestGuiWorker(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_worker.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Region", "Amount"])
+        for i in range(30):
+            ws.append([["North", "South", "East"][i % 3], i])
+        wb.save(self.test_file)
+        self.destination = os.path.join(self.temp_dir, "out")
+        os.makedirs(self.destination)
+        self.rows_step = partitioning.PROGRESS_ROWS
+        partitioning.PROGRESS_ROWS = 10
+
+    def tearDown(self):
+        partitioning.PROGRESS_ROWS = self.rows_step
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def run_worker(self, task, cancel=False):
+        worker = BackgroundWorker(task)
+        if cancel:
+            worker.cancel()
+        worker.start()
+        worker.join(30)
+        events = []
+        while True:
+            try:
+                events.append(worker.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def test_analysis_and_split_progress(self):
+        """Проверяет события хода работы и результат фонового разбиения"""
+        result = self.run_worker(analysis_task(self.test_file))[-1]
+        self.assertEqual(result['type'], 'done')
+        self.assertEqual(result['result']['columns'], ["Region", "Amount"])
+
+        events = self.run_worker(split_task(self.test_file, self.destination, ["Region"]))
+        self.assertEqual(events[-1]['type'], 'done')
+        self.assertEqual(len(events[-1]['result']), 3)
+
+        tracker = ProgressTracker()
+        for event in events:
+            if event['type'] in ('pass_started', 'rows', 'output_finished'):
+                tracker.update(event)
+        self.assertEqual((tracker.rows, tracker.total_rows), (30, 30))
+        self.assertEqual((tracker.files, tracker.total_files), (3, 3))
+        self.assertAlmostEqual(tracker.fraction(), 1.0)
+        self.assertIn("file 3 of 3", tracker.describe())
+        self.assertTrue(any(event['type'] == 'log' for event in events))
+
+    def test_cancel(self):
+        """Проверяет остановку разбиения по запросу отмены"""
+        events = self.run_worker(split_task(self.test_file, self.destination, ["Region"]), cancel=True)
+        self.assertEqual(events[-1], {'type': 'cancelled', 'created': []})
+        self.assertEqual(os.listdir(self.destination), [])
+
+    def test_cancel_between_outputs(self):
+        """Проверяет, что уже сохраненные файлы остаются при отмене"""
+        from threading import Event
+        from excel_utils.partitioning import create_filtered_files
+        cancel = Event()
+        file_list = [
+            ({"Region": region}, os.path.join(self.destination, f"{region}.xlsx"))
+            for region in ("North", "South")
+        ]
+
+        def progress(event):
+            if event['type'] == 'file':
+                cancel.set()
+
+        with self.assertRaises(SplitCancelled) as context:
+            create_filtered_files(
+                self.test_file, file_list, {"Data": (["Region", "Amount"], 1)}, progress=progress, cancel=cancel
+            )
+        self.assertEqual(context.exception.created, [file_list[0][1]])
+        self.assertEqual(os.listdir(self.destination), ["North.xlsx"])
+
+if __name__ == '__main__':
+    unittest.main()
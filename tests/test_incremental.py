@@ -0,0 +1,120 @@
+import unittest
+import os
+import tempfile
+import openpyxl
+from openpyxl.styles import Font
+from excel_utils.incremental import plan_incremental, load_manifest
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.analysis import get_all_sheets_headers
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        # Исходный файл и каталог назначения
+        self.temp_dir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.temp_dir, "out")
+        os.makedirs(self.destination)
+        self.test_file = os.path.join(self.temp_dir, "test_incremental.xlsx")
+        self.rows = [["North", "Oslo", 10], ["North", "Bergen", 20], ["South", "Rome", 30]]
+        self.write_source()
+        self.file_list = [
+            ({"Region": "North"}, os.path.join(self.destination, "north.xlsx")),
+            ({"Region": "South"}, os.path.join(self.destination, "south.xlsx")),
+            ({"Region": "North", "City": "Oslo"}, os.path.join(self.destination, "north_oslo.xlsx")),
+        ]
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def write_source(self, width=None, bold_row=None):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Technical info"])
+        ws.append(["Region", "City", "Amount"])
+        for row in self.rows:
+            ws.append(row)
+        if width is not None:
+            ws.column_dimensions["B"].width = width
+        # Техническая строка всегда полужирная, поэтому таблица стилей не меняется
+        ws["A1"].font = Font(bold=True)
+        if bold_row is not None:
+            ws.cell(row=bold_row, column=3).font = Font(bold=True)
+        wb.save(self.test_file)
+        self.valid_sheets = get_all_sheets_headers(self.test_file)
+
+    def run_incremental(self, file_list=None, remove_stale=False, options=None):
+        plan = plan_incremental(
+            self.test_file, file_list or self.file_list, self.valid_sheets, self.destination, options
+        )
+        results = create_filtered_files(self.test_file, plan.changed, self.valid_sheets)
+        removed = plan.finish(results, remove_stale)
+        return plan, removed
+
+    def names(self, items):
+        return sorted(os.path.basename(item if isinstance(item, str) else item[1]) for item in items)
+
+    def test_only_changed_outputs_rewritten(self):
+        """Проверяет, что перезаписываются только выходы с измененными строками"""
+        plan, _ = self.run_incremental()
+        self.assertEqual(len(plan.changed), 3)
+
+        plan, _ = self.run_incremental()
+        self.assertEqual(plan.changed, [])
+        self.assertEqual(len(plan.unchanged), 3)
+
+        # Изменение строки Bergen затрагивает только выход North
+        self.rows[1][2] = 25
+        self.write_source()
+        plan, _ = self.run_incremental()
+        self.assertEqual(self.names(plan.changed), ["north.xlsx"])
+        ws = openpyxl.load_workbook(os.path.join(self.destination, "north.xlsx"))["Data"]
+        self.assertEqual(ws["C4"].value, 25)
+
+        # Удаленный файл создается заново
+        os.remove(os.path.join(self.destination, "south.xlsx"))
+        plan, _ = self.run_incremental()
+        self.assertEqual(self.names(plan.changed), ["south.xlsx"])
+
+    def test_layout_style_and_mode_changes(self):
+        """Проверяет, что ширина колонок, стили ячеек и режим записи входят в отпечаток"""
+        self.run_incremental()
+
+        # Ширина колонки копируется во все выходы
+        self.write_source(width=30)
+        plan, _ = self.run_incremental()
+        self.assertEqual(len(plan.changed), 3)
+        plan, _ = self.run_incremental()
+        self.assertEqual(plan.changed, [])
+
+        # Стиль ячейки строки Rome затрагивает только выход South
+        self.write_source(width=30, bold_row=5)
+        plan, _ = self.run_incremental()
+        self.assertEqual(self.names(plan.changed), ["south.xlsx"])
+
+        # Файлы, созданные в другом режиме записи, перезаписываются
+        plan, _ = self.run_incremental(options={'values_only': True, 'write_only': False, 'engine': None})
+        self.assertEqual(len(plan.changed), 3)
+        plan, _ = self.run_incremental(options={'values_only': True, 'write_only': False, 'engine': None})
+        self.assertEqual(plan.changed, [])
+
+    def test_stale_outputs(self):
+        """Проверяет обработку комбинаций, которые больше не создаются"""
+        self.run_incremental()
+        self.rows = [row for row in self.rows if row[0] != "South"]
+        self.write_source()
+
+        plan, removed = self.run_incremental(self.file_list[:2])
+        self.assertEqual(self.names(plan.empty), ["south.xlsx"])
+        self.assertEqual(self.names(plan.stale), ["north_oslo.xlsx", "south.xlsx"])
+        self.assertEqual(removed, [])
+        self.assertTrue(os.path.exists(os.path.join(self.destination, "south.xlsx")))
+        self.assertTrue(load_manifest(self.destination)["outputs"]["south.xlsx"]["stale"])
+
+        plan, removed = self.run_incremental(self.file_list[:1], remove_stale=True)
+        self.assertEqual(self.names(removed), ["north_oslo.xlsx", "south.xlsx"])
+        self.assertFalse(os.path.exists(os.path.join(self.destination, "south.xlsx")))
+        self.assertEqual(list(load_manifest(self.destination)["outputs"]), ["north.xlsx"])
+
+if __name__ == '__main__':
+    unittest.main()
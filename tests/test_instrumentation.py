@@ -0,0 +1,78 @@
+import unittest
+import os
+import json
+import tempfile
+import openpyxl
+from openpyxl.styles import Font
+from excel_utils.instrumentation import start_run, finish_run, current_run
+from excel_utils.analysis import get_all_sheets_headers
+from excel_utils.partitioning import create_filtered_files
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_stats.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Region", "City", "Amount"])
+        for row in [["North", "Oslo", 10], ["North", "Bergen", 20], ["South", "Rome", 30]]:
+            ws.append(row)
+        ws["C2"].font = Font(bold=True)
+        wb.save(self.test_file)
+
+    def tearDown(self):
+        finish_run()
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def split(self, engine='openpyxl'):
+        valid_sheets = get_all_sheets_headers(self.test_file)
+        file_list = [
+            ({"Region": "North"}, os.path.join(self.temp_dir, f"north_{engine}.xlsx")),
+            ({"Region": "West"}, os.path.join(self.temp_dir, f"west_{engine}.xlsx")),
+        ]
+        return create_filtered_files(self.test_file, file_list, valid_sheets, engine=engine)
+
+    def test_disabled_by_default(self):
+        """Проверяет, что без start_run статистика не собирается"""
+        self.assertIsNone(current_run())
+        self.assertIsNotNone(self.split()[0])
+        self.assertIsNone(finish_run())
+
+    def test_stages_and_counters(self):
+        """Проверяет время этапов, счетчики и размеры выходов"""
+        for engine in ('openpyxl', 'xml'):
+            start_run(profile=True)
+            north, west = self.split(engine)
+            stats = finish_run()
+            self.assertIsNone(west)
+            self.assertIn('header_detection', stats.stages)
+            self.assertEqual(stats.counters['rows_scanned'], 3)
+            self.assertEqual(stats.counters['rows_matched'], 2)
+            self.assertEqual(list(stats.outputs), [north])
+            self.assertEqual(stats.outputs[north]['rows'], 2)
+            self.assertEqual(stats.outputs[north]['bytes_written'], os.path.getsize(north))
+
+        # Этапы движка openpyxl с раздельным временем распределения и копирования
+        start_run(profile=True)
+        north, _ = self.split()
+        stats = finish_run()
+        for name in ('load_source', 'row_routing', 'cell_copy', 'table_boundaries', 'save'):
+            self.assertIn(name, stats.stages)
+        self.assertIsNone(stats.stages['row_routing']['cpu'])
+        self.assertGreater(stats.counters['cells_copied'], 0)
+        self.assertEqual(stats.counters['styles_copied'], 1)
+        self.assertIn("row_routing", stats.format_table())
+
+        stats_path = os.path.join(self.temp_dir, "stats.json")
+        stats.write_json(stats_path)
+        with open(stats_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)['counters']['rows_matched'], 2)
+        profile_path = os.path.join(self.temp_dir, "run.prof")
+        self.assertIn("load_workbook", stats.dump_profile(profile_path))
+        self.assertTrue(os.path.exists(profile_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+import tempfile
+import threading
+import openpyxl
+from excel_utils.parallel import create_filtered_files_parallel, split_chunks, pool_context
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.analysis import get_all_sheets_headers
+
+class TestParallelSplit(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_parallel.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Region", "Amount"])
+        for i in range(20):
+            ws.append([f"Region {i % 5}", i])
+        wb.save(self.test_file)
+
+        sheet_headers = get_all_sheets_headers(self.test_file)
+        self.valid_sheets = {k: v for k, v in sheet_headers.items() if v[0] is not None}
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def test_split_chunks(self):
+        """Проверяет распределение комбинаций по порциям с сохранением индексов"""
+        chunks = split_chunks(["a", "b", "c", "d", "e"], 2)
+        self.assertEqual(chunks, [[(0, "a"), (2, "c"), (4, "e")], [(1, "b"), (3, "d")]])
+        self.assertEqual(len(split_chunks(["a"], 4)), 1)
+
+    def test_results_in_file_list_order(self):
+        """Проверяет порядок результатов и совпадение с последовательным режимом"""
+        combinations = [{"Region": f"Region {i}"} for i in range(5)] + [{"Region": "Missing"}]
+        file_list = [
+            (filters, os.path.join(self.temp_dir, "parallel", f"out_{i}.xlsx"))
+            for i, filters in enumerate(combinations)
+        ]
+        os.makedirs(os.path.join(self.temp_dir, "parallel"))
+        results = create_filtered_files_parallel(self.test_file, file_list, self.valid_sheets, 3)
+
+        self.assertEqual([target for target, _, _ in results], [path for _, path in file_list])
+        self.assertEqual([error for _, _, error in results], [None] * 6)
+        self.assertEqual([created for _, created, _ in results], [path for _, path in file_list[:5]] + [None])
+
+        sequential_list = [
+            (filters, os.path.join(self.temp_dir, f"seq_{i}.xlsx")) for i, filters in enumerate(combinations)
+        ]
+        sequential = create_filtered_files(self.test_file, sequential_list, self.valid_sheets)
+        for (_, created, _), expected in zip(results[:5], sequential[:5]):
+            parallel_values = list(openpyxl.load_workbook(created)["Data"].iter_rows(values_only=True))
+            sequential_values = list(openpyxl.load_workbook(expected)["Data"].iter_rows(values_only=True))
+            self.assertEqual(parallel_values, sequential_values)
+
+    def test_pool_started_from_thread(self):
+        """Проверяет, что пул, запущенный не из главного потока, не использует fork"""
+        file_list = [
+            ({"Region": f"Region {i}"}, os.path.join(self.temp_dir, f"thread_{i}.xlsx")) for i in range(2)
+        ]
+        outcome = {}
+
+        def run():
+            outcome['method'] = pool_context().get_start_method()
+            outcome['results'] = create_filtered_files_parallel(self.test_file, file_list, self.valid_sheets, 2)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertNotEqual(outcome['method'], 'fork')
+        self.assertEqual(outcome['results'], [(path, path, None) for _, path in file_list])
+        ws = openpyxl.load_workbook(file_list[1][1])["Data"]
+        self.assertEqual([row[0] for row in ws.iter_rows(min_row=2, values_only=True)], ["Region 1"] * 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import unittest
+import os
+import tempfile
+import openpyxl
+from excel_utils.partitioning import create_filtered_files, RowRouter
+from excel_utils.workbook import create_filtered_file
+from excel_utils.analysis import get_all_sheets_headers
+
+class TestPartitioning(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл с двумя листами
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_partition.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Technical info"])
+        ws.append(["Region", "City", "Amount"])
+        data = [
+            ["North", "Oslo", 10],
+            ["North", "Bergen", 20],
+            ["South", "Rome", 30],
+            ["north", "Oslo", 40],
+            ["South", "Milan", 50],
+        ]
+        for row in data:
+            ws.append(row)
+        ws2 = wb.create_sheet("Extra")
+        ws2.append(["Region", "City", "Amount"])
+        ws2.append(["South", "Rome", 60])
+        wb.save(self.test_file)
+
+        sheet_headers = get_all_sheets_headers(self.test_file)
+        self.valid_sheets = {k: v for k, v in sheet_headers.items() if v[0] is not None}
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def read_values(self, path):
+        wb = openpyxl.load_workbook(path)
+        result = {}
+        for ws in wb.worksheets:
+            result[ws.title] = [list(row) for row in ws.iter_rows(values_only=True)]
+        return result
+
+    def test_router(self):
+        """Проверяет распределение строки по родительским и дочерним фильтрам"""
+        headers = ["Region", "City", "Amount"]
+        router = RowRouter(headers, [
+            {},
+            {"Region": "North"},
+            {"Region": "North", "City": "Oslo"},
+            {"Region": "South"},
+            {"Missing": "x"},
+        ])
+        self.assertEqual(sorted(router.route(["NORTH ", "oslo", 1])), [0, 1, 2])
+        self.assertEqual(sorted(router.route(["South", "Rome", 1])), [0, 3])
+
+    def test_matches_single_file_output(self):
+        """Проверяет, что однопроходное разбиение совпадает с create_filtered_file"""
+        combinations = [
+            {"Region": "North"},
+            {"Region": "North", "City": "Oslo"},
+            {"Region": "South", "City": "Rome"},
+        ]
+        file_list = [
+            (filters, os.path.join(self.temp_dir, f"multi_{i}.xlsx"))
+            for i, filters in enumerate(combinations)
+        ]
+        results = create_filtered_files(self.test_file, file_list, self.valid_sheets)
+        self.assertEqual(len(results), len(file_list))
+
+        for (filters, _), result in zip(file_list, results):
+            self.assertIsNotNone(result)
+            single = create_filtered_file(
+                self.test_file, os.path.join(self.temp_dir, "single.xlsx"), self.valid_sheets, filters
+            )
+            self.assertEqual(self.read_values(result), self.read_values(single))
+
+        values = self.read_values(results[1])
+        self.assertEqual(values["Data"][2:], [["North", "Oslo", 10], ["north", "Oslo", 40]])
+        self.assertNotIn("Extra", values)
+
+        wb = openpyxl.load_workbook(results[2])
+        table = list(wb["Extra"].tables.values())[0]
+        self.assertEqual(table.ref, "A1:C2")
+
+    def test_write_only_output(self):
+        """Проверяет, что потоковая запись сохраняет значения, стили, размеры и таблицу"""
+        wb = openpyxl.load_workbook(self.test_file)
+        ws = wb["Data"]
+        ws["A2"].font = openpyxl.styles.Font(bold=True)
+        ws["C3"].number_format = "0.00"
+        ws.column_dimensions["B"].width = 25
+        ws.merge_cells("A1:C1")
+        wb.save(self.test_file)
+
+        filters = {"Region": "South"}
+        regular = create_filtered_files(
+            self.test_file, [(filters, os.path.join(self.temp_dir, "regular.xlsx"))], self.valid_sheets
+        )[0]
+        streamed = create_filtered_file(
+            self.test_file, os.path.join(self.temp_dir, "streamed.xlsx"), self.valid_sheets, filters,
+            write_only=True
+        )
+        self.assertEqual(self.read_values(streamed), self.read_values(regular))
+
+        ws_streamed = openpyxl.load_workbook(streamed)["Data"]
+        ws_regular = openpyxl.load_workbook(regular)["Data"]
+        self.assertTrue(ws_streamed["A2"].font.bold)
+        self.assertEqual(ws_streamed.column_dimensions["B"].width, 25)
+        self.assertEqual([str(r) for r in ws_streamed.merged_cells.ranges], ["A1:C1"])
+        table_streamed = list(ws_streamed.tables.values())[0]
+        table_regular = list(ws_regular.tables.values())[0]
+        self.assertEqual(table_streamed.ref, table_regular.ref)
+        self.assertEqual(
+            [col.name for col in table_streamed.tableColumns],
+            [col.name for col in table_regular.tableColumns],
+        )
+
+    def test_values_only_output(self):
+        """Проверяет, что режим values_only сохраняет значения и таблицу без стилей"""
+        wb = openpyxl.load_workbook(self.test_file)
+        ws = wb["Data"]
+        ws["A3"].font = openpyxl.styles.Font(bold=True)
+        ws.column_dimensions["B"].width = 25
+        ws.merge_cells("A1:C1")
+        wb.save(self.test_file)
+
+        filters = {"Region": "North"}
+        regular = create_filtered_files(
+            self.test_file, [(filters, os.path.join(self.temp_dir, "regular.xlsx"))], self.valid_sheets
+        )[0]
+        values_only = create_filtered_file(
+            self.test_file, os.path.join(self.temp_dir, "values.xlsx"), self.valid_sheets, filters,
+            values_only=True
+        )
+        self.assertEqual(self.read_values(values_only), self.read_values(regular))
+
+        ws_values = openpyxl.load_workbook(values_only)["Data"]
+        self.assertFalse(ws_values["A3"].font.bold)
+        self.assertNotEqual(ws_values.column_dimensions["B"].width, 25)
+        self.assertEqual(list(ws_values.merged_cells.ranges), [])
+        table_values = list(ws_values.tables.values())[0]
+        table_regular = list(openpyxl.load_workbook(regular)["Data"].tables.values())[0]
+        self.assertEqual(table_values.ref, table_regular.ref)
+
+        target = os.path.join(self.temp_dir, "values_empty.xlsx")
+        self.assertEqual(
+            create_filtered_files(self.test_file, [({"Region": "West"}, target)], self.valid_sheets, values_only=True),
+            [None],
+        )
+
+    def test_no_matching_data(self):
+        """Проверяет, что файл без подходящих строк не создается"""
+        target = os.path.join(self.temp_dir, "empty.xlsx")
+        results = create_filtered_files(self.test_file, [({"Region": "West"}, target)], self.valid_sheets)
+        self.assertEqual(results, [None])
+        self.assertFalse(os.path.exists(target))
+
+if __name__ == '__main__':
+    unittest.main()
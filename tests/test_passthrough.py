@@ -0,0 +1,94 @@
+import unittest
+import os
+import tempfile
+import zipfile
+import openpyxl
+from openpyxl.comments import Comment
+from openpyxl.styles import Font, PatternFill
+from excel_utils.analysis import get_all_sheets_headers
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.workbook import create_filtered_file
+from excel_utils.instrumentation import start_run, finish_run
+from tests.test_xml_engine import convert_to_shared_strings
+
+class TestPassthrough(unittest.TestCase):
+    def setUp(self):
+        # Фильтруемый лист, оформленный справочный лист и лист с примечанием
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "source.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Report"])
+        ws.append(["Region", "Amount"])
+        for idx in range(20):
+            ws.append(["North" if idx % 2 else "South", idx])
+        ref = wb.create_sheet("Ref")
+        ref.append(["Key", "Value", "Link"])
+        for idx in range(10):
+            ref.append([f"K{idx}", idx * 1.5, None])
+        ref["A1"].font = Font(bold=True, color="FF0000")
+        ref["B2"].fill = PatternFill("solid", fgColor="FFFF00")
+        ref["B3"].number_format = "0.00%"
+        ref["C2"].hyperlink = "https://example.com/ref"
+        ref.merge_cells("A12:C12")
+        ref["A12"] = "Merged"
+        ref.column_dimensions["A"].width = 30
+        notes = wb.create_sheet("Notes")
+        notes["A1"] = "See comment"
+        notes["A1"].comment = Comment("Note text", "Author")
+        wb.save(self.test_file)
+        convert_to_shared_strings(self.test_file)
+        # Справочные листы не фильтруются
+        self.valid_sheets = {"Data": get_all_sheets_headers(self.test_file)["Data"]}
+        self.file_list = [
+            ({"Region": "North"}, os.path.join(self.temp_dir, "north.xlsx")),
+            ({"Region": "South"}, os.path.join(self.temp_dir, "south.xlsx")),
+        ]
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def assert_reference_sheet(self, path):
+        source = openpyxl.load_workbook(self.test_file)["Ref"]
+        with zipfile.ZipFile(path) as zf:
+            self.assertIn("xl/sharedStrings.xml", zf.namelist())
+        wb = openpyxl.load_workbook(path)
+        ref = wb["Ref"]
+        self.assertEqual(list(ref.iter_rows(values_only=True)), list(source.iter_rows(values_only=True)))
+        self.assertTrue(ref["A1"].font.bold)
+        self.assertEqual(ref["A1"].font.color.rgb, "00FF0000")
+        self.assertEqual(ref["B2"].fill.fgColor.rgb, "00FFFF00")
+        self.assertEqual(ref["B3"].number_format, "0.00%")
+        self.assertEqual(ref["C2"].hyperlink.target, "https://example.com/ref")
+        self.assertEqual([str(cells) for cells in ref.merged_cells.ranges], ["A12:C12"])
+        self.assertEqual(ref.column_dimensions["A"].width, 30)
+        # Лист с примечанием (связанная часть) копируется по ячейкам
+        self.assertEqual(wb["Notes"]["A1"].value, "See comment")
+        self.assertEqual(wb.sheetnames, ["Data", "Ref", "Notes"])
+        return wb
+
+    def test_partition_passthrough(self):
+        """Проверяет перенос справочного листа исходной частью XML во все выходы"""
+        for write_only in (False, True):
+            stats = start_run()
+            try:
+                results = create_filtered_files(self.test_file, self.file_list, self.valid_sheets, write_only)
+            finally:
+                finish_run()
+            self.assertEqual(stats.counters['raw_sheets_copied'], 2)
+            for path, region in zip(results, ("North", "South")):
+                wb = self.assert_reference_sheet(path)
+                data = list(wb["Data"].iter_rows(min_row=3, values_only=True))
+                self.assertEqual(len(data), 10)
+                self.assertTrue(all(row[0] == region for row in data))
+
+    def test_single_file_passthrough(self):
+        """Проверяет перенос справочного листа при создании одного файла"""
+        target = os.path.join(self.temp_dir, "single.xlsx")
+        result = create_filtered_file(self.test_file, target, self.valid_sheets, {"Region": "North"})
+        self.assert_reference_sheet(result)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime, date, timedelta
+import openpyxl
+from excel_utils.analysis import get_all_sheets_headers, analyze_column
+from excel_utils.readers import get_reader, LeanReader
+from excel_utils.source import SourceWorkbook
+from core.api import split_workbook
+
+class TestReaders(unittest.TestCase):
+    def setUp(self):
+        # Создаем книгу со значениями разных типов, пропусками и скрытым листом
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "source.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Report", None, "v1"])
+        ws.append(["Region", "City", "Amount", "Date", "Flag"])
+        ws.append(["North", "Oslo", 10, datetime(2024, 1, 5, 12, 30), True])
+        ws.append(["South", None, 2.5, date(2024, 2, 1), False])
+        ws.append([" north", "Bergen", -3, None, None])
+        ws["A7"] = "West"
+        ws["C7"] = "=C3*2"
+        ws["F7"] = timedelta(hours=36)
+        ws["F7"].number_format = "[h]:mm:ss"
+        ws["B9"] = "Tail"
+        ws2 = wb.create_sheet("Extra")
+        ws2.append(["Region", "Amount"])
+        ws2.append(["South", 1e20])
+        hidden = wb.create_sheet("Hidden")
+        hidden.append(["Secret"])
+        hidden.sheet_state = "hidden"
+        wb.save(self.test_file)
+        self.csv_file = os.path.join(self.temp_dir, "sales.csv")
+        with open(self.csv_file, "w", encoding="utf-8") as f:
+            f.write("Region;City;Amount\nNorth;Oslo;10\nSouth;;20\nnorth;Bergen;30\n")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def read_all(self, name, **kwargs):
+        wb = get_reader(name).open(self.test_file)
+        try:
+            return {
+                ws.title: (ws.sheet_state, ws.max_row, list(ws.iter_rows(values_only=True, **kwargs)))
+                for ws in wb.worksheets
+            }
+        finally:
+            wb.close()
+
+    def test_value_parity(self):
+        """Проверяет, что движок lean возвращает те же листы и значения, что и openpyxl"""
+        expected = self.read_all('openpyxl')
+        self.assertEqual(self.read_all('lean'), expected)
+        self.assertEqual(self.read_all('lean', min_row=3, max_row=8), self.read_all('openpyxl', min_row=3, max_row=8))
+        self.assertEqual(expected["Data"][2][6][2], "=C3*2")
+        self.assertEqual(expected["Hidden"][0], "hidden")
+
+    def test_analysis_parity(self):
+        """Проверяет одинаковые заголовки и категории для обоих движков"""
+        results = []
+        for name in ('openpyxl', 'lean'):
+            reader = get_reader(name)
+            headers = get_all_sheets_headers(self.test_file, cache=reader)
+            valid_sheets = {sheet: data for sheet, data in headers.items() if data[0] is not None}
+            results.append((
+                headers,
+                analyze_column(self.test_file, valid_sheets, "Region", cache=reader),
+                analyze_column(self.test_file, valid_sheets, "City", {"Region": "North"}, cache=reader),
+            ))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1][0]["Data"], (["Region", "City", "Amount", "Date", "Flag"], 2))
+
+    def test_csv_source(self):
+        """Проверяет чтение CSV движком lean и разбиение источника CSV"""
+        headers = get_all_sheets_headers(self.csv_file, cache=LeanReader())
+        self.assertEqual(headers, {"sales": (["Region", "City", "Amount"], 1)})
+        with SourceWorkbook(self.csv_file, LeanReader()) as session:
+            self.assertEqual(analyze_column(session, session.valid_sheets, "Region"), ["North", "South", "north"])
+
+        destination = os.path.join(self.temp_dir, "out")
+        done = list(split_workbook(self.csv_file, destination, ["Region"], ["each"], output_format='csv'))[-1]
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in done['created']),
+            ["sales_North.csv", "sales_South.csv", "sales_north.csv"]
+        )
+        with self.assertRaises(ValueError):
+            list(split_workbook(self.csv_file, destination, ["Region"]))
+
+    def test_split_with_lean_reader(self):
+        """Проверяет, что разбиение с движком lean создает те же файлы"""
+        outputs = []
+        for name in ('openpyxl', 'lean'):
+            destination = os.path.join(self.temp_dir, name)
+            done = list(split_workbook(self.test_file, destination, ["Region"], ["each"], reader=name))[-1]
+            outputs.append([
+                {ws.title: list(ws.iter_rows(values_only=True)) for ws in openpyxl.load_workbook(path)}
+                for path in done['created']
+            ])
+        self.assertEqual(outputs[0], outputs[1])
+
+if __name__ == '__main__':
+    unittest.main()
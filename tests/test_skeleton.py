@@ -0,0 +1,90 @@
+import unittest
+import os
+import tempfile
+import openpyxl
+from openpyxl.styles import Font, PatternFill
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.workbook import create_filtered_file
+from excel_utils.skeleton import WorkbookSkeleton
+from excel_utils.source import SourceWorkbook
+from excel_utils.instrumentation import start_run, finish_run
+
+class TestSkeleton(unittest.TestCase):
+    def setUp(self):
+        # Лист с технической строкой, объединенными ячейками и размерами, скрытый лист
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "source.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Quarterly report"])
+        ws.merge_cells("A1:C1")
+        ws["A1"].font = Font(bold=True)
+        ws.append(["Region", "City", "Amount"])
+        ws["A2"].fill = PatternFill("solid", fgColor="DDDDDD")
+        for idx in range(12):
+            ws.append(["North" if idx % 3 else "South", f"City {idx}", idx])
+        ws.column_dimensions["B"].width = 25
+        ws.row_dimensions[1].height = 30
+        hidden = wb.create_sheet("Hidden")
+        hidden.append(["Secret"])
+        hidden.sheet_state = "hidden"
+        wb.save(self.test_file)
+        self.valid_sheets = {"Data": (["Region", "City", "Amount"], 2)}
+        self.filters = [{"Region": "North"}, {"Region": "South"}]
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def assert_output(self, path, region):
+        wb = openpyxl.load_workbook(path)
+        self.assertEqual(wb.sheetnames, ["Data"])
+        ws = wb["Data"]
+        self.assertEqual(ws["A1"].value, "Quarterly report")
+        self.assertTrue(ws["A1"].font.bold)
+        self.assertEqual(ws["A2"].fill.fgColor.rgb, "00DDDDDD")
+        self.assertEqual([str(cells) for cells in ws.merged_cells.ranges], ["A1:C1"])
+        self.assertEqual(ws.column_dimensions["B"].width, 25)
+        self.assertEqual(ws.row_dimensions[1].height, 30)
+        self.assertEqual(list(ws.iter_rows(min_row=2, max_row=2, values_only=True)), [("Region", "City", "Amount")])
+        data = list(ws.iter_rows(min_row=3, values_only=True))
+        self.assertTrue(data)
+        self.assertTrue(all(row[0] == region for row in data))
+
+    def test_skeleton_templates(self):
+        """Проверяет шаблоны листов: скрытые листы пропускаются, строки до данных собраны"""
+        wb = openpyxl.load_workbook(self.test_file)
+        skeleton = WorkbookSkeleton(wb, self.valid_sheets)
+        self.assertEqual([template.title for template in skeleton], ["Data"])
+        template = skeleton.get("Data")
+        self.assertEqual(len(template.leading_rows), 2)
+        self.assertEqual([cell.value for cell in template.header_cells], ["Region", "City", "Amount"])
+
+    def test_session_reuses_skeleton(self):
+        """Проверяет, что заготовка строится один раз для всех файлов сессии"""
+        stats = start_run()
+        try:
+            with SourceWorkbook(self.test_file) as session:
+                results = [
+                    create_filtered_file(
+                        session, os.path.join(self.temp_dir, f"single_{idx}.xlsx"), self.valid_sheets, filters
+                    )
+                    for idx, filters in enumerate(self.filters)
+                ]
+                for write_only in (False, True):
+                    create_filtered_files(session, [
+                        (filters, os.path.join(self.temp_dir, f"multi_{write_only}_{idx}.xlsx"))
+                        for idx, filters in enumerate(self.filters)
+                    ], self.valid_sheets, write_only)
+        finally:
+            finish_run()
+        self.assertEqual(stats.counters['skeleton_sheets'], 1)
+        for path, region in zip(results, ("North", "South")):
+            self.assert_output(path, region)
+        for write_only in (False, True):
+            for idx, region in enumerate(("North", "South")):
+                self.assert_output(os.path.join(self.temp_dir, f"multi_{write_only}_{idx}.xlsx"), region)
+
+if __name__ == '__main__':
+    unittest.main()
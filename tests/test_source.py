@@ -0,0 +1,85 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+import openpyxl
+from excel_utils.source import SourceWorkbook
+from excel_utils.source_cache import SourceCache
+from excel_utils.analysis import get_all_sheets_headers, analyze_column
+from excel_utils.filtering import get_all_combinations
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.workbook import create_filtered_file
+
+class TestSourceWorkbook(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_source.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Technical info"])
+        ws.append(["Region", "City", "Amount"])
+        for row in [["North", "Oslo", 10], ["North", "Bergen", 20], ["South", "Rome", 30]]:
+            ws.append(row)
+        wb.save(self.test_file)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def read_values(self, path):
+        wb = openpyxl.load_workbook(path)
+        return {ws.title: [list(row) for row in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+    def test_single_open_for_whole_run(self):
+        """Проверяет, что анализ и создание файлов используют одну разобранную книгу"""
+        with SourceWorkbook(self.test_file) as session:
+            # Первое обращение разбирает книгу, дальше повторное открытие запрещено
+            headers = session.sheet_headers()
+            self.assertEqual(headers, get_all_sheets_headers(self.test_file))
+            valid_sheets = session.valid_sheets
+            with mock.patch("excel_utils.source.openpyxl.load_workbook",
+                            side_effect=AssertionError("workbook reopened")):
+                self.assertEqual(analyze_column(session, valid_sheets, "City"), ["Bergen", "Oslo", "Rome"])
+                combinations = get_all_combinations(session, valid_sheets, ["Region"])
+                file_list = [
+                    (filters, os.path.join(self.temp_dir, f"out_{i}.xlsx"))
+                    for i, filters in enumerate(combinations)
+                ]
+                results = create_filtered_files(session, file_list, valid_sheets)
+                single = create_filtered_file(
+                    session, os.path.join(self.temp_dir, "single.xlsx"), valid_sheets, {"Region": "South"}
+                )
+            self.assertEqual(session.opens, 1)
+
+        expected = create_filtered_file(
+            self.test_file, os.path.join(self.temp_dir, "expected.xlsx"), valid_sheets, {"Region": "South"}
+        )
+        self.assertEqual(self.read_values(single), self.read_values(expected))
+        self.assertEqual(self.read_values(results[1]), self.read_values(expected))
+
+    def test_release(self):
+        """Проверяет освобождение книги и повторное открытие с сохранением заголовков"""
+        session = SourceWorkbook(self.test_file)
+        session.sheet_headers()
+        session.release()
+        self.assertIsNone(session._workbook)
+        self.assertIn("Data", session.valid_sheets)
+        self.assertEqual(session.opens, 1)
+        self.assertEqual(analyze_column(session, session.valid_sheets, "Region"), ["North", "South"])
+        self.assertEqual(session.opens, 2)
+        session.close()
+
+    def test_values_from_cache(self):
+        """Проверяет, что при кэше полная книга загружается только для записи"""
+        cache = SourceCache(os.path.join(self.temp_dir, "cache"))
+        with SourceWorkbook(self.test_file, cache) as session:
+            valid_sheets = session.valid_sheets
+            self.assertEqual(analyze_column(session, valid_sheets, "Region"), ["North", "South"])
+            self.assertIsNone(session._workbook)
+            create_filtered_files(session, [({"Region": "North"}, os.path.join(self.temp_dir, "c.xlsx"))], valid_sheets)
+            self.assertIsNotNone(session._workbook)
+
+if __name__ == '__main__':
+    unittest.main()
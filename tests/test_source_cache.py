@@ -0,0 +1,102 @@
+import unittest
+import os
+import time
+import datetime
+import tempfile
+import openpyxl
+from excel_utils.source_cache import SourceCache, encode_column, decode_column
+from excel_utils.analysis import get_all_sheets_headers, analyze_column
+from excel_utils.category_index import build_category_index
+
+class TestSourceCache(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл и каталог кэша
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_cache.xlsx")
+        self.cache = SourceCache(os.path.join(self.temp_dir, "cache"))
+        self.write_source([
+            ["North", "Oslo", 10, datetime.datetime(2024, 1, 1)],
+            ["North", "Bergen", 20, None],
+            ["South", "Rome", 30, datetime.datetime(2024, 1, 3)],
+        ])
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def write_source(self, data):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Technical info"])
+        ws.append(["Region", "City", "Amount", "When"])
+        for row in data:
+            ws.append(row)
+        hidden = wb.create_sheet("Hidden")
+        hidden.sheet_state = "hidden"
+        hidden.append(["Secret"])
+        wb.save(self.test_file)
+
+    def test_same_results_as_workbook(self):
+        """Проверяет, что анализ из кэша совпадает с анализом исходного файла"""
+        headers = get_all_sheets_headers(self.test_file)
+        self.assertEqual(get_all_sheets_headers(self.test_file, cache=self.cache), headers)
+        valid_sheets = {k: v for k, v in headers.items() if v[0] is not None}
+
+        for filters in [{}, {"Region": "north"}]:
+            self.assertEqual(
+                analyze_column(self.test_file, valid_sheets, "City", filters, cache=self.cache),
+                analyze_column(self.test_file, valid_sheets, "City", filters),
+            )
+        index = build_category_index(self.test_file, valid_sheets, ["Region", "City"], cache=self.cache)
+        self.assertEqual(index.categories(1, {"Region": "North"}), ["Bergen", "Oslo"])
+
+        wb = self.cache.open(self.test_file)
+        try:
+            self.assertEqual(wb.sheetnames, ["Data"])
+            rows = list(wb["Data"].iter_rows(min_row=3, values_only=True))
+            self.assertEqual(rows[0], ("North", "Oslo", 10, datetime.datetime(2024, 1, 1)))
+            self.assertEqual(list(wb["Data"].iter_rows(min_row=5, columns=[1])), [(None, "Rome", None, None)])
+        finally:
+            wb.close()
+        # Кэш построен один раз и использован всеми вызовами
+        self.assertEqual(self.cache.builds, 1)
+
+    def test_stale_cache_rebuilt(self):
+        """Проверяет перестроение кэша после изменения источника"""
+        self.cache.open(self.test_file).close()
+        time.sleep(0.01)
+        self.write_source([["West", "Lisbon", 5, None]])
+        headers = get_all_sheets_headers(self.test_file, cache=self.cache)
+        valid_sheets = {k: v for k, v in headers.items() if v[0] is not None}
+        self.assertEqual(analyze_column(self.test_file, valid_sheets, "Region", cache=self.cache), ["West"])
+        self.assertEqual(self.cache.builds, 2)
+
+    def test_touched_source_keeps_cache(self):
+        """Проверяет, что изменение времени без изменения содержимого не сбрасывает кэш"""
+        self.cache.open(self.test_file).close()
+        stat = os.stat(self.test_file)
+        os.utime(self.test_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.cache.open(self.test_file).close()
+        self.cache.open(self.test_file).close()
+        self.assertEqual(self.cache.builds, 1)
+
+    def test_column_encoding(self):
+        """Проверяет, что значения колонок сохраняют типы без pickle"""
+        values = [
+            None, "North", 10, 2.5, True, datetime.datetime(2024, 1, 1, 12, 30), datetime.date(2024, 2, 3),
+            datetime.time(8, 15), datetime.timedelta(days=1, seconds=5), "datetime",
+        ]
+        data, tagged = encode_column(values)
+        self.assertTrue(tagged)
+        decoded = decode_column(data, tagged)
+        self.assertEqual(decoded, values)
+        self.assertEqual([type(value) for value in decoded], [type(value) for value in values])
+        self.assertEqual(decode_column(*encode_column(["a", 1])), ["a", 1])
+
+        # Временный файл построения с уникальным именем переименован в файл кэша
+        self.cache.open(self.test_file).close()
+        self.assertEqual(os.listdir(self.cache.cache_dir), [os.path.basename(self.cache.cache_path(self.test_file))])
+
+if __name__ == '__main__':
+    unittest.main()
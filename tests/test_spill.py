@@ -0,0 +1,97 @@
+import unittest
+import os
+import tempfile
+import openpyxl
+from excel_utils.analysis import get_all_sheets_headers
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.instrumentation import start_run, finish_run
+from excel_utils import spill
+
+class TestSpill(unittest.TestCase):
+    def setUp(self):
+        # Создаем книгу с технической строкой, листом без заголовков и множеством строк
+        self.temp_dir = tempfile.mkdtemp()
+        self.spill_dir = os.path.join(self.temp_dir, "spill")
+        os.makedirs(self.spill_dir)
+        self.spill_dir_default = spill.SPILL_DIR
+        spill.SPILL_DIR = self.spill_dir
+        self.test_file = os.path.join(self.temp_dir, "sales.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Report"])
+        ws.append(["Region", "City", "Amount"])
+        regions = ["North", "South", "East", "West"]
+        for idx in range(400):
+            ws.append([regions[idx % 4], f"City {idx % 7}", idx])
+        ws2 = wb.create_sheet("Returns")
+        ws2.append(["Region", "Amount"])
+        ws2.append(["South", 5])
+        notes = wb.create_sheet("Notes")
+        notes.append([1, 2, 3])
+        wb.save(self.test_file)
+        self.valid_sheets = {
+            sheet: data for sheet, data in get_all_sheets_headers(self.test_file).items() if data[0] is not None
+        }
+        self.filters = [{"Region": "North"}, {"Region": "South"}, {"Region": "South", "City": "City 3"}, {}]
+
+    def tearDown(self):
+        import shutil
+        spill.SPILL_DIR = self.spill_dir_default
+        shutil.rmtree(self.temp_dir)
+
+    def file_list(self, name, extension=".xlsx"):
+        directory = os.path.join(self.temp_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        return [(filters, os.path.join(directory, f"out_{idx}{extension}")) for idx, filters in enumerate(self.filters)]
+
+    def read_outputs(self, results):
+        return [
+            {ws.title: list(ws.iter_rows(values_only=True)) for ws in openpyxl.load_workbook(path)} if path else None
+            for path in results
+        ]
+
+    def test_spilled_values_match(self):
+        """Проверяет, что разбиение с выгрузкой строк дает те же файлы, что и values_only"""
+        expected = create_filtered_files(self.test_file, self.file_list("values"), self.valid_sheets, values_only=True)
+        stats = start_run()
+        try:
+            results = create_filtered_files(
+                self.test_file, self.file_list("spilled"), self.valid_sheets, values_only=True, memory_budget=0.005
+            )
+        finally:
+            finish_run()
+        self.assertEqual(self.read_outputs(results), self.read_outputs(expected))
+        self.assertGreater(stats.counters['spill_runs'], 1)
+        self.assertEqual(stats.counters['rows_matched'], 401)
+        # Временные файлы серий удаляются
+        self.assertEqual(os.listdir(self.spill_dir), [])
+
+    def test_spilled_csv(self):
+        """Проверяет запись CSV из файлов серий и отсутствие файлов без данных"""
+        self.filters.append({"Region": "Nowhere"})
+        expected = create_filtered_files(
+            self.test_file, self.file_list("csv", ".csv"), self.valid_sheets, output_format='csv'
+        )
+        results = create_filtered_files(
+            self.test_file, self.file_list("spilled", ".csv"), self.valid_sheets, output_format='csv',
+            memory_budget=0.002
+        )
+        self.assertEqual([os.path.basename(path) if path else None for path in results],
+                         [os.path.basename(path) if path else None for path in expected])
+        self.assertIsNone(results[-1])
+        expected_dir, spilled_dir = os.path.join(self.temp_dir, "csv"), os.path.join(self.temp_dir, "spilled")
+        self.assertEqual(sorted(os.listdir(spilled_dir)), sorted(os.listdir(expected_dir)))
+        for name in os.listdir(expected_dir):
+            with open(os.path.join(spilled_dir, name), encoding="utf-8") as f, \
+                    open(os.path.join(expected_dir, name), encoding="utf-8") as g:
+                self.assertEqual(f.read(), g.read())
+        self.assertEqual(os.listdir(self.spill_dir), [])
+
+    def test_requires_values_output(self):
+        """Проверяет, что бюджет памяти не применяется к книгам со стилями"""
+        with self.assertRaises(ValueError):
+            create_filtered_files(self.test_file, self.file_list("styled"), self.valid_sheets, memory_budget=1)
+
+if __name__ == '__main__':
+    unittest.main()
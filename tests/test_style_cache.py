@@ -0,0 +1,36 @@
+import unittest
+import openpyxl
+from openpyxl.styles import Font, PatternFill
+from excel_utils.common import copy_cell_style, StyleCache
+
+class TestStyleCache(unittest.TestCase):
+    def test_cached_styles_match_direct_copy(self):
+        """Проверяет, что стили из кэша совпадают с прямым копированием"""
+        wb_source = openpyxl.Workbook()
+        ws_source = wb_source.active
+        for row_idx in range(1, 11):
+            cell = ws_source.cell(row=row_idx, column=1, value=row_idx)
+            cell.font = Font(bold=row_idx % 2 == 0)
+            cell.fill = PatternFill("solid", start_color="96C850")
+            cell.number_format = "0.00"
+
+        wb_direct = openpyxl.Workbook()
+        wb_cached = openpyxl.Workbook()
+        style_cache = StyleCache()
+        for row in ws_source.iter_rows():
+            source_cell = row[0]
+            direct = wb_direct.active.cell(row=source_cell.row, column=1)
+            cached = wb_cached.active.cell(row=source_cell.row, column=1)
+            copy_cell_style(source_cell, direct)
+            copy_cell_style(source_cell, cached, style_cache)
+            self.assertEqual(tuple(cached._style), tuple(direct._style))
+            self.assertEqual(cached.font.b, source_cell.font.b)
+            self.assertEqual(cached.fill.start_color.rgb, direct.fill.start_color.rgb)
+            self.assertEqual(cached.number_format, "0.00")
+
+        # Два уникальных стиля копируются один раз, остальные берутся из кэша
+        self.assertEqual(style_cache.misses, 2)
+        self.assertEqual(style_cache.hits, 8)
+
+if __name__ == '__main__':
+    unittest.main()
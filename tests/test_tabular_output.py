@@ -0,0 +1,117 @@
+import unittest
+import os
+import csv
+import tempfile
+import openpyxl
+from excel_utils.analysis import get_all_sheets_headers
+from excel_utils.formatting import generate_short_filename
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.workbook import create_filtered_file
+from excel_utils.tabular_output import column_names
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+class TestTabularOutput(unittest.TestCase):
+    def setUp(self):
+        # Создаем тестовый Excel-файл с технической строкой над заголовками
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "sales.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Report"])
+        ws.append(["Region", "City", "Amount"])
+        for row in [["North", "Oslo", 10], ["South", "Rome", 20.5], ["north", None, 30], ["South", "Milan"]]:
+            ws.append(row)
+        wb.save(self.test_file)
+        self.valid_sheets = get_all_sheets_headers(self.test_file)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def read_csv(self, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            return list(csv.reader(f))
+
+    def test_csv_output(self):
+        """Проверяет построчную запись CSV: заголовки, фильтр и имя файла"""
+        self.assertEqual(
+            generate_short_filename(os.path.join(self.temp_dir, "sales"), {"Region": "North"}, extension='.csv'),
+            "sales_North.csv"
+        )
+        file_list = [
+            ({"Region": "North"}, os.path.join(self.temp_dir, "sales_North.xlsx")),
+            ({"Region": "South"}, os.path.join(self.temp_dir, "sales_South.csv")),
+            ({"Region": "West"}, os.path.join(self.temp_dir, "sales_West.csv")),
+        ]
+        results = create_filtered_files(self.test_file, file_list, self.valid_sheets, output_format='csv')
+        self.assertEqual(results, [
+            os.path.join(self.temp_dir, "sales_North.csv"), os.path.join(self.temp_dir, "sales_South.csv"), None
+        ])
+        self.assertEqual(self.read_csv(results[0]), [["Region", "City", "Amount"], ["North", "Oslo", "10"], ["north", "", "30"]])
+        self.assertEqual(self.read_csv(results[1])[1:], [["South", "Rome", "20.5"], ["South", "Milan", ""]])
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if name.endswith('.part')])
+
+    def test_multiple_sheets(self):
+        """Проверяет, что листы книги записываются в отдельные файлы"""
+        wb = openpyxl.load_workbook(self.test_file)
+        ws = wb.create_sheet("Returns")
+        ws.append(["Region", "Amount"])
+        ws.append(["North", 5])
+        wb.save(self.test_file)
+        valid_sheets = get_all_sheets_headers(self.test_file)
+        target = os.path.join(self.temp_dir, "out.csv")
+        created = create_filtered_file(self.test_file, target, valid_sheets, {"Region": "North"}, output_format='csv')
+        self.assertEqual(created, os.path.join(self.temp_dir, "out_Data.csv"))
+        self.assertEqual(self.read_csv(os.path.join(self.temp_dir, "out_Returns.csv")), [["Region", "Amount"], ["North", "5"]])
+        self.assertEqual(column_names(["A", None, "a", None, None]), ["A", "Column2", "a_2"])
+
+    def test_many_csv_outputs(self):
+        """Проверяет, что при числе выходов больше MAX_OPEN_WRITERS файлы пишутся по одному"""
+        from excel_utils import tabular_output
+        file_list = [
+            ({"Region": region}, os.path.join(self.temp_dir, f"many_{idx}.csv"))
+            for idx, region in enumerate(["North", "South", "West"])
+        ]
+        max_writers = tabular_output.MAX_OPEN_WRITERS
+        tabular_output.MAX_OPEN_WRITERS = 1
+        try:
+            results = create_filtered_files(self.test_file, file_list, self.valid_sheets, output_format='csv')
+        finally:
+            tabular_output.MAX_OPEN_WRITERS = max_writers
+        self.assertEqual(results, [file_list[0][1], file_list[1][1], None])
+        self.assertEqual(self.read_csv(results[0]), [["Region", "City", "Amount"], ["North", "Oslo", "10"], ["north", "", "30"]])
+        self.assertEqual(self.read_csv(results[1])[1:], [["South", "Rome", "20.5"], ["South", "Milan", ""]])
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if name.endswith('.part')])
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_arrow_outputs(self):
+        """Проверяет запись Parquet и Feather пакетами колонок"""
+        import pyarrow.parquet
+        import pyarrow.feather
+        from excel_utils import tabular_output
+        batch_rows = tabular_output.OUTPUT_BATCH_ROWS
+        tabular_output.OUTPUT_BATCH_ROWS = 1
+        try:
+            for output_format, read in (('parquet', pyarrow.parquet.read_table), ('feather', pyarrow.feather.read_table)):
+                target = os.path.join(self.temp_dir, "out.xlsx")
+                created = create_filtered_file(
+                    self.test_file, target, self.valid_sheets, {"Region": "South"}, output_format=output_format
+                )
+                self.assertTrue(created.endswith('.' + output_format))
+                table = read(created)
+                self.assertEqual(table.column_names, ["Region", "City", "Amount"])
+                self.assertEqual(table.column("Amount").to_pylist(), [20.5, None])
+                created = create_filtered_file(
+                    self.test_file, target, self.valid_sheets, {"Region": "North"}, output_format=output_format
+                )
+                self.assertEqual(read(created).column("Amount").to_pylist(), [10.0, 30.0])
+        finally:
+            tabular_output.OUTPUT_BATCH_ROWS = batch_rows
+
+if __name__ == '__main__':
+    unittest.main()
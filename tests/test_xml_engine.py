@@ -0,0 +1,275 @@
+import unittest
+import os
+import re
+import datetime
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from unittest import mock
+import openpyxl
+from openpyxl.styles import Font
+from excel_utils.partitioning import create_filtered_files
+from excel_utils.workbook import create_filtered_file
+from excel_utils.analysis import get_all_sheets_headers
+from excel_utils.xlsx_parts import MAIN_NS, SharedStringTable
+
+def convert_to_shared_strings(path):
+    """Переводит строки книги в таблицу общих строк, как это делает Excel."""
+    ns = "{%s}" % MAIN_NS
+    ET.register_namespace("", MAIN_NS)
+    with zipfile.ZipFile(path) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    strings = []
+    for name in parts:
+        if not name.startswith("xl/worksheets/sheet"):
+            continue
+        root = ET.fromstring(parts[name])
+        for cell in root.iter(ns + "c"):
+            if cell.get("t") != "inlineStr":
+                continue
+            inline = cell.find(ns + "is")
+            text = inline.find(ns + "t").text
+            cell.remove(inline)
+            cell.set("t", "s")
+            if text not in strings:
+                strings.append(text)
+            ET.SubElement(cell, ns + "v").text = str(strings.index(text))
+        parts[name] = ET.tostring(root)
+    items = "".join(f"<si><t>{text}</t></si>" for text in strings)
+    parts["xl/sharedStrings.xml"] = (
+        f'<sst xmlns="{MAIN_NS}" count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>'
+    ).encode("utf-8")
+    parts["xl/_rels/workbook.xml.rels"] = parts["xl/_rels/workbook.xml.rels"].replace(
+        b"</Relationships>",
+        b'<Relationship Id="rIdStrings" Target="sharedStrings.xml" Type="http://schemas.openxmlformats.org/'
+        b'officeDocument/2006/relationships/sharedStrings"/></Relationships>'
+    )
+    parts["[Content_Types].xml"] = parts["[Content_Types].xml"].replace(
+        b"</Types>",
+        b'<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-'
+        b'officedocument.spreadsheetml.sharedStrings+xml"/></Types>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+class TestXmlEngine(unittest.TestCase):
+    def setUp(self):
+        # Тестовая книга: фильтруемый лист, справочный лист и скрытый лист
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.temp_dir, "test_xml.xlsx")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Technical info"])
+        ws.append(["Region", "City", "Amount", "When"])
+        for i in range(12):
+            ws.append([["North", "South", "north"][i % 3], f"C{i % 4}", i, datetime.datetime(2024, 1, 1 + i)])
+        ws["C6"].font = Font(bold=True)
+        ws.merge_cells("A1:C1")
+        ref = wb.create_sheet("Ref")
+        ref.append(["Key", "Value"])
+        ref.append([1, 2])
+        hidden = wb.create_sheet("Hidden")
+        hidden.sheet_state = "hidden"
+        hidden.append(["Region"])
+        hidden.append(["North"])
+        wb.save(self.test_file)
+
+        sheet_headers = get_all_sheets_headers(self.test_file)
+        self.valid_sheets = {k: v for k, v in sheet_headers.items() if v[0] is not None}
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def read_values(self, path):
+        wb = openpyxl.load_workbook(path)
+        return {ws.title: [list(row) for row in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+    def test_matches_openpyxl_engine(self):
+        """Проверяет, что движок XML дает те же значения и листы, что и openpyxl"""
+        combinations = [
+            {"Region": "North"},
+            {"Region": "South", "City": "C1"},
+            {"When": "2024-01-05 00:00:00"},
+            {},
+        ]
+        xml_list = [(f, os.path.join(self.temp_dir, f"xml_{i}.xlsx")) for i, f in enumerate(combinations)]
+        ref_list = [(f, os.path.join(self.temp_dir, f"ref_{i}.xlsx")) for i, f in enumerate(combinations)]
+        xml_results = create_filtered_files(self.test_file, xml_list, self.valid_sheets, engine='xml')
+        ref_results = create_filtered_files(self.test_file, ref_list, self.valid_sheets)
+
+        for xml_path, ref_path in zip(xml_results, ref_results):
+            self.assertIsNotNone(xml_path)
+            self.assertEqual(self.read_values(xml_path), self.read_values(ref_path))
+            self.assertFalse(os.path.exists(xml_path + ".part"))
+
+        wb = openpyxl.load_workbook(xml_results[0])
+        self.assertNotIn("Hidden", wb.sheetnames)
+        ws = wb["Data"]
+        self.assertEqual([str(r) for r in ws.merged_cells.ranges], ["A1:C1"])
+        self.assertEqual(list(ws.tables.values())[0].ref, "A2:D10")
+        # Индекс стиля ячейки сохраняется без копирования стилей (исходная строка 6 стала 5)
+        self.assertTrue(ws["C5"].font.bold)
+
+    def test_styles_reused_verbatim(self):
+        """Проверяет, что styles.xml копируется без изменений"""
+        target = os.path.join(self.temp_dir, "styles.xlsx")
+        result = create_filtered_file(self.test_file, target, self.valid_sheets, {"Region": "South"}, engine='xml')
+        with zipfile.ZipFile(self.test_file) as src, zipfile.ZipFile(result) as out:
+            self.assertEqual(src.read("xl/styles.xml"), out.read("xl/styles.xml"))
+            self.assertNotIn("xl/worksheets/sheet3.xml", out.namelist())
+
+    def test_no_matching_data(self):
+        """Проверяет, что файл без подходящих строк не создается"""
+        target = os.path.join(self.temp_dir, "empty.xlsx")
+        results = create_filtered_files(self.test_file, [({"Region": "West"}, target)], self.valid_sheets, engine='xml')
+        self.assertEqual(results, [None])
+        self.assertFalse(os.path.exists(target))
+        self.assertFalse(os.path.exists(target + ".part"))
+
+    def test_shared_strings_pruned(self):
+        """Проверяет, что выходной файл содержит только используемые общие строки"""
+        convert_to_shared_strings(self.test_file)
+        target = os.path.join(self.temp_dir, "strings.xlsx")
+        reference = os.path.join(self.temp_dir, "strings_ref.xlsx")
+        filters = {"Region": "South", "City": "C1"}
+        # Лист Ref копируется без фильтрации, его строки тоже переиндексируются
+        valid_sheets = {"Data": self.valid_sheets["Data"]}
+        result = create_filtered_file(self.test_file, target, valid_sheets, filters, engine='xml')
+        expected = create_filtered_file(self.test_file, reference, valid_sheets, filters)
+        self.assertEqual(self.read_values(result), self.read_values(expected))
+
+        with zipfile.ZipFile(self.test_file) as src, zipfile.ZipFile(result) as out:
+            source_count = len(SharedStringTable(src).items)
+            table = SharedStringTable(out)
+            root = ET.fromstring(out.read("xl/sharedStrings.xml"))
+        # Заголовки, техническая строка, лист Ref, South и C1 (North и прочие города отброшены)
+        self.assertEqual(sorted(table.texts), sorted(
+            ["Technical info", "Region", "City", "Amount", "When", "Key", "Value", "South", "C1"]
+        ))
+        self.assertLess(len(table.items), source_count)
+        self.assertEqual(root.get("uniqueCount"), str(len(table.items)))
+
+    def test_shared_formulae_and_auto_filter(self):
+        """Проверяет перевод общих формул на адрес ячейки и удаление исходного автофильтра"""
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Region", "Amount", "Double"])
+        for idx in range(10):
+            ws.append(["North" if idx % 2 else "South", idx, f"=B{idx + 2}*2+$B$2"])
+        ws.auto_filter.ref = "A1:C11"
+        source = os.path.join(self.temp_dir, "formulae.xlsx")
+        wb.save(source)
+        # Формулы столбца C становятся общими, как их сохраняет Excel
+        with zipfile.ZipFile(source) as zf:
+            parts = {name: zf.read(name) for name in zf.namelist()}
+        sheet = parts["xl/worksheets/sheet1.xml"].decode("utf-8")
+        sheet = sheet.replace("<f>B2*2+$B$2</f>", '<f t="shared" ref="C2:C11" si="0">B2*2+$B$2</f>')
+        sheet = re.sub(r"<f>B\d+\*2\+\$B\$2</f>", '<f t="shared" si="0"/>', sheet)
+        parts["xl/worksheets/sheet1.xml"] = sheet.encode("utf-8")
+        with zipfile.ZipFile(source, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in parts.items():
+                zf.writestr(name, data)
+
+        valid_sheets = {"Data": (["Region", "Amount", "Double"], 1)}
+        combinations = [{"Region": "North"}, {"Region": "South"}]
+        xml_list = [(f, os.path.join(self.temp_dir, f"formula_xml_{i}.xlsx")) for i, f in enumerate(combinations)]
+        ref_list = [(f, os.path.join(self.temp_dir, f"formula_ref_{i}.xlsx")) for i, f in enumerate(combinations)]
+        xml_results = create_filtered_files(source, xml_list, valid_sheets, engine='xml')
+        ref_results = create_filtered_files(source, ref_list, valid_sheets)
+        for xml_path, ref_path in zip(xml_results, ref_results):
+            self.assertEqual(self.read_values(xml_path), self.read_values(ref_path))
+            with zipfile.ZipFile(xml_path) as zf:
+                sheet = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+            self.assertNotIn("autoFilter", sheet)
+            self.assertNotIn('t="shared"', sheet)
+        formulas = [row[2] for row in self.read_values(xml_results[0])["Data"][1:]]
+        self.assertEqual(formulas, [f"=B{idx}*2+$B$2" for idx in (3, 5, 7, 9, 11)])
+
+    def test_many_outputs_within_file_limit(self):
+        """Проверяет, что число открытых файлов не растет с числом выходов"""
+        try:
+            import resource
+        except ImportError:
+            self.skipTest("resource module is not available")
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["Key", "Value"])
+        for idx in range(300):
+            ws.append([f"K{idx % 150}", idx])
+        source = os.path.join(self.temp_dir, "many.xlsx")
+        wb.save(source)
+        valid_sheets = {"Data": (["Key", "Value"], 1)}
+        file_list = [({"Key": f"K{idx}"}, os.path.join(self.temp_dir, f"many_{idx}.xlsx")) for idx in range(150)]
+
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        open_files = len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else 64
+        limit = open_files + 40
+        if hard != resource.RLIM_INFINITY and limit > hard:
+            self.skipTest("file limit is too low")
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+        try:
+            # Маленький буфер: строки выходов сбрасываются в общий временный файл отрезками
+            with mock.patch("excel_utils.xml_engine.SPOOL_BUFFER_BYTES", 1024):
+                results = create_filtered_files(source, file_list, valid_sheets, engine='xml')
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        self.assertTrue(all(results))
+        for idx in (0, 7, 149):
+            wb = openpyxl.load_workbook(results[idx])
+            self.assertEqual(
+                list(wb["Data"].iter_rows(values_only=True)),
+                [("Key", "Value"), (f"K{idx}", idx), (f"K{idx}", idx + 150)]
+            )
+
+    def test_macro_workbook_saved_as_xlsx(self):
+        """Проверяет, что из книги .xlsm получается обычная .xlsx без проекта VBA"""
+        source = os.path.join(self.temp_dir, "macro.xlsm")
+        with zipfile.ZipFile(self.test_file) as zf:
+            parts = {name: zf.read(name) for name in zf.namelist()}
+        parts["xl/vbaProject.bin"] = b"vba"
+        parts["xl/vbaProjectSignature.bin"] = b"signature"
+        parts["xl/_rels/vbaProject.bin.rels"] = (
+            b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            b'<Relationship Id="rId1" Type="http://schemas.microsoft.com/office/2006/relationships/'
+            b'vbaProjectSignature" Target="vbaProjectSignature.bin"/></Relationships>'
+        )
+        parts["xl/_rels/workbook.xml.rels"] = parts["xl/_rels/workbook.xml.rels"].replace(
+            b"</Relationships>",
+            b'<Relationship Id="rIdVba" Type="http://schemas.microsoft.com/office/2006/relationships/vbaProject" '
+            b'Target="vbaProject.bin"/></Relationships>'
+        )
+        parts["[Content_Types].xml"] = parts["[Content_Types].xml"].replace(
+            b"application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml",
+            b"application/vnd.ms-excel.sheet.macroEnabled.main+xml"
+        ).replace(
+            b"</Types>",
+            b'<Default Extension="bin" ContentType="application/vnd.ms-office.vbaProject"/>'
+            b'<Override PartName="/xl/vbaProjectSignature.bin" '
+            b'ContentType="application/vnd.ms-office.vbaProjectSignature"/></Types>'
+        )
+        with zipfile.ZipFile(source, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in parts.items():
+                zf.writestr(name, data)
+
+        target = os.path.join(self.temp_dir, "macro_out.xlsm")
+        result = create_filtered_files(source, [({"Region": "North"}, target)], self.valid_sheets, engine='xml')[0]
+        self.assertTrue(result.endswith(".xlsx"))
+        with zipfile.ZipFile(result) as zf:
+            names = zf.namelist()
+            content_types = zf.read("[Content_Types].xml").decode("utf-8")
+            rels = zf.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+        for name in ("xl/vbaProject.bin", "xl/vbaProjectSignature.bin", "xl/_rels/vbaProject.bin.rels"):
+            self.assertNotIn(name, names)
+        self.assertNotIn("vbaProject", content_types)
+        self.assertNotIn("macroEnabled", content_types)
+        self.assertIn("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml", content_types)
+        self.assertNotIn("vbaProject", rels)
+        self.assertIn("Data", openpyxl.load_workbook(result).sheetnames)
+
+if __name__ == '__main__':
+    unittest.main()